@@ -0,0 +1,63 @@
+"""Compare the vectorized `is_safe` extraction against the per-row `json.loads` path.
+
+Usage:
+    uv run python benchmarks/bench_annotation_parsing.py --rows 1000000
+"""
+
+import argparse
+import json
+import random
+import time
+
+import pandas as pd
+
+from modelplane.runways.scorer import parse_is_safe
+
+
+def make_annotations(rows: int) -> pd.Series:
+    rng = random.Random(0)
+    values = []
+    for i in range(rows):
+        annotation = {
+            "is_safe": rng.random() < 0.5,
+            "is_valid": True,
+            "logprobs": rng.uniform(-5, 0),
+            "reasoning": f"Response {i} does not fall into a hazard category.",
+        }
+        values.append(json.dumps(annotation))
+    return pd.Series(values)
+
+
+def per_row(annotations: pd.Series) -> pd.Series:
+    """The original path: one `json.loads` call per row through `Series.apply`."""
+    return annotations.apply(lambda x: json.loads(x)["is_safe"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    annotations = make_annotations(args.rows)
+
+    def best_of(fn):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn(annotations)
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    per_row_time, expected = best_of(per_row)
+    vectorized_time, actual = best_of(parse_is_safe)
+    assert actual.astype(bool).tolist() == expected.astype(bool).tolist()
+
+    print(f"rows:       {args.rows}")
+    print(f"per-row:    {per_row_time:.3f}s")
+    print(f"vectorized: {vectorized_time:.3f}s")
+    print(f"speedup:    {per_row_time / vectorized_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
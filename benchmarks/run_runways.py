@@ -0,0 +1,195 @@
+"""End-to-end benchmark of the respond, annotate and score runways.
+
+Each runway is run against synthetic datasets of increasing size, backed by a
+local file-based MLflow store, the `demo_yes_no` SUT and the test annotator
+from `tests/it/runways/half_safe_annotator.py`. Every step runs in its own
+process so its peak RSS can be measured. Results are written as JSON, so they
+can be compared across commits.
+
+Usage:
+    uv run python benchmarks/run_runways.py --sizes 1000 100000 --output bench.json
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import pathlib
+import queue as queue_module
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+SUT_ID = "demo_yes_no"
+EXPERIMENT = "runway_benchmarks"
+STEPS = ("respond", "annotate", "score")
+
+
+def make_prompts(path: pathlib.Path, rows: int):
+    rng = random.Random(rows)
+    words = ["what", "is", "the", "capital", "of", "france", "explain", "why"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["prompt_uid", "prompt_text"])
+        for i in range(rows):
+            text = " ".join(rng.choices(words, k=rng.randint(3, 12)))
+            writer.writerow([i, text])
+
+
+def make_ground_truth(path: pathlib.Path, rows: int):
+    rng = random.Random(rows + 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["prompt_uid", "sut_uid", "is_safe"])
+        for i in range(rows):
+            writer.writerow([i, SUT_ID, rng.choice(["safe", "unsafe"])])
+
+
+def run_step(step: str, workdir: pathlib.Path, upstream_run_id: str | None, queue):
+    """Run one runway step; executed in a child process."""
+    sys.path.insert(0, str(REPO_ROOT / "tests" / "it" / "runways"))
+    from half_safe_annotator import TEST_ANNOTATOR_ID
+
+    start = time.perf_counter()
+    if step == "respond":
+        from modelplane.runways.responder import respond
+
+        result = respond(
+            sut_id=SUT_ID,
+            prompts=str(workdir / "prompts.csv"),
+            experiment=EXPERIMENT,
+            disable_cache=True,
+        )
+    elif step == "annotate":
+        from modelplane.runways.annotator import annotate
+
+        result = annotate(
+            experiment=EXPERIMENT,
+            annotator_ids=[TEST_ANNOTATOR_ID],
+            response_run_id=upstream_run_id,
+            disable_cache=True,
+        )
+    else:
+        from modelplane.runways.scorer import score
+
+        result = score(
+            annotation_run_id=upstream_run_id,
+            experiment=EXPERIMENT,
+            ground_truth=str(workdir / "ground_truth.csv"),
+        )
+    wall_seconds = time.perf_counter() - start
+    queue.put(
+        {
+            "run_id": result.run_id,
+            "wall_seconds": wall_seconds,
+            # ru_maxrss is in kilobytes on Linux.
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def measure(step: str, workdir: pathlib.Path, upstream_run_id: str | None) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_step, args=(step, workdir, upstream_run_id, queue))
+    process.start()
+    # Poll so a crashed child doesn't leave us waiting on the queue forever.
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            assert process.is_alive(), f"{step} failed with exit code {process.exitcode}"
+    process.join()
+    return result
+
+
+def phase_metrics(run_id: str) -> dict[str, float]:
+    import mlflow
+
+    metrics = mlflow.get_run(run_id).data.metrics
+    return {
+        name.removeprefix("phase_").removesuffix("_seconds"): value
+        for name, value in metrics.items()
+        if name.startswith("phase_")
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_size(rows: int, workdir: pathlib.Path) -> list[dict]:
+    make_prompts(workdir / "prompts.csv", rows)
+    make_ground_truth(workdir / "ground_truth.csv", rows)
+    results = []
+    run_id = None
+    for step in STEPS:
+        measured = measure(step, workdir, run_id)
+        run_id = measured["run_id"]
+        results.append(
+            {
+                "step": step,
+                "rows": rows,
+                "wall_seconds": measured["wall_seconds"],
+                "rows_per_second": rows / measured["wall_seconds"],
+                "peak_rss_mb": measured["peak_rss_mb"],
+                "phases": phase_metrics(run_id),
+            }
+        )
+        print(
+            f"{step:>8} {rows:>9} rows: {measured['wall_seconds']:8.2f}s "
+            f"{rows / measured['wall_seconds']:10.0f} rows/s "
+            f"{measured['peak_rss_mb']:8.0f} MB"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--output", default="runway_benchmarks.json")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = pathlib.Path(tmp)
+        # Keep the benchmark isolated from any configured tracking server and
+        # from the local artifact caches.
+        os.environ["MLFLOW_TRACKING_URI"] = (tmp_path / "mlruns").as_uri()
+        os.environ["MODELPLANE_CACHE_ROOT"] = str(tmp_path / "cache")
+        import mlflow
+
+        mlflow.set_tracking_uri(os.environ["MLFLOW_TRACKING_URI"])
+        for rows in args.sizes:
+            workdir = tmp_path / str(rows)
+            workdir.mkdir()
+            results.extend(benchmark_size(rows, workdir))
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"commit": git_commit(), "python": sys.version, "results": results},
+            f,
+            indent=2,
+        )
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
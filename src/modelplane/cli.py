@@ -1,20 +1,54 @@
 from typing import List
 
 import click
-from modelgauge.data_schema import AnnotationSchema
-from modelgauge.ensemble_strategies import ENSEMBLE_STRATEGIES
 
-from modelplane.runways.annotator import annotate
-from modelplane.runways.lister import (
-    list_annotators,
-    list_ensemble_strategies,
-    list_suts,
-)
-from modelplane.runways.responder import respond
-from modelplane.runways.scorer import score
 from modelplane.utils.env import load_from_dotenv
+from modelplane.utils.limits import AUTO_NUM_WORKERS
+from modelplane.utils.responsecache import (
+    DEFAULT_RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DIR_ENV,
+)
+
+# The runways (and through them mlflow, pandas and the modelgauge plugins) are
+# imported inside each command so that `modelplane --help` and the listing
+# commands don't pay for loading everything.
+
+
+class NumWorkersType(click.ParamType):
+    """A positive number of workers, or "auto"."""
+
+    name = f"integer|{AUTO_NUM_WORKERS}"
+
+    def convert(self, value, param, ctx):
+        if value == AUTO_NUM_WORKERS:
+            return value
+        try:
+            num_workers = int(value)
+        except (TypeError, ValueError):
+            self.fail(
+                f"{value!r} is not an integer or '{AUTO_NUM_WORKERS}'.", param, ctx
+            )
+        if num_workers < 1:
+            self.fail(f"{value!r} is not a positive integer.", param, ctx)
+        return num_workers
 
-DEFAULT_ANNOTATION_SCHEMA = AnnotationSchema.default()
+
+NUM_WORKERS = NumWorkersType()
+CACHE_DIR_HELP = (
+    "Directory to cache SUT/annotator responses in. Defaults to "
+    f"${RESPONSE_CACHE_DIR_ENV}, or `{DEFAULT_RESPONSE_CACHE_DIR}` if it isn't set."
+)
+# Mirrors modelplane.runways.utils.ARTIFACT_FORMATS, which is too heavy to import here.
+ARTIFACT_FORMATS = ["csv", "parquet", "both"]
+ARTIFACT_FORMAT_HELP = (
+    "The format to log the outputs in. Parquet is smaller and faster to read, "
+    "and has the annotations' `is_safe` and `logprobs` as typed columns. "
+    "Defaults to csv."
+)
+COMPRESS_ARTIFACTS_HELP = (
+    "Gzip the artifacts, except Parquet files, before uploading them, as "
+    "`{name}.gz`. Runs that read them decompress them."
+)
 
 
 @click.group(name="modelplane")
@@ -24,16 +58,22 @@ def cli():
 
 @cli.command(name="list-annotators", help="List known annotators.")
 def list_annotators_cli():
+    from modelplane.runways.lister import list_annotators
+
     list_annotators()
 
 
 @cli.command(name="list-ensemble-strategies", help="List known ensemble strategies.")
 def list_ensemble_strategies_cli():
+    from modelplane.runways.lister import list_ensemble_strategies
+
     list_ensemble_strategies()
 
 
 @cli.command(name="list-suts", help="List known suts.")
 def list_suts_cli():
+    from modelplane.runways.lister import list_suts
+
     list_suts()
 
 
@@ -41,8 +81,9 @@ def list_suts_cli():
 @click.option(
     "--sut_id",
     type=str,
+    multiple=True,
     required=True,
-    help="The SUT UID to use.",
+    help="The SUT UID(s) to use. Multiple SUTs can be specified.",
 )
 @click.option(
     "--prompts",
@@ -66,13 +107,20 @@ def list_suts_cli():
     "--disable_cache",
     is_flag=True,
     default=False,
-    help="Disable caching of LLM responses. If set, the pipeline will not cache SUT/annotator responses. Otherwise, cached responses will be stored locally in `.cache`.",
+    help="Disable caching of LLM responses. If set, the pipeline will not cache SUT/annotator responses. Otherwise, cached responses will be stored in the --cache_dir.",
+)
+@click.option(
+    "--cache_dir",
+    type=str,
+    required=False,
+    help=CACHE_DIR_HELP,
 )
 @click.option(
     "--num_workers",
-    type=int,
+    type=NUM_WORKERS,
     default=1,
-    help="The number of workers to run in parallel. Defaults to 1.",
+    help="The number of workers to run in parallel, or `auto` to adapt the number "
+    "to how the services keep up. Defaults to 1.",
 )
 @click.option(
     "--prompt_uid_col",
@@ -86,32 +134,93 @@ def list_suts_cli():
     required=False,
     help="The name of the prompt text column in the dataset.",
 )
+@click.option(
+    "--sut_num_workers",
+    type=str,
+    multiple=True,
+    help="Number of workers for one SUT, as SUT_ID=NUM_WORKERS. Overrides --num_workers for that SUT.",
+)
+@click.option(
+    "--sut_rate_limit",
+    type=str,
+    multiple=True,
+    help="Maximum requests per second to one SUT, as SUT_ID=REQUESTS_PER_SECOND.",
+)
+@click.option(
+    "--resume",
+    type=str,
+    required=False,
+    help="The run ID of a crashed run to pick up where it stopped. Outputs that were already checkpointed are not recomputed.",
+)
+@click.option(
+    "--artifact_format",
+    type=click.Choice(ARTIFACT_FORMATS),
+    default="csv",
+    help=ARTIFACT_FORMAT_HELP,
+)
+@click.option(
+    "--compress_artifacts",
+    is_flag=True,
+    default=False,
+    help=COMPRESS_ARTIFACTS_HELP,
+)
 @load_from_dotenv
 def get_sut_responses(
-    sut_id: str,
+    sut_id: List[str],
     prompts: str,
     experiment: str,
     dvc_repo: str | None = None,
     disable_cache: bool = False,
-    num_workers: int = 1,
+    cache_dir: str | None = None,
+    num_workers: int | str = 1,
     prompt_uid_col: str | None = None,
     prompt_text_col: str | None = None,
+    sut_num_workers: List[str] = (),
+    sut_rate_limit: List[str] = (),
+    resume: str | None = None,
+    artifact_format: str = "csv",
+    compress_artifacts: bool = False,
 ):
     """
     Run the pipeline to get responses from SUTs.
     """
+    from modelplane.runways.responder import respond
+
     return respond(
-        sut_id=sut_id,
+        sut_id=list(sut_id),
         prompts=prompts,
         experiment=experiment,
         dvc_repo=dvc_repo,
         disable_cache=disable_cache,
+        cache_dir=cache_dir,
         num_workers=num_workers,
         prompt_uid_col=prompt_uid_col,
         prompt_text_col=prompt_text_col,
+        sut_num_workers=_parse_per_sut("--sut_num_workers", sut_num_workers, int),
+        sut_rate_limits=_parse_per_sut("--sut_rate_limit", sut_rate_limit, float),
+        resume_run_id=resume,
+        artifact_format=artifact_format,
+        compress_artifacts=compress_artifacts,
     )
 
 
+def _parse_per_sut(option: str, values, value_type) -> dict:
+    """Parse SUT_ID=VALUE option values into a dict."""
+    parsed = {}
+    for value in values or ():
+        uid, sep, raw = value.rpartition("=")
+        try:
+            if not sep or not uid:
+                raise ValueError
+            parsed[uid] = value_type(raw)
+        except ValueError:
+            raise click.BadParameter(
+                f"Expected SUT_ID={value_type.__name__.upper()}, got '{value}'.",
+                param_hint=option,
+            )
+    return parsed
+
+
 @cli.command(name="annotate")
 @click.option(
     "--experiment",
@@ -151,7 +260,7 @@ def get_sut_responses(
     type=str,
     default=None,
     help="The ensemble strategy to use. If set, individual annotator results will be combined using the given strategy. "
-    "Available strategies: " + ", ".join(list(ENSEMBLE_STRATEGIES.keys())),
+    "Run `modelplane list-ensemble-strategies` to see the available strategies.",
 )
 @click.option(
     "--overwrite",
@@ -163,13 +272,20 @@ def get_sut_responses(
     "--disable_cache",
     is_flag=True,
     default=False,
-    help="Disable caching of LLM responses. If set, the pipeline will not cache SUT/annotator responses. Otherwise, cached responses will be stored locally in `.cache`.",
+    help="Disable caching of LLM responses. If set, the pipeline will not cache SUT/annotator responses. Otherwise, cached responses will be stored in the --cache_dir.",
+)
+@click.option(
+    "--cache_dir",
+    type=str,
+    required=False,
+    help=CACHE_DIR_HELP,
 )
 @click.option(
     "--num_workers",
-    type=int,
+    type=NUM_WORKERS,
     default=1,
-    help="The number of workers to run in parallel. Defaults to 1.",
+    help="The number of workers to run in parallel, or `auto` to adapt the number "
+    "to how the services keep up. Defaults to 1.",
 )
 @click.option(
     "--prompt_uid_col",
@@ -195,6 +311,30 @@ def get_sut_responses(
     required=False,
     help="The name of the SUT response column in the dataset.",
 )
+@click.option(
+    "--resume",
+    type=str,
+    required=False,
+    help="The run ID of a crashed run to pick up where it stopped. Outputs that were already checkpointed are not recomputed.",
+)
+@click.option(
+    "--previous_annotation_run_id",
+    type=str,
+    required=False,
+    help="The run ID of an earlier annotation run. Only the annotations missing from it are computed, and merged with its annotations.",
+)
+@click.option(
+    "--artifact_format",
+    type=click.Choice(ARTIFACT_FORMATS),
+    default="csv",
+    help=ARTIFACT_FORMAT_HELP,
+)
+@click.option(
+    "--compress_artifacts",
+    is_flag=True,
+    default=False,
+    help=COMPRESS_ARTIFACTS_HELP,
+)
 @load_from_dotenv
 def get_annotations(
     experiment: str,
@@ -205,12 +345,19 @@ def get_annotations(
     ensemble_strategy: str | None = None,
     overwrite: bool = False,
     disable_cache: bool = False,
-    num_workers: int = 1,
+    cache_dir: str | None = None,
+    num_workers: int | str = 1,
     prompt_uid_col: str | None = None,
     prompt_text_col: str | None = None,
     sut_uid_col: str | None = None,
     sut_response_col: str | None = None,
+    resume: str | None = None,
+    previous_annotation_run_id: str | None = None,
+    artifact_format: str = "csv",
+    compress_artifacts: bool = False,
 ):
+    from modelplane.runways.annotator import annotate
+
     return annotate(
         experiment=experiment,
         dvc_repo=dvc_repo,
@@ -220,11 +367,16 @@ def get_annotations(
         ensemble_strategy=ensemble_strategy,
         overwrite=overwrite,
         disable_cache=disable_cache,
+        cache_dir=cache_dir,
         num_workers=num_workers,
         prompt_uid_col=prompt_uid_col,
         prompt_text_col=prompt_text_col,
         sut_uid_col=sut_uid_col,
         sut_response_col=sut_response_col,
+        resume_run_id=resume,
+        previous_annotation_run_id=previous_annotation_run_id,
+        artifact_format=artifact_format,
+        compress_artifacts=compress_artifacts,
     )
 
 
@@ -270,6 +422,12 @@ def get_annotations(
     required=False,
     help="The name of the JSON annotation column in the annotations file.",
 )
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Read the annotations and ground truth this many rows at a time, to score files larger than memory.",
+)
 @load_from_dotenv
 def score_annotations(
     experiment: str,
@@ -277,9 +435,12 @@ def score_annotations(
     ground_truth: str,
     dvc_repo: str | None = None,
     sample_uid_col: str | None = None,
-    annotator_uid_col: str | None = DEFAULT_ANNOTATION_SCHEMA.annotator_uid,
-    annotation_col: str | None = DEFAULT_ANNOTATION_SCHEMA.annotation,
+    annotator_uid_col: str | None = None,
+    annotation_col: str | None = None,
+    chunksize: int | None = None,
 ):
+    from modelplane.runways.scorer import score
+
     return score(
         annotation_run_id=annotation_run_id,
         experiment=experiment,
@@ -288,8 +449,244 @@ def score_annotations(
         sample_uid_col=sample_uid_col,
         annotator_uid_col=annotator_uid_col,
         annotation_col=annotation_col,
+        chunksize=chunksize,
+    )
+
+
+@cli.command(name="pipeline")
+@click.option(
+    "--sut_id",
+    type=str,
+    required=True,
+    help="The SUT UID to use.",
+)
+@click.option(
+    "--prompts",
+    type=str,
+    required=True,
+    help="The path to the input prompts file.",
+)
+@click.option(
+    "--annotator_id",
+    type=str,
+    multiple=True,
+    required=True,
+    help="The annotator UID(s) to use. Multiple annotators can be specified.",
+)
+@click.option(
+    "--experiment",
+    type=str,
+    required=True,
+    help="The experiment name to use. If the experiment does not exist, it will be created.",
+)
+@click.option(
+    "--ground_truth",
+    type=str,
+    required=False,
+    help="Path to the ground truth file. If not set, the annotations are not scored.",
+)
+@click.option(
+    "--dvc_repo",
+    type=str,
+    required=False,
+    help="URL of the DVC repo to get the prompts and ground truth from. E.g. https://github.com/my-org/my-repo.git",
+)
+@click.option(
+    "--ensemble_strategy",
+    type=str,
+    default=None,
+    help="The ensemble strategy to use. If set, individual annotator results will be combined using the given strategy. "
+    "Run `modelplane list-ensemble-strategies` to see the available strategies.",
+)
+@click.option(
+    "--disable_cache",
+    is_flag=True,
+    default=False,
+    help="Disable caching of LLM responses. If set, the pipeline will not cache SUT/annotator responses. Otherwise, cached responses will be stored in the --cache_dir.",
+)
+@click.option(
+    "--cache_dir",
+    type=str,
+    required=False,
+    help=CACHE_DIR_HELP,
+)
+@click.option(
+    "--num_workers",
+    type=NUM_WORKERS,
+    default=1,
+    help="The number of workers to run in parallel, or `auto` to adapt the number "
+    "to how the services keep up. Defaults to 1.",
+)
+@click.option(
+    "--prompt_uid_col",
+    type=str,
+    required=False,
+    help="The name of the prompt UID column in the dataset.",
+)
+@click.option(
+    "--prompt_text_col",
+    type=str,
+    required=False,
+    help="The name of the prompt text column in the dataset.",
+)
+@click.option(
+    "--sample_uid_col",
+    type=str,
+    required=False,
+    help="The name of the sample uid columns in the annotations and ground truth files. prompt_uid x sut_uid will be used by default.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Annotate each SUT response as soon as it arrives, instead of after all SUT responses are in.",
+)
+@load_from_dotenv
+def run_pipeline_cli(
+    sut_id: str,
+    prompts: str,
+    annotator_id: List[str],
+    experiment: str,
+    ground_truth: str | None = None,
+    dvc_repo: str | None = None,
+    ensemble_strategy: str | None = None,
+    disable_cache: bool = False,
+    cache_dir: str | None = None,
+    num_workers: int | str = 1,
+    prompt_uid_col: str | None = None,
+    prompt_text_col: str | None = None,
+    sample_uid_col: str | None = None,
+    stream: bool = False,
+):
+    """
+    Get SUT responses, annotate and score them in one go.
+    """
+    from modelplane.runways.pipeline import run_pipeline
+
+    return run_pipeline(
+        sut_id=sut_id,
+        prompts=prompts,
+        annotator_ids=annotator_id,
+        experiment=experiment,
+        ground_truth=ground_truth,
+        dvc_repo=dvc_repo,
+        ensemble_strategy=ensemble_strategy,
+        disable_cache=disable_cache,
+        cache_dir=cache_dir,
+        num_workers=num_workers,
+        prompt_uid_col=prompt_uid_col,
+        prompt_text_col=prompt_text_col,
+        sample_uid_col=sample_uid_col,
+        stream=stream,
     )
 
 
+@cli.group(name="cache")
+def cache_cli():
+    """Manage the local cache of SUT and annotator responses."""
+
+
+@cache_cli.command(name="stats", help="Show the size of the response cache.")
+@click.option("--cache_dir", type=str, required=False, help=CACHE_DIR_HELP)
+@load_from_dotenv
+def cache_stats_cli(cache_dir: str | None = None):
+    from modelplane.runways.cache import cache_stats
+
+    cache_stats(cache_dir)
+
+
+@cache_cli.command(name="prune", help="Remove old responses from the cache.")
+@click.option("--cache_dir", type=str, required=False, help=CACHE_DIR_HELP)
+@click.option(
+    "--max_age_days",
+    type=click.FloatRange(min=0),
+    required=False,
+    help="Remove the cached responses of SUTs/annotators that weren't written to in this many days.",
+)
+@click.option(
+    "--max_bytes",
+    type=click.IntRange(min=0),
+    required=False,
+    help="Then remove the least recently written ones until the cache fits in this many bytes.",
+)
+@load_from_dotenv
+def cache_prune_cli(
+    cache_dir: str | None = None,
+    max_age_days: float | None = None,
+    max_bytes: int | None = None,
+):
+    from modelplane.runways.cache import prune_cache
+
+    if max_age_days is None and max_bytes is None:
+        raise click.UsageError("Pass --max_age_days and/or --max_bytes.")
+    prune_cache(cache_dir, max_age_days=max_age_days, max_bytes=max_bytes)
+
+
+@cache_cli.command(
+    name="export",
+    help="Bundle cached responses, e.g. to pre-warm the cache of another host.",
+)
+@click.option("--cache_dir", type=str, required=False, help=CACHE_DIR_HELP)
+@click.option(
+    "--uid",
+    type=str,
+    multiple=True,
+    help="The SUT/annotator UID(s) to export responses of; may use * wildcards. Defaults to all.",
+)
+@click.option(
+    "--output",
+    type=str,
+    required=False,
+    help="The file to write the bundle (a .tar.gz) to.",
+)
+@click.option(
+    "--experiment",
+    type=str,
+    required=False,
+    help="Log the bundle as an artifact of a new run in this experiment.",
+)
+@load_from_dotenv
+def cache_export_cli(
+    cache_dir: str | None = None,
+    uid: List[str] = (),
+    output: str | None = None,
+    experiment: str | None = None,
+):
+    from modelplane.runways.cache import export_cache
+
+    if output is None and experiment is None:
+        raise click.UsageError("Pass --output and/or --experiment.")
+    return export_cache(
+        uids=list(uid) or None,
+        output=output,
+        cache_dir=cache_dir,
+        experiment=experiment,
+    )
+
+
+@cache_cli.command(
+    name="import", help="Add the responses from an exported bundle to the cache."
+)
+@click.argument("bundle", type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option("--cache_dir", type=str, required=False, help=CACHE_DIR_HELP)
+@click.option(
+    "--run_id",
+    type=str,
+    required=False,
+    help="Import the bundle logged to this run by `cache export --experiment`, instead of a file.",
+)
+@load_from_dotenv
+def cache_import_cli(
+    bundle: str | None = None,
+    cache_dir: str | None = None,
+    run_id: str | None = None,
+):
+    from modelplane.runways.cache import import_cache
+
+    if (bundle is None) == (run_id is None):
+        raise click.UsageError("Pass either a BUNDLE file or --run_id.")
+    import_cache(bundle=bundle, run_id=run_id, cache_dir=cache_dir)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,178 @@
+import threading
+import time
+from typing import Any
+
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.tracking import MlflowClient
+
+# Per-request limits of the MLflow log_batch API.
+MAX_ENTITIES_PER_BATCH = 1000
+MAX_PARAMS_PER_BATCH = 100
+MAX_TAGS_PER_BATCH = 100
+
+ROUND_TRIPS_SAVED_METRIC = "mlflow_round_trips_saved"
+
+
+class BatchLogger:
+    """Buffers metrics, params and tags for a run and sends them with `MlflowClient.log_batch`.
+
+    Logging calls only buffer the entries, so they never wait on the tracking
+    server. A background thread sends them once `max_batch_size` of them are
+    pending or `flush_interval` seconds have passed since the last send, and
+    `close()` sends the rest. A batch that fails to send is kept and retried.
+    Each logging call would otherwise have been its own request to the tracking
+    server; `round_trips_saved` counts the requests avoided. Safe to call from
+    multiple threads, e.g. as a pipeline progress callback.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        max_batch_size: int = MAX_ENTITIES_PER_BATCH,
+        flush_interval: float = 10.0,
+        client: MlflowClient | None = None,
+    ):
+        self.run_id = run_id
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self._client = client or MlflowClient()
+        self._lock = threading.Lock()
+        # Held while sending, so batches go out one at a time and in order.
+        self._send_lock = threading.Lock()
+        self._metrics: list[Metric] = []
+        self._params: dict[str, Param] = {}
+        self._tags: dict[str, RunTag] = {}
+        self._calls = 0
+        self._requests = 0
+        self._full = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="modelplane-batchlogger", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def round_trips_saved(self) -> int:
+        return self._calls - self._requests
+
+    def log_metric(self, key: str, value: float, step: int = 0) -> None:
+        self.log_metrics({key: value}, step=step)
+
+    def log_metrics(self, metrics: dict[str, float], step: int = 0) -> None:
+        timestamp = int(time.time() * 1000)
+        with self._lock:
+            self._metrics.extend(
+                Metric(key=key, value=float(value), timestamp=timestamp, step=step)
+                for key, value in metrics.items()
+            )
+            self._logged()
+
+    def log_param(self, key: str, value: Any) -> None:
+        self.log_params({key: value})
+
+    def log_params(self, params: dict[str, Any]) -> None:
+        with self._lock:
+            self._params.update(
+                {key: Param(key=key, value=str(value)) for key, value in params.items()}
+            )
+            self._logged()
+
+    def set_tag(self, key: str, value: Any) -> None:
+        self.set_tags({key: value})
+
+    def set_tags(self, tags: dict[str, Any]) -> None:
+        with self._lock:
+            self._tags.update(
+                {key: RunTag(key=key, value=str(value)) for key, value in tags.items()}
+            )
+            self._logged()
+
+    def flush(self) -> None:
+        """
+        Send everything buffered so far, split to respect the log_batch limits.
+        Entries that fail to send are buffered again, and the error is raised.
+        """
+        with self._send_lock:
+            with self._lock:
+                metrics = self._metrics
+                params = list(self._params.values())
+                tags = list(self._tags.values())
+                self._metrics, self._params, self._tags = [], {}, {}
+                self._full.clear()
+            # Logging goes on while the batches are sent.
+            while metrics or params or tags:
+                batch_params = params[:MAX_PARAMS_PER_BATCH]
+                batch_tags = tags[:MAX_TAGS_PER_BATCH]
+                room = MAX_ENTITIES_PER_BATCH - len(batch_params) - len(batch_tags)
+                batch_metrics = metrics[:room]
+                try:
+                    self._client.log_batch(
+                        self.run_id,
+                        metrics=batch_metrics,
+                        params=batch_params,
+                        tags=batch_tags,
+                        synchronous=True,
+                    )
+                except Exception:
+                    self._requeue(metrics, params, tags)
+                    raise
+                params = params[MAX_PARAMS_PER_BATCH:]
+                tags = tags[MAX_TAGS_PER_BATCH:]
+                metrics = metrics[room:]
+                self._requests += 1
+
+    def close(self) -> None:
+        """Flush, recording how many tracking server requests batching saved."""
+        self._closed.set()
+        self._full.set()
+        self._thread.join()
+        self.flush()
+        if self.round_trips_saved > 0:
+            self._client.log_metric(
+                self.run_id, ROUND_TRIPS_SAVED_METRIC, self.round_trips_saved
+            )
+
+    def __enter__(self) -> "BatchLogger":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # The run failed already; don't replace its exception with ours.
+        try:
+            self.close()
+        except Exception as e:
+            print(f"Failed to log batched metrics: {e}")
+
+    def _logged(self) -> None:
+        self._calls += 1
+        pending = len(self._metrics) + len(self._params) + len(self._tags)
+        if pending >= self.max_batch_size:
+            self._full.set()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._full.wait(self.flush_interval)
+            if self._closed.is_set():
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                # The entries are kept; the next flush tries again.
+                print(f"Failed to log to MLflow run {self.run_id}: {e}")
+                self._closed.wait(self.flush_interval)
+
+    def _requeue(
+        self, metrics: list[Metric], params: list[Param], tags: list[RunTag]
+    ) -> None:
+        with self._lock:
+            self._metrics = metrics + self._metrics
+            # Values logged since take precedence.
+            self._params = {**{p.key: p for p in params}, **self._params}
+            self._tags = {**{t.key: t for t in tags}, **self._tags}
+            if (
+                len(self._metrics) + len(self._params) + len(self._tags)
+                >= self.max_batch_size
+            ):
+                self._full.set()
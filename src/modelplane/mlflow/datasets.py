@@ -1,12 +1,21 @@
 from pathlib import Path
 from typing import Any
 
+import mlflow
+import mlflow.artifacts
 import mlflow.data.dataset
 import mlflow.data.dataset_source
 import mlflow.data.meta_dataset
 from mlflow.data.filesystem_dataset_source import FileSystemDatasetSource
 from mlflow.utils.uri import is_local_uri
 
+from modelplane.utils.digests import content_digest, digest_index
+
+# MLflow stores dataset digests in a 36 character column.
+MAX_DATASET_DIGEST_LENGTH = 36
+DIGEST_MODE_TIMESTAMP = "timestamp"
+DIGEST_MODE_CONTENT = "content"
+
 
 class LocalDatasetSource(FileSystemDatasetSource):
     """This tries to follow the same pattern as the ArtifactRepoSource class
@@ -15,12 +24,31 @@ class LocalDatasetSource(FileSystemDatasetSource):
     includes something more specific in the version than just the configuration.
     In particular, we inject the timestamp of the file, and in the future
     will inject the DVC version for files that are tracked by DVC.
+
+    With `digest_mode="content"`, the SHA-256 of the file's content is
+    injected instead, so the same data gets the same digest wherever and
+    whenever it was written. It's remembered in the `DigestIndex`, so
+    unchanged files aren't hashed again, unless the caller already knows it
+    and passes it as `content_digest`.
     """
 
     LOCAL_SOURCE_TYPE = "local"
+    DIGEST_MODES = (DIGEST_MODE_TIMESTAMP, DIGEST_MODE_CONTENT)
 
-    def __init__(self, uri: str):
+    def __init__(
+        self,
+        uri: str,
+        digest_mode: str = DIGEST_MODE_TIMESTAMP,
+        content_digest: str | None = None,
+    ):
+        if digest_mode not in self.DIGEST_MODES:
+            raise ValueError(
+                f"Unknown digest mode: {digest_mode}. "
+                f"Available modes: {list(self.DIGEST_MODES)}"
+            )
         self._uri = uri
+        self.digest_mode = digest_mode
+        self._content_digest = content_digest
 
     @property
     def uri(self):  # type: ignore
@@ -48,12 +76,22 @@ class LocalDatasetSource(FileSystemDatasetSource):
         return cls(str(raw_source))
 
     def to_dict(self) -> dict[Any, Any]:
+        if self.digest_mode == DIGEST_MODE_CONTENT:
+            return {
+                "uri": self.uri,
+                "content_digest": self.content_digest(),
+            }
         # Add timestamp so the digest computation uses the file timestamp.
         return {
             "uri": self.uri,
             "timestamp": Path(self.uri).stat().st_mtime,
         }
 
+    def content_digest(self) -> str:
+        if self._content_digest is None:
+            self._content_digest = content_digest(self.uri, index=digest_index())
+        return self._content_digest
+
     @classmethod
     def from_dict(cls, source_dict: dict[Any, Any]) -> "LocalDatasetSource":
         uri = source_dict.get("uri")
@@ -61,4 +99,77 @@ class LocalDatasetSource(FileSystemDatasetSource):
             raise ValueError(
                 "The 'uri' field must be present and of type str in source_dict."
             )
+        if "content_digest" in source_dict:
+            return cls(
+                uri=uri,
+                digest_mode=DIGEST_MODE_CONTENT,
+                content_digest=source_dict["content_digest"],
+            )
         return cls(uri=uri)
+
+
+class RunArtifactDatasetSource(FileSystemDatasetSource):
+    """An artifact of an MLflow run, as a `runs:/{run_id}/{artifact_path}` URI.
+
+    Used to record that a run read an artifact of another run, without
+    uploading a copy of it.
+    """
+
+    RUN_ARTIFACT_SOURCE_TYPE = "run_artifact"
+    _SCHEME = "runs:/"
+
+    def __init__(self, run_id: str, artifact_path: str):
+        self.run_id = run_id
+        self.artifact_path = artifact_path
+
+    @property
+    def uri(self):  # type: ignore
+        return f"{self._SCHEME}{self.run_id}/{self.artifact_path}"
+
+    @staticmethod
+    def _get_source_type() -> str:
+        return RunArtifactDatasetSource.RUN_ARTIFACT_SOURCE_TYPE
+
+    def load(self, dst_path=None) -> str:
+        return mlflow.artifacts.download_artifacts(
+            artifact_uri=self.uri, dst_path=dst_path
+        )
+
+    @staticmethod
+    def _can_resolve(raw_source: Any):
+        return isinstance(raw_source, str) and raw_source.startswith(
+            RunArtifactDatasetSource._SCHEME
+        )
+
+    @classmethod
+    def _resolve(cls, raw_source: Any) -> "RunArtifactDatasetSource":
+        run_id, _, artifact_path = raw_source.removeprefix(cls._SCHEME).partition("/")
+        return cls(run_id, artifact_path)
+
+    def to_dict(self) -> dict[Any, Any]:
+        return {
+            "uri": self.uri,
+            "run_id": self.run_id,
+            "artifact_path": self.artifact_path,
+        }
+
+    @classmethod
+    def from_dict(cls, source_dict: dict[Any, Any]) -> "RunArtifactDatasetSource":
+        run_id = source_dict.get("run_id")
+        artifact_path = source_dict.get("artifact_path")
+        if not isinstance(run_id, str) or not isinstance(artifact_path, str):
+            raise ValueError(
+                "The 'run_id' and 'artifact_path' fields must be present and of "
+                "type str in source_dict."
+            )
+        return cls(run_id=run_id, artifact_path=artifact_path)
+
+
+def log_dataset_reference(
+    source: mlflow.data.dataset_source.DatasetSource, name: str, digest: str
+) -> None:
+    """Record in the active run that it read the dataset at `source`, without a copy of it."""
+    dataset = mlflow.data.meta_dataset.MetaDataset(
+        source, name=name, digest=digest[:MAX_DATASET_DIGEST_LENGTH]
+    )
+    mlflow.log_input(dataset)
@@ -0,0 +1,63 @@
+import threading
+
+from modelplane.mlflow.batchlogger import BatchLogger
+
+
+class ProgressSink:
+    """Pipeline progress callback that never waits on the tracking server.
+
+    Calls only record the latest value of each metric. A background thread
+    sends whatever is pending through `logger` at most `max_per_second` times
+    per second, so many progress ticks coalesce into one request. `close()`
+    stops the thread and always sends the final values.
+    """
+
+    def __init__(self, logger: BatchLogger, max_per_second: float = 1.0):
+        self._logger = logger
+        self._interval = 1.0 / max_per_second
+        self._lock = threading.Lock()
+        self._pending: dict[str, float] = {}
+        self._updated = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="modelplane-progress", daemon=True
+        )
+        self._thread.start()
+
+    def __call__(self, metrics: dict[str, float]) -> None:
+        with self._lock:
+            self._pending.update(metrics)
+        self._updated.set()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._updated.set()
+        self._thread.join()
+        self._send()
+
+    def __enter__(self) -> "ProgressSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._updated.wait()
+            if self._closed.is_set():
+                return
+            try:
+                self._send()
+            except Exception as e:
+                # Progress is best effort until close.
+                print(f"Failed to log progress: {e}")
+            self._closed.wait(self._interval)
+
+    def _send(self) -> None:
+        with self._lock:
+            metrics, self._pending = self._pending, {}
+            self._updated.clear()
+        if metrics:
+            self._logger.log_metrics(metrics)
+        # A batch that failed before stays with the logger, so this retries it.
+        self._logger.flush()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from mlflow.tracking import MlflowClient
+
+UPLOAD_WORKERS_ENV = "MODELPLANE_UPLOAD_WORKERS"
+DEFAULT_UPLOAD_WORKERS = 4
+GZIP_SUFFIX = ".gz"
+_COPY_BUFFER_SIZE = 1 << 20
+
+
+class ArtifactUploader:
+    """Uploads artifacts of a run in the background, several at a time.
+
+    `upload` returns straight away, so the run can go on (e.g. write its next
+    output) while the file is sent. With `compress`, files are gzipped before
+    they're uploaded, as `{name}.gz`. Large files are sent in chunks by
+    MLflow's multipart upload, where the artifact store supports it.
+
+    `close()` waits for all uploads and raises if any of them failed, so use
+    it inside the run's `with` block: the run is only marked done once its
+    artifacts are all there. The local files must stay until then.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        compress: bool = False,
+        max_workers: int | None = None,
+        client: MlflowClient | None = None,
+    ):
+        self.run_id = run_id
+        self.compress = compress
+        if max_workers is None:
+            max_workers = int(os.getenv(UPLOAD_WORKERS_ENV, DEFAULT_UPLOAD_WORKERS))
+        self._client = client or MlflowClient()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="modelplane-upload"
+        )
+        self._lock = threading.Lock()
+        self._futures: list[Future] = []
+
+    def artifact_name(self, path: str | Path, compress: bool | None = None) -> str:
+        """The name `path` is uploaded as."""
+        if compress is None:
+            compress = self.compress
+        name = Path(path).name
+        return name + GZIP_SUFFIX if compress else name
+
+    def upload(
+        self,
+        path: str | Path,
+        artifact_path: str | None = None,
+        compress: bool | None = None,
+    ) -> str:
+        """
+        Start uploading `path` to the run's `artifact_path` directory, and return
+        the name it's uploaded as. `compress` overrides the uploader's setting,
+        e.g. for files that are compressed already.
+        """
+        if compress is None:
+            compress = self.compress
+        future = self._pool.submit(self._upload, Path(path), artifact_path, compress)
+        with self._lock:
+            self._futures.append(future)
+        return self.artifact_name(path, compress)
+
+    def wait(self) -> None:
+        """Wait for the uploads started so far, and raise the first failure."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown()
+
+    def __enter__(self) -> "ArtifactUploader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # The run failed already; the files still have to outlive the uploads.
+        try:
+            self.close()
+        except Exception as e:
+            print(f"Failed to upload artifacts: {e}")
+
+    def _upload(self, path: Path, artifact_path: str | None, compress: bool) -> None:
+        if not compress:
+            self._client.log_artifact(self.run_id, str(path), artifact_path)
+            return
+        # Not next to `path`, which may be in the user's own directories.
+        with tempfile.TemporaryDirectory() as tmp:
+            compressed = Path(tmp) / self.artifact_name(path, compress)
+            with open(path, "rb") as src, gzip.open(compressed, "wb") as dest:
+                shutil.copyfileobj(src, dest, _COPY_BUFFER_SIZE)
+            self._client.log_artifact(self.run_id, str(compressed), artifact_path)
+
+
+def decompress(path: str | Path, dest: str | Path) -> None:
+    """Write the content of the gzipped file `path` to `dest`."""
+    with gzip.open(path, "rb") as src, open(dest, "wb") as dest_file:
+        shutil.copyfileobj(src, dest_file, _COPY_BUFFER_SIZE)
@@ -1,4 +1,2 @@
-from modelgauge.load_namespaces import load_namespaces
-
-
-load_namespaces(disable_progress_bar=True)
+# Plugin namespaces are loaded on demand (see `modelplane.runways.utils.load_plugins`)
+# so that importing the runways, or running `modelplane --help`, stays cheap.
@@ -1,42 +1,79 @@
 """Runway for annotating responses from SUTs."""
 
 import collections
+import csv
 import os
 import pathlib
+import shutil
 import tempfile
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import mlflow
-import modelgauge.annotators.cheval.registration  # noqa: F401
-import numpy as np
-from matplotlib import pyplot as plt
+import pandas as pd
 from modelgauge.annotator import Annotator
 from modelgauge.annotator_registry import ANNOTATORS
+from modelgauge.data_schema import AnnotationSchema
 from modelgauge.dataset import AnnotationDataset
 from modelgauge.ensemble_annotator import EnsembleAnnotator
 from modelgauge.ensemble_strategies import ENSEMBLE_STRATEGIES
 from modelgauge.pipeline_runner import build_runner
 
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.progress import ProgressSink
 from modelplane.mlflow.loghelpers import log_tags
+from modelplane.mlflow.uploader import ArtifactUploader
+from modelplane.runways.checkpoint import (
+    Checkpointer,
+    load_partial_outputs,
+    new_attempt_dir,
+    remove_work_dir,
+)
 from modelplane.runways.data import (
     Artifact,
     BaseInput,
     RunArtifacts,
     build_and_log_input,
+    build_input,
 )
 from modelplane.runways.utils import (
-    CACHE_DIR,
+    ANNOTATION_RESPONSE_ARTIFACT_NAME,
+    ANNOTATION_RESPONSE_PARQUET_NAME,
+    ARTIFACT_FORMAT_CSV,
     MODELGAUGE_RUN_TAG_NAME,
     PROMPT_RESPONSE_ARTIFACT_NAME,
+    PROMPT_RESPONSE_PARQUET_NAME,
     RUN_TYPE_ANNOTATOR,
     RUN_TYPE_TAG_NAME,
+    autoscale,
+    find_artifact,
     get_experiment_id,
     is_debug_mode,
+    load_plugins,
+    log_output_artifacts,
+    log_throttle_waits,
+    pipeline_num_workers,
+    prepare_response_cache,
     setup_annotator_credentials,
+    shared_rate_limit,
+    validate_artifact_format,
 )
-
+from modelplane.utils.columnar import parquet_to_csv
+from modelplane.utils.limits import AUTO_NUM_WORKERS
+from modelplane.utils.stats import Histogram, RunningStats, ValueSpool
+from modelplane.utils.timing import PhaseTimer
 
 DEFAULT_ENSEMBLE_ANNOTATOR_UID = "ensemble"
+LOGPROB_HIST_BINS = 30
+# Artifacts to read responses and annotations from, by preference; modelgauge
+# reads CSV, so it saves a conversion.
+RESPONSE_ARTIFACT_NAMES = [PROMPT_RESPONSE_ARTIFACT_NAME, PROMPT_RESPONSE_PARQUET_NAME]
+ANNOTATION_ARTIFACT_NAMES = [
+    ANNOTATION_RESPONSE_ARTIFACT_NAME,
+    ANNOTATION_RESPONSE_PARQUET_NAME,
+]
+SCHEMA = AnnotationSchema.default()
+# An annotation is identified by its response and annotator.
+ANNOTATION_KEY_COLS = [SCHEMA.prompt_uid, SCHEMA.sut_uid, SCHEMA.annotator_uid]
 
 
 def annotate(
@@ -49,99 +86,378 @@ def annotate(
     ensemble_strategy: str | None = None,
     overwrite: bool = False,
     disable_cache: bool = False,
-    num_workers: int = 1,
+    num_workers: int | str = 1,
     prompt_uid_col=None,
     prompt_text_col=None,
     sut_uid_col=None,
     sut_response_col=None,
+    output_dir: str | None = None,
+    resume_run_id: str | None = None,
+    previous_annotation_run_id: str | None = None,
+    cache_dir: str | None = None,
+    artifact_format: str = ARTIFACT_FORMAT_CSV,
+    compress_artifacts: bool = False,
 ) -> RunArtifacts:
     """
     Run annotations and record measurements.
+    With `num_workers="auto"`, the concurrency of each annotator adapts to how
+    it copes.
+    If `output_dir` is set, the annotations are also kept there on local disk.
+    Unless `disable_cache` is set, the annotator responses are cached in
+    `cache_dir` (see `response_cache_dir`).
+    The annotations are logged as `annotations.csv`, `annotations.parquet` or
+    both, depending on `artifact_format`. The Parquet file also has the
+    annotations' `is_safe` and `logprobs` as typed columns.
+    The responses of `response_run_id` are read from its CSV or Parquet artifact.
+    The artifacts are uploaded in the background, gzipped if
+    `compress_artifacts` is set.
+
+    The annotations are checkpointed as they come in (see `respond`). With
+    `resume_run_id`, a crashed run is picked up again where it stopped.
+
+    With `previous_annotation_run_id`, only the (prompt, SUT, annotator)
+    annotations missing from that run's annotations are computed, e.g. for an
+    added annotator or new responses, and its annotations by the requested
+    annotators are merged into this run's.
     """
+    assert not (
+        overwrite and resume_run_id
+    ), "Cannot both overwrite a response run and resume an annotation run."
+    validate_artifact_format(artifact_format)
     # this will set annotator_ids and optionally ensemble
     pipeline_kwargs = _get_annotator_settings(annotator_ids, ensemble_strategy)
-    if not disable_cache:
-        pipeline_kwargs["cache_dir"] = CACHE_DIR
-    pipeline_kwargs["num_workers"] = num_workers
+    response_cache = prepare_response_cache(disable_cache, cache_dir)
+    if response_cache is not None:
+        pipeline_kwargs["cache_dir"] = response_cache
+    pipeline_kwargs["num_workers"] = pipeline_num_workers(num_workers)
 
-    # set the tags
-    tags = {RUN_TYPE_TAG_NAME: RUN_TYPE_ANNOTATOR}
-    # tag for each annotator id to help make them searchable
-    tags.update(
-        {
-            f"annotator_{annotator_id}": "true"
-            for annotator_id in pipeline_kwargs["annotators"]
-        }
-    )
-    if ensemble_strategy is not None:
-        tags["ensemble_strategy"] = ensemble_strategy
+    tags = annotation_tags(pipeline_kwargs["annotators"], ensemble_strategy)
+    if previous_annotation_run_id is not None:
+        tags["previous_annotation_run_id"] = previous_annotation_run_id
 
     experiment_id = get_experiment_id(experiment)
     if overwrite and response_run_id:
         run_id = response_run_id
     else:
-        run_id = None
+        run_id = resume_run_id
 
     params = {"num_workers": num_workers}
 
-    with mlflow.start_run(run_id=run_id, experiment_id=experiment_id, tags=tags) as run:
-        mlflow.log_params(params)
+    # Runs are nested under the active run, if any, e.g. by `pipeline`.
+    with (
+        mlflow.start_run(
+            run_id=run_id, experiment_id=experiment_id, tags=tags, nested=True
+        ) as run,
+        BatchLogger(run.info.run_id) as logger,
+    ):
+        if resume_run_id is None:
+            logger.log_params(params)
+        if num_workers == AUTO_NUM_WORKERS:
+            autoscale_annotators(pipeline_kwargs["annotators"], logger)
+        rate_limiters = shared_rate_limit(pipeline_kwargs["annotators"], "annotate")
         if response_run_id is not None:
             log_tags(response_run_id)
+        attempt_dir = new_attempt_dir(run.info.run_id)
+        response_artifact = None
+        if input_object is None and response_file is None and response_run_id:
+            response_artifact = find_artifact(response_run_id, RESPONSE_ARTIFACT_NAMES)
 
-        with tempfile.TemporaryDirectory() as tmp:
+        timer = PhaseTimer()
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            ArtifactUploader(run.info.run_id, compress=compress_artifacts) as uploader,
+        ):
             # load/transform the prompt responses from the specified run
-            input_data = build_and_log_input(
-                input_object=input_object,
-                path=response_file,
-                run_id=response_run_id,
-                artifact_path=PROMPT_RESPONSE_ARTIFACT_NAME,
-                dvc_repo=dvc_repo,
-                dest_dir=tmp,
-            )
-            input_path = input_data.local_path()  # type: ignore
-            pipeline_kwargs["input_path"] = pathlib.Path(input_path)
-            pipeline_kwargs["output_dir"] = pathlib.Path(tmp)
-            pipeline_runner = build_runner(
-                prompt_uid_col=prompt_uid_col,
-                prompt_text_col=prompt_text_col,
-                sut_uid_col=sut_uid_col,
-                sut_response_col=sut_response_col,
-                **pipeline_kwargs,
-            )
+            with timer.phase("download"):
+                input_data = build_and_log_input(
+                    input_object=input_object,
+                    path=response_file,
+                    run_id=response_run_id,
+                    artifact_path=response_artifact,
+                    dvc_repo=dvc_repo,
+                    dest_dir=tmp,
+                    uploader=uploader,
+                    logger=logger,
+                )
+                previous = _load_previous_annotations(
+                    resume_run_id, previous_annotation_run_id, tmp, output_dir
+                )
+            input_path = _as_csv(input_data.local_path(), tmp)  # type: ignore
+            output_root = pathlib.Path(output_dir) if output_dir else attempt_dir
+            annotator_uids = list(pipeline_kwargs["annotators"])
+            kept = None
+            if previous is None:
+                # Every response gets every annotation.
+                groups = {tuple(annotator_uids): input_path}
+            else:
+                groups, kept = _missing_annotations(
+                    previous,
+                    input_path,
+                    prompt_uid_col or SCHEMA.prompt_uid,
+                    sut_uid_col or SCHEMA.sut_uid,
+                    annotator_uids,
+                    attempt_dir,
+                )
+            pipeline_runners = {
+                uids: build_runner(
+                    prompt_uid_col=prompt_uid_col,
+                    prompt_text_col=prompt_text_col,
+                    sut_uid_col=sut_uid_col,
+                    sut_response_col=sut_response_col,
+                    **{
+                        **pipeline_kwargs,
+                        "annotators": _with_ensemble_members(
+                            pipeline_kwargs["annotators"], uids
+                        ),
+                        "input_path": path,
+                        "output_dir": (
+                            output_root if kept is None else output_root / f"group-{i}"
+                        ),
+                    },
+                )
+                for i, (uids, path) in enumerate(groups.items())
+            }
+            outputs = {
+                uids: runner.output_dir() / runner.output_file_name
+                for uids, runner in pipeline_runners.items()
+            }
 
-            pipeline_runner.run(
-                progress_callback=mlflow.log_metrics, debug=is_debug_mode()
+            with (
+                Checkpointer(
+                    run.info.run_id, output_root, attempt_dir.name
+                ) as checkpointer,
+                timer.phase("pipeline"),
+                ProgressSink(logger) as progress,
+            ):
+                for path in outputs.values():
+                    checkpointer.watch(path)
+                if kept is not None:
+                    # The earlier annotations go along, so this attempt's
+                    # checkpoint has all the annotations so far.
+                    kept_path = (
+                        attempt_dir / "previous" / ANNOTATION_RESPONSE_ARTIFACT_NAME
+                    )
+                    kept_path.parent.mkdir()
+                    kept.to_csv(kept_path, index=False)
+                    checkpointer.watch(kept_path, f"previous/{kept_path.name}")
+                for runner in pipeline_runners.values():
+                    runner.run(progress_callback=progress, debug=is_debug_mode())
+            log_throttle_waits(logger, rate_limiters)
+            logger.set_tag(
+                MODELGAUGE_RUN_TAG_NAME,
+                ",".join(runner.run_id for runner in pipeline_runners.values()),
             )
-            mlflow.set_tag(MODELGAUGE_RUN_TAG_NAME, pipeline_runner.run_id)
+            if kept is None:
+                (output_path,) = outputs.values()
+            else:
+                output_path = output_root / ANNOTATION_RESPONSE_ARTIFACT_NAME
+                computed = _merge_annotations(outputs, kept, output_path)
+                logger.log_metrics(
+                    {
+                        "reused_annotation_count": len(kept),
+                        "computed_annotation_count": computed,
+                    }
+                )
 
             # log the output to mlflow's artifact store
-            mlflow.log_artifact(
-                local_path=pipeline_runner.output_dir()
-                / pipeline_runner.output_file_name,
-            )
+            with timer.phase("upload"):
+                artifact_names = log_output_artifacts(
+                    uploader,
+                    output_path,
+                    artifact_format,
+                    annotation_col=SCHEMA.annotation,
+                )
 
             # log summary statistics
-            annotator_uids = sorted(pipeline_kwargs["annotators"].keys())
-            log_safety_summary(
-                annotator_uids=(
-                    annotator_uids
-                    if ensemble_strategy is None
-                    else annotator_uids + [DEFAULT_ENSEMBLE_ANNOTATOR_UID]
-                ),
-                data_path=pipeline_runner.output_dir()
-                / pipeline_runner.output_file_name,
-                dir=tmp,
-            )
-            artifacts = {
-                input_data.local_path().name: input_data.artifact,
-                pipeline_runner.output_file_name: Artifact(
+            with timer.phase("summary"):
+                log_safety_summary(
+                    annotator_uids=summary_annotator_uids(
+                        pipeline_kwargs["annotators"], ensemble_strategy
+                    ),
+                    data_path=output_path,
+                    dir=tmp,
+                    logger=logger,
+                    uploader=uploader,
+                )
+            with timer.phase("upload_wait"):
+                uploader.wait()
+            logger.log_metrics(timer.metrics())
+            artifacts = {input_data.local_path().name: input_data.artifact}
+            for name in artifact_names:
+                artifacts[name] = Artifact(
                     experiment_id=run.info.experiment_id,
                     run_id=run.info.run_id,
-                    name=pipeline_runner.output_file_name,
-                ),
-            }
-        return RunArtifacts(run_id=run.info.run_id, artifacts=artifacts)
+                    name=name,
+                )
+            local_paths = {}
+            if output_dir is not None:
+                local_paths[output_path.name] = output_path
+        remove_work_dir(run.info.run_id)
+        return RunArtifacts(
+            run_id=run.info.run_id, artifacts=artifacts, local_paths=local_paths
+        )
+
+
+def _load_previous_annotations(
+    resume_run_id: str | None,
+    previous_annotation_run_id: str | None,
+    dest_dir: str,
+    output_dir: str | None = None,
+) -> pd.DataFrame | None:
+    """
+    The annotations that don't need to be computed again: those checkpointed by
+    the run being resumed (or left in `output_dir` by it), and those of an
+    earlier annotation run.
+    """
+    frames = []
+    if resume_run_id is not None:
+        frames.append(
+            load_partial_outputs(
+                resume_run_id,
+                ANNOTATION_RESPONSE_ARTIFACT_NAME,
+                ANNOTATION_KEY_COLS,
+                output_dir,
+            )
+        )
+    if previous_annotation_run_id is not None:
+        previous_dir = os.path.join(dest_dir, "previous")
+        previous_input = build_input(
+            run_id=previous_annotation_run_id,
+            artifact_path=find_artifact(
+                previous_annotation_run_id, ANNOTATION_ARTIFACT_NAMES
+            ),
+            dest_dir=previous_dir,
+        )
+        frames.append(
+            pd.read_csv(
+                _as_csv(previous_input.local_path(), previous_dir),
+                dtype=str,
+                keep_default_na=False,
+            )
+        )
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).drop_duplicates(
+        subset=ANNOTATION_KEY_COLS
+    )
+
+
+def _as_csv(path: pathlib.Path, dest_dir: str) -> pathlib.Path:
+    """`path`, converted to CSV in `dest_dir` if it's Parquet, as modelgauge reads CSV."""
+    path = pathlib.Path(path)
+    if path.suffix != ".parquet":
+        return path
+    csv_path = pathlib.Path(dest_dir) / path.with_suffix(".csv").name
+    parquet_to_csv(path, csv_path)
+    return csv_path
+
+
+def _missing_annotations(
+    previous: pd.DataFrame,
+    responses_path: pathlib.Path,
+    prompt_uid_col: str,
+    sut_uid_col: str,
+    annotator_uids: List[str],
+    work_dir: pathlib.Path,
+) -> Tuple[Dict[Tuple[str, ...], pathlib.Path], pd.DataFrame]:
+    """
+    Group the responses by which annotators are missing from `previous` for
+    them, and write each group to `work_dir`.
+
+    Returns the paths of the groups, keyed by their missing annotators, and the
+    previous annotations by the requested annotators, which are kept.
+    """
+    responses = pd.read_csv(responses_path, dtype=str, keep_default_na=False)
+    keys = pd.MultiIndex.from_frame(responses[[prompt_uid_col, sut_uid_col]])
+    kept = previous[previous[SCHEMA.annotator_uid].isin(annotator_uids)]
+    # A bit for each annotator that still has to annotate the response.
+    missing = pd.Series(0, index=responses.index)
+    for bit, uid in enumerate(annotator_uids):
+        done = kept[kept[SCHEMA.annotator_uid] == uid]
+        done_keys = pd.MultiIndex.from_frame(done[[SCHEMA.prompt_uid, SCHEMA.sut_uid]])
+        missing |= (~keys.isin(done_keys)).astype(int) * (1 << bit)
+    groups = {}
+    for mask, group in responses.groupby(missing, sort=False):
+        if mask == 0:
+            continue
+        uids = tuple(uid for bit, uid in enumerate(annotator_uids) if mask >> bit & 1)
+        path = work_dir / f"responses-{len(groups)}.csv"
+        group.to_csv(path, index=False)
+        groups[uids] = path
+    return groups, kept
+
+
+def _with_ensemble_members(
+    annotators: Dict[str, Annotator], uids: Tuple[str, ...]
+) -> Dict[str, Annotator]:
+    """The annotators to run for `uids`; the ensemble needs all its members' annotations."""
+    if DEFAULT_ENSEMBLE_ANNOTATOR_UID in uids:
+        return annotators
+    return {uid: annotators[uid] for uid in uids}
+
+
+def _merge_annotations(
+    outputs: Dict[Tuple[str, ...], pathlib.Path],
+    kept: pd.DataFrame,
+    dest: pathlib.Path,
+) -> int:
+    """
+    Write the new annotations by each group's missing annotators, followed by
+    the kept ones, to `dest`. Returns the number of new annotations.
+    """
+    header = None
+    computed = 0
+    with open(dest, "w", newline="") as out:
+        writer = csv.writer(out)
+        for uids, path in outputs.items():
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                file_header = next(reader, None)
+                if file_header is None:
+                    continue
+                if header is None:
+                    header = file_header
+                    writer.writerow(header)
+                assert (
+                    file_header == header
+                ), f"Annotations by {uids} have different columns: {file_header}"
+                annotator_col = header.index(SCHEMA.annotator_uid)
+                for row in reader:
+                    # Ensemble members may have only been run for the ensemble.
+                    if row[annotator_col] in uids:
+                        writer.writerow(row)
+                        computed += 1
+        if header is None:
+            header = list(kept.columns)
+            writer.writerow(header)
+    kept[header].to_csv(dest, mode="a", header=False, index=False)
+    return computed
+
+
+def annotation_tags(annotator_uids, ensemble_strategy: str | None) -> Dict[str, str]:
+    tags = {RUN_TYPE_TAG_NAME: RUN_TYPE_ANNOTATOR}
+    # tag for each annotator id to help make them searchable
+    tags.update(
+        {f"annotator_{annotator_id}": "true" for annotator_id in annotator_uids}
+    )
+    if ensemble_strategy is not None:
+        tags["ensemble_strategy"] = ensemble_strategy
+    return tags
+
+
+def summary_annotator_uids(annotator_uids, ensemble_strategy: str | None) -> List[str]:
+    annotator_uids = sorted(annotator_uids)
+    if ensemble_strategy is None:
+        return annotator_uids
+    return annotator_uids + [DEFAULT_ENSEMBLE_ANNOTATOR_UID]
+
+
+def autoscale_annotators(annotators: Dict[str, Annotator], logger: BatchLogger):
+    for uid, annotator in annotators.items():
+        # The ensemble only combines the other annotators' results.
+        if uid != DEFAULT_ENSEMBLE_ANNOTATOR_UID:
+            autoscale(annotator, "annotate", uid, logger)
 
 
 def _get_annotator_settings(
@@ -151,6 +467,7 @@ def _get_annotator_settings(
 
     kwargs = {}
 
+    load_plugins()
     kwargs["annotators"] = _get_annotators(annotator_ids)
 
     if ensemble_strategy is not None:
@@ -182,48 +499,112 @@ def log_safety_summary(
     annotator_uids: List[str],
     data_path: str,
     dir: str,
+    logger: BatchLogger,
+    uploader: ArtifactUploader | None = None,
 ):
-    all_log_probs = collections.defaultdict(list)
+    """Log safe/total counts and log-probability stats and histograms per annotator.
+
+    Streams over the annotations once. The log-probabilities are spooled to
+    files in `dir` as they are read, and binned into histograms spanning their
+    observed range afterwards, so memory stays constant per annotator
+    regardless of the number of annotations. With an `uploader`, the
+    histograms are uploaded in the background.
+    """
     total_safe = collections.Counter()
     total = collections.Counter()
+    logprob_stats = collections.defaultdict(RunningStats)
+    spool_dir = tempfile.mkdtemp(dir=dir)
+    logprob_spools = {}
+    failures = {}
 
-    with AnnotationDataset(data_path, "r") as dataset:
-        for item in dataset:
-            if "is_safe" not in item.annotation:
+    for item in _iter_safety_annotations(data_path):
+        annotator_uid = item.annotator_uid
+        total[annotator_uid] += 1
+        if item.annotation["is_safe"]:
+            total_safe[annotator_uid] += 1
+        if "logprobs" in item.annotation and annotator_uid not in failures:
+            # TODO: the format for the log probs isn't always the same
+            # in particular, the private ensemble uses a different format
+            try:
+                logprob = float(item.annotation["logprobs"])
+            except (TypeError, ValueError) as e:
+                failures[annotator_uid] = e
                 continue
-            is_safe = item.annotation["is_safe"]
-            if "logprobs" in item.annotation:
-                all_log_probs[item.annotator_uid].append(item.annotation["logprobs"])
-            total[item.annotator_uid] += 1
-            if is_safe:
-                total_safe[item.annotator_uid] += 1
+            logprob_stats[annotator_uid].add(logprob)
+            if annotator_uid not in logprob_spools:
+                logprob_spools[annotator_uid] = ValueSpool(
+                    os.path.join(spool_dir, f"{len(logprob_spools)}.f64")
+                )
+            logprob_spools[annotator_uid].add(logprob)
+
+    histograms = {}
+    for annotator_uid in annotator_uids:
+        if annotator_uid in failures:
+            continue
+        try:
+            histograms[annotator_uid] = Histogram.spanning(
+                logprob_stats[annotator_uid], bins=LOGPROB_HIST_BINS
+            )
+            if annotator_uid in logprob_spools:
+                for chunk in logprob_spools[annotator_uid].chunks():
+                    histograms[annotator_uid].add_many(chunk)
+        except Exception as e:
+            failures[annotator_uid] = e
+    for spool in logprob_spools.values():
+        spool.close()
+    shutil.rmtree(spool_dir, ignore_errors=True)
+
     # Log metrics.
     for annotator_uid in annotator_uids:
-        mlflow.log_metric(f"{annotator_uid}_total_safe", total_safe[annotator_uid])
-        mlflow.log_metric(f"{annotator_uid}_total_count", total[annotator_uid])
-        # TODO: the format for the log probs isn't always the same
-        # in particular, the private ensemble uses a different format
+        logger.log_metrics(
+            {
+                f"{annotator_uid}_total_safe": total_safe[annotator_uid],
+                f"{annotator_uid}_total_count": total[annotator_uid],
+            }
+        )
+        if annotator_uid in failures:
+            print(f"Failed to log stats for {annotator_uid}: {failures[annotator_uid]}")
+            continue
         try:
-            log_stats(f"{annotator_uid}_logprobs_", all_log_probs[annotator_uid])
-            log_hist(dir, f"{annotator_uid}", all_log_probs[annotator_uid])
+            log_stats(
+                f"{annotator_uid}_logprobs_", logprob_stats[annotator_uid], logger
+            )
+            log_hist(dir, f"{annotator_uid}", histograms[annotator_uid], uploader)
         except Exception as e:
             print(f"Failed to log stats for {annotator_uid}: {e}")
 
 
-def log_stats(tag_prefix, values):
-    values = np.array(values)
-    # count non-NaN values
-    if np.count_nonzero(~np.isnan(values)) == 0:
+def _iter_safety_annotations(data_path: str):
+    with AnnotationDataset(data_path, "r") as dataset:
+        for item in dataset:
+            if "is_safe" in item.annotation:
+                yield item
+
+
+def log_stats(tag_prefix, stats: RunningStats, logger: BatchLogger):
+    stats.finalize()
+    # only log if there were non-NaN values
+    if stats.count == 0:
         return
-    mlflow.log_metric(f"{tag_prefix}mean", float(np.nanmean(values)))
-    mlflow.log_metric(f"{tag_prefix}min", float(np.nanmin(values)))
-    mlflow.log_metric(f"{tag_prefix}max", float(np.nanmax(values)))
-    mlflow.log_metric(f"{tag_prefix}std", float(np.nanstd(values)))
+    logger.log_metrics(
+        {
+            f"{tag_prefix}mean": stats.mean,
+            f"{tag_prefix}min": stats.min,
+            f"{tag_prefix}max": stats.max,
+            f"{tag_prefix}std": stats.std,
+        }
+    )
 
 
-def log_hist(dir, tag, values):
+def log_hist(dir, tag, histogram: Histogram, uploader: ArtifactUploader | None = None):
+    # matplotlib is slow to import, so only pay for it when plotting.
+    from matplotlib import pyplot as plt
+
+    histogram.finalize()
     plt.figure()
-    plt.hist(values, bins=30)
+    # Weighting each bin's left edge by its count draws the same bars as
+    # plt.hist(values, bins=LOGPROB_HIST_BINS) without needing the values.
+    plt.hist(histogram.edges[:-1], bins=histogram.edges, weights=histogram.counts)
     plt.title(f"Log-Probabilities for {tag}")
     plt.xlabel("log P(is_safe)")
     plt.ylabel("Frequency")
@@ -231,4 +612,8 @@ def log_hist(dir, tag, values):
     filename = os.path.join(dir, f"{tag}_logprobs_hist.png")
     plt.savefig(filename)
     plt.close()
-    mlflow.log_artifact(filename)
+    if uploader is None:
+        mlflow.log_artifact(filename)
+    else:
+        # PNGs are compressed already.
+        uploader.upload(filename, compress=False)
@@ -0,0 +1,135 @@
+"""Management of the local cache of SUT and annotator responses."""
+
+import datetime
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List
+
+import mlflow
+
+from modelplane.runways.utils import (
+    RUN_TYPE_CACHE_EXPORT,
+    RUN_TYPE_TAG_NAME,
+    get_experiment_id,
+)
+from modelplane.utils.responsecache import (
+    CacheFileStats,
+    ResponseCache,
+    response_cache_dir,
+)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+CACHE_BUNDLE_ARTIFACT_NAME = "response-cache.tar.gz"
+
+
+def cache_stats(cache_dir: str | None = None):
+    cache = ResponseCache(response_cache_dir(cache_dir))
+    stats = cache.stats()
+    print(f"Response cache: {cache.root}")
+    for s in stats:
+        _print_file(cache, s)
+    print(
+        f"Total: {len(stats)} files, {sum(s.entries for s in stats)} entries, "
+        f"{_format_bytes(sum(s.size_bytes for s in stats))}"
+    )
+
+
+def prune_cache(
+    cache_dir: str | None = None,
+    max_age_days: float | None = None,
+    max_bytes: int | None = None,
+):
+    if max_age_days is None and max_bytes is None:
+        raise ValueError("Give a maximum age and/or size to prune the cache to.")
+    cache = ResponseCache(response_cache_dir(cache_dir))
+    removed = cache.prune(
+        max_age_seconds=(
+            None if max_age_days is None else max_age_days * SECONDS_PER_DAY
+        ),
+        max_bytes=max_bytes,
+    )
+    for s in removed:
+        print("Removed", end=" ")
+        _print_file(cache, s)
+    print(
+        f"Removed {len(removed)} files, "
+        f"{_format_bytes(sum(s.size_bytes for s in removed))}"
+    )
+
+
+def export_cache(
+    uids: List[str] | None = None,
+    output: str | None = None,
+    cache_dir: str | None = None,
+    experiment: str | None = None,
+) -> str | None:
+    """
+    Bundle the cached responses of the SUTs/annotators matching the `uids`
+    patterns (all if None) into `output`, and/or log the bundle to a new run in
+    `experiment`. Returns the run ID, if the bundle was logged.
+    """
+    if output is None and experiment is None:
+        raise ValueError("Give an output file and/or an experiment to export to.")
+    cache = ResponseCache(response_cache_dir(cache_dir))
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = Path(tmp) / CACHE_BUNDLE_ARTIFACT_NAME
+        exported = cache.export(bundle, uids)
+        if not exported:
+            print(f"No cached responses in {cache.root} to export.")
+            return None
+        for path in exported:
+            print("Exported", path.relative_to(cache.root))
+        run_id = None
+        if experiment is not None:
+            tags = {RUN_TYPE_TAG_NAME: RUN_TYPE_CACHE_EXPORT}
+            if uids:
+                tags["uids"] = ",".join(uids)
+            with mlflow.start_run(
+                experiment_id=get_experiment_id(experiment), tags=tags
+            ) as run:
+                mlflow.log_artifact(str(bundle))
+                run_id = run.info.run_id
+            print(f"Logged {CACHE_BUNDLE_ARTIFACT_NAME} to run {run_id}")
+        if output is not None:
+            # Not os.replace: the output may be on another filesystem than tmp.
+            shutil.move(bundle, output)
+            print(f"Wrote {output}")
+    return run_id
+
+
+def import_cache(
+    bundle: str | None = None,
+    run_id: str | None = None,
+    cache_dir: str | None = None,
+):
+    """Add the cached responses from a bundle file, or one logged to `run_id`, to the cache."""
+    if (bundle is None) == (run_id is None):
+        raise ValueError("Give either a bundle file or a run ID to import from.")
+    cache = ResponseCache(response_cache_dir(cache_dir))
+    with tempfile.TemporaryDirectory() as tmp:
+        if run_id is not None:
+            bundle = mlflow.artifacts.download_artifacts(
+                run_id=run_id, artifact_path=CACHE_BUNDLE_ARTIFACT_NAME, dst_path=tmp
+            )
+        for path in cache.import_bundle(bundle):
+            print("Imported", path.relative_to(cache.root))
+
+
+def _print_file(cache: ResponseCache, s: CacheFileStats):
+    last_write = datetime.datetime.fromtimestamp(s.last_write).isoformat(
+        sep=" ", timespec="seconds"
+    )
+    print(
+        f"{s.path.relative_to(cache.root)}: {s.entries} entries, "
+        f"{_format_bytes(s.size_bytes)}, last written {last_write}"
+    )
+
+
+def _format_bytes(size: float) -> str:
+    if size < 1024:
+        return f"{size:.0f} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}"
@@ -0,0 +1,219 @@
+"""Checkpoints of partial runway outputs, so that crashed runs can be resumed."""
+
+import csv
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import List
+
+import mlflow
+import mlflow.artifacts
+import pandas as pd
+from mlflow.exceptions import MlflowException
+from mlflow.tracking import MlflowClient
+
+from modelplane.utils.filecache import default_cache_root
+
+CHECKPOINT_ARTIFACT_DIR = "checkpoint"
+CHECKPOINT_INTERVAL_ENV = "MODELPLANE_CHECKPOINT_INTERVAL_SECONDS"
+DEFAULT_CHECKPOINT_INTERVAL = 300.0
+
+
+def run_work_dir(run_id: str) -> Path:
+    """Durable working directory for the outputs of an MLflow run.
+
+    Unlike a temporary directory, it survives a crash, so a resumed run can
+    pick up the partial outputs. It's removed once the run succeeds.
+    """
+    return default_cache_root() / "runs" / run_id
+
+
+def new_attempt_dir(run_id: str) -> Path:
+    """A fresh directory in the run's working directory for this attempt at the run.
+
+    Attempts are numbered after all the earlier ones: those in the working
+    directory, those downloaded from the checkpoint artifacts into it, and those
+    only in the checkpoint artifacts, so that this attempt's checkpoints don't
+    overwrite theirs.
+    """
+    work_dir = run_work_dir(run_id)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    names = [path.name for path in work_dir.glob("attempt-*")]
+    names += [
+        path.name for path in (work_dir / CHECKPOINT_ARTIFACT_DIR).glob("attempt-*")
+    ]
+    names += _checkpointed_attempts(run_id)
+    numbers = [
+        int(number)
+        for number in (name.removeprefix("attempt-") for name in names)
+        if number.isdigit()
+    ]
+    attempt = max(numbers, default=-1) + 1
+    attempt_dir = work_dir / f"attempt-{attempt}"
+    attempt_dir.mkdir()
+    return attempt_dir
+
+
+def _checkpointed_attempts(run_id: str) -> List[str]:
+    """The names of the attempts with checkpoint artifacts in the run."""
+    try:
+        infos = MlflowClient().list_artifacts(run_id, CHECKPOINT_ARTIFACT_DIR)
+    except (MlflowException, OSError):
+        return []
+    return [Path(info.path).name for info in infos if info.is_dir]
+
+
+def remove_work_dir(run_id: str) -> None:
+    shutil.rmtree(run_work_dir(run_id), ignore_errors=True)
+
+
+class Checkpointer:
+    """Periodically uploads the partial outputs of a run to its `checkpoint/` artifacts.
+
+    Watched files are uploaded every `interval` seconds while the run goes
+    on, and once more if it fails, so that it can be resumed on another
+    machine. A snapshot of each file is uploaded, since the pipeline keeps
+    appending to it.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        local_root: Path,
+        artifact_dir: str,
+        interval: float | None = None,
+    ):
+        self.run_id = run_id
+        self.local_root = Path(local_root)
+        self.artifact_dir = f"{CHECKPOINT_ARTIFACT_DIR}/{artifact_dir}"
+        if interval is None:
+            interval = float(
+                os.getenv(CHECKPOINT_INTERVAL_ENV, DEFAULT_CHECKPOINT_INTERVAL)
+            )
+        self.interval = interval
+        self._paths: List[tuple[Path, Path]] = []
+        self._client = MlflowClient()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="modelplane-checkpoint", daemon=True
+        )
+
+    def watch(self, path: Path, relative: str | None = None) -> None:
+        """
+        Checkpoint `path` as `relative` in this attempt's checkpoint directory,
+        by default its path relative to `local_root`.
+        """
+        path = Path(path)
+        if relative is None:
+            relative = path.relative_to(self.local_root).as_posix()
+        self._paths.append((path, Path(relative)))
+
+    def upload(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            for path, relative in list(self._paths):
+                if not path.exists():
+                    continue
+                snapshot = Path(tmp) / relative.name
+                shutil.copyfile(path, snapshot)
+                artifact_path = self.artifact_dir
+                if relative.parent != Path("."):
+                    artifact_path += f"/{relative.parent.as_posix()}"
+                self._client.log_artifact(self.run_id, str(snapshot), artifact_path)
+
+    def close(self, failed: bool = False) -> None:
+        self._closed.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if failed:
+            self.upload()
+
+    def __enter__(self) -> "Checkpointer":
+        if self.interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(failed=exc_type is not None)
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.interval):
+            try:
+                self.upload()
+            except Exception as e:
+                # Checkpoints are best effort; the run itself goes on.
+                print(f"Failed to upload checkpoint: {e}")
+
+
+def load_partial_outputs(
+    run_id: str, name: str, key_cols: List[str], output_dir: str | None = None
+) -> pd.DataFrame | None:
+    """
+    The rows of the output files called `name` that earlier attempts of the run
+    completed, without duplicates by `key_cols`, or None if there are none.
+    The local working directory is used if it has any, along with
+    `output_dir`, where the earlier attempts wrote their outputs if they were
+    given one; otherwise the checkpoint artifacts are downloaded into the
+    working directory.
+    """
+    work_dir = run_work_dir(run_id)
+    local_dirs = [work_dir] + ([Path(output_dir)] if output_dir else [])
+    paths = sorted(
+        path
+        for local_dir in local_dirs
+        if local_dir.exists()
+        for path in local_dir.rglob(name)
+    )
+    if not paths:
+        try:
+            mlflow.artifacts.download_artifacts(
+                run_id=run_id,
+                artifact_path=CHECKPOINT_ARTIFACT_DIR,
+                dst_path=str(work_dir),
+            )
+        except (MlflowException, OSError):
+            return None
+        paths = sorted(work_dir.rglob(name))
+    frames = [read_complete_rows(path) for path in paths]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).drop_duplicates(subset=key_cols)
+
+
+def read_complete_rows(path: Path) -> pd.DataFrame | None:
+    """The rows of a CSV file that was possibly cut off mid-write, as strings.
+
+    A crash can leave the last record incomplete, possibly in the middle of
+    a quoted field that spans lines. Only records terminated by a line end,
+    and with as many fields as the header, are kept.
+    """
+    # Whether the last line read was terminated.
+    terminated = True
+
+    def lines(f):
+        nonlocal terminated
+        # Iterating the file (unlike str.splitlines) only splits on \n and
+        # \r, so other line breaks in quoted fields stay in their record.
+        for line in f:
+            terminated = line.endswith(("\n", "\r"))
+            yield line
+
+    rows = []
+    with open(path, newline="") as f:
+        try:
+            for row in csv.reader(lines(f), strict=True):
+                if not terminated:
+                    # The last record was cut off.
+                    break
+                rows.append(row)
+        except csv.Error:
+            # The last record is incomplete.
+            pass
+    if not rows:
+        return None
+    header, rows = rows[0], rows[1:]
+    return pd.DataFrame(
+        [row for row in rows if len(row) == len(header)], columns=header, dtype=str
+    )
@@ -1,7 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import hashlib
 import os
+import re
 import shutil
+import subprocess
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -9,10 +13,31 @@ import dvc.api
 import mlflow
 import mlflow.artifacts
 import pandas as pd
+from mlflow.tracking import MlflowClient
+
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.datasets import (
+    DIGEST_MODE_CONTENT,
+    LocalDatasetSource,
+    RunArtifactDatasetSource,
+    log_dataset_reference,
+)
+from modelplane.mlflow.uploader import GZIP_SUFFIX, ArtifactUploader, decompress
+from modelplane.utils.digests import content_digest, digest_index
+from modelplane.utils.filecache import FileCache, default_cache_root, link_or_copy
 
 _MLFLOW_REQUIRED_ERROR_MESSAGE = (
     "An active MLflow run is required to log input artifacts."
 )
+# Size limits of the local caches of downloaded MLflow artifacts and DVC
+# files. 0 disables the corresponding cache.
+ARTIFACT_CACHE_MAX_BYTES_ENV = "MODELPLANE_ARTIFACT_CACHE_MAX_BYTES"
+DEFAULT_ARTIFACT_CACHE_MAX_BYTES = 20 * 2**30
+DVC_CACHE_MAX_BYTES_ENV = "MODELPLANE_DVC_CACHE_MAX_BYTES"
+DEFAULT_DVC_CACHE_MAX_BYTES = 20 * 2**30
+# Set to "true" to record a reference to inputs read from other runs'
+# artifacts, instead of uploading a copy of them.
+REFERENCE_INPUT_ARTIFACTS_ENV = "MODELPLANE_REFERENCE_INPUT_ARTIFACTS"
 
 
 class Artifact:
@@ -36,6 +61,8 @@ class Artifact:
 class RunArtifacts:
     run_id: str
     artifacts: dict[str, Artifact | None]
+    # Outputs kept on local disk (see `output_dir` of the runways), by artifact name.
+    local_paths: dict[str, Path] = field(default_factory=dict)
 
 
 class BaseInput(ABC):
@@ -46,14 +73,27 @@ class BaseInput(ABC):
     def __init__(self):
         self.input_run_id = None
         self._artifact = None
+        # Content digest of the dataset, once it's logged.
+        self.digest: str | None = None
+        # SHA-256 of the local file, when it's known without hashing the
+        # file, e.g. because it came from a `FileCache`.
+        self._content_digest: str | None = None
 
     def __init_subclass__(cls):
         super().__init_subclass__()
         if not hasattr(cls, "input_type"):
             raise TypeError(f"{cls.__name__} must define class attribute 'input_type'")
 
-    def log_artifact(self):
-        """Log the dataset to MLflow as an artifact to the current run."""
+    def log_artifact(
+        self,
+        uploader: ArtifactUploader | None = None,
+        logger: BatchLogger | None = None,
+    ):
+        """Log the dataset to MLflow as an artifact to the current run.
+
+        With an `uploader`, the upload goes on in the background. With a
+        `logger`, the input's tags and metrics go out in its batches.
+        """
         if self.input_run_id is not None:
             raise ValueError(
                 f"Input has already been logged with an input_run_id: {self.input_run_id}"
@@ -61,15 +101,35 @@ class BaseInput(ABC):
         current_run = mlflow.active_run()
         if current_run is None:
             raise ValueError("An active MLflow run is required to log input artifacts.")
+        self._artifact = self._store_artifact(current_run, uploader)
+        tags = self.input_tags()
+        metrics = self.input_metrics()
+        if logger is not None:
+            logger.set_tags(tags)
+            if metrics:
+                logger.log_metrics(metrics)
+        else:
+            mlflow.set_tags(tags)
+            if metrics:
+                mlflow.log_metrics(metrics)
+        self.input_run_id = current_run.info.run_id
+
+    def _store_artifact(
+        self, current_run, uploader: ArtifactUploader | None = None
+    ) -> Artifact:
+        """Upload the dataset to the current run's artifact store."""
         local = self.local_path()
-        mlflow.log_artifact(str(local))
-        mlflow.set_tags(self.input_tags())
-        self._artifact = Artifact(
+        if uploader is None:
+            mlflow.log_artifact(str(local))
+            name = local.name
+        else:
+            name = uploader.upload(local)
+        self.digest = _log_local_dataset(local, self._content_digest)
+        return Artifact(
             experiment_id=current_run.info.experiment_id,
             run_id=current_run.info.run_id,
-            name=local.name,
+            name=name,
         )
-        self.input_run_id = current_run.info.run_id
 
     @property
     def artifact(self) -> Artifact | None:
@@ -82,6 +142,8 @@ class BaseInput(ABC):
     def input_tags(self) -> dict:
         tags = {"input_type": self.input_type}
         tags.update(self.tags_for_input_type)
+        if self.digest is not None:
+            tags["input_digest"] = self.digest
         return tags
 
     @property
@@ -89,6 +151,10 @@ class BaseInput(ABC):
     def tags_for_input_type(self) -> dict:
         pass
 
+    def input_metrics(self) -> dict:
+        """Metrics about how the input was obtained, e.g. cache hits."""
+        return {}
+
 
 class LocalInput(BaseInput):
     """A dataset that is stored locally."""
@@ -108,7 +174,11 @@ class LocalInput(BaseInput):
 
 
 class DataframeInput(BaseInput):
-    """A dataset that is represented as a Pandas DataFrame."""
+    """A dataset that is represented as a Pandas DataFrame.
+
+    The dataframe is only written to disk once a local file is needed, and is
+    only rewritten if its content changed since the last write.
+    """
 
     input_type = "dataframe"
     _INPUT_FILE_NAME = "input.csv"
@@ -116,6 +186,7 @@ class DataframeInput(BaseInput):
     def __init__(self, df: pd.DataFrame, dest_dir: str):
         super().__init__()
         self._local_path = Path(dest_dir) / self._INPUT_FILE_NAME
+        self._written_digest: str | None = None
         self.df = df
 
     @property
@@ -125,12 +196,20 @@ class DataframeInput(BaseInput):
     @df.setter
     def df(self, df: pd.DataFrame):
         self._df = df
-        self._update_local_file()
 
     def _update_local_file(self):
+        digest = _dataframe_digest(self.df)
+        if (
+            digest is not None
+            and digest == self._written_digest
+            and self._local_path.exists()
+        ):
+            return
         self.df.to_csv(self._local_path, index=False)
+        self._written_digest = digest
 
     def local_path(self) -> Path:
+        self._update_local_file()
         return self._local_path
 
     @property
@@ -138,6 +217,17 @@ class DataframeInput(BaseInput):
         return {}
 
 
+def _dataframe_digest(df: pd.DataFrame) -> str | None:
+    """Hash of the dataframe's content, or None if it holds unhashable values."""
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    except TypeError:
+        return None
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+    return digest.hexdigest()
+
+
 class DVCInput(BaseInput):
     """A dataset from a DVC remote."""
 
@@ -150,17 +240,56 @@ class DVCInput(BaseInput):
             repo, self.rev = repo_path
         else:
             self.rev = "main"
+        self.commit: str | None = None
+        self.cache_hit: bool | None = None
         self._local_path = self._download_dvc_file(path, repo, dest_dir)
         self._tags = {"input_repo": repo, "input_rev": self.rev, "input_path": path}
+        if self.commit is not None:
+            self._tags["input_commit"] = self.commit
+
+    @classmethod
+    def prefetch(
+        cls,
+        paths: list[str],
+        repo: str,
+        dest_dir: str,
+        max_workers: int | None = None,
+    ) -> dict[str, "DVCInput"]:
+        """Fetch several files from the same DVC repo concurrently, keyed by path."""
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(paths)) as pool:
+            inputs = pool.map(lambda path: cls(path, repo, dest_dir), paths)
+            return dict(zip(paths, inputs))
 
     def _download_dvc_file(self, path: str, repo: str, dest_dir: str) -> str:
         local_path = os.path.join(dest_dir, path)
         os.makedirs(os.path.dirname(local_path), exist_ok=True)
 
-        with dvc.api.open(path=path, repo=repo, rev=self.rev, mode="rb") as source_file:
+        # Files at a given commit never change, so they can be served from the
+        # local cache. Only a revision that isn't a full commit hash needs a
+        # (cheap) network call to resolve.
+        cache = dvc_cache()
+        if cache is not None:
+            self.commit = _resolve_commit(repo, self.rev)
+        if self.commit is not None:
+            key = f"dvc:{repo}@{self.commit}:{path}"
+            cached = cache.get(key)
+            self.cache_hit = cached is not None
+            if cached is not None:
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                link_or_copy(cached, local_path)
+                self._content_digest = FileCache.object_digest(cached)
+                return local_path
+
+        rev = self.commit or self.rev
+        with dvc.api.open(path=path, repo=repo, rev=rev, mode="rb") as source_file:
             with open(local_path, "wb") as dest_file:
                 shutil.copyfileobj(source_file, dest_file)
 
+        if self.commit is not None:
+            self._content_digest = FileCache.object_digest(cache.put(key, local_path))
         return local_path
 
     def local_path(self) -> Path:
@@ -170,27 +299,126 @@ class DVCInput(BaseInput):
     def tags_for_input_type(self) -> dict:
         return self._tags
 
+    def input_metrics(self) -> dict:
+        if self.cache_hit is None:
+            return {}
+        return {
+            "dvc_cache_hits": int(self.cache_hit),
+            "dvc_cache_misses": int(not self.cache_hit),
+        }
+
 
 class MLFlowArtifactInput(BaseInput):
-    """A dataset artifact from a previous MLFlow run."""
+    """A dataset artifact from a previous MLFlow run.
+
+    Logging it uploads a copy, unless `log_by_reference` is set (by default,
+    if $MODELPLANE_REFERENCE_INPUT_ARTIFACTS is): since the artifact is in the
+    tracking store already, a reference to it is recorded instead (see
+    `LocalArtifactInput`).
+    """
 
     input_type = "artifact"
 
-    def __init__(self, run_id: str, artifact_path: str, dest_dir: str):
+    def __init__(
+        self,
+        run_id: str,
+        artifact_path: str,
+        dest_dir: str,
+        log_by_reference: bool | None = None,
+    ):
         super().__init__()
         self.run_id = run_id
+        if log_by_reference is None:
+            log_by_reference = reference_input_artifacts()
+        self.log_by_reference = log_by_reference
+        # The artifact actually read, i.e. possibly gzipped, and its digest if
+        # it isn't the local file.
+        self.artifact_path = artifact_path
+        self._artifact_digest: str | None = None
+        self.cache_hit: bool | None = None
         self._local_path = self._download_artifacts(run_id, artifact_path, dest_dir)
-        self._tags = {"input_run_id": run_id, "input_artifact_path": artifact_path}
+        self._tags = {"input_run_id": run_id, "input_artifact_path": self.artifact_path}
 
     def _download_artifacts(
         self, run_id: str, artifact_path: str, dest_dir: str
     ) -> str:
+        local_path = os.path.join(dest_dir, artifact_path)
+        size = _artifact_size(run_id, artifact_path)
+        if size is None:
+            compressed_size = _artifact_size(run_id, artifact_path + GZIP_SUFFIX)
+            if compressed_size is not None:
+                # Logged with `compress_artifacts`.
+                return self._download_compressed(
+                    run_id, artifact_path, dest_dir, compressed_size
+                )
+        cache = artifact_cache()
+        if cache is not None:
+            key = f"mlflow-artifact:{run_id}/{artifact_path}"
+            # Checking against the tracking server's size catches truncated
+            # cache entries and artifacts that were overwritten since.
+            cached = cache.get(key, size)
+            self.cache_hit = cached is not None
+            if cached is not None:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                link_or_copy(cached, local_path)
+                self._content_digest = FileCache.object_digest(cached)
+                return local_path
+
         mlflow.artifacts.download_artifacts(
             run_id=run_id,
             artifact_path=artifact_path,
             dst_path=dest_dir,
         )
-        return os.path.join(dest_dir, artifact_path)
+        if cache is not None:
+            self._content_digest = FileCache.object_digest(cache.put(key, local_path))
+        return local_path
+
+    def _download_compressed(
+        self, run_id: str, artifact_path: str, dest_dir: str, compressed_size: int
+    ) -> str:
+        """Download `{artifact_path}.gz` and decompress it to `artifact_path`."""
+        compressed_path = artifact_path + GZIP_SUFFIX
+        self.artifact_path = compressed_path
+        local_path = os.path.join(dest_dir, artifact_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        cache = artifact_cache()
+        if cache is not None:
+            # The compressed file is cached, so the size can be checked.
+            key = f"mlflow-artifact:{run_id}/{compressed_path}"
+            cached = cache.get(key, compressed_size)
+            self.cache_hit = cached is not None
+            if cached is not None:
+                # The reference names the gzipped artifact, so it gets its digest.
+                self._artifact_digest = FileCache.object_digest(cached)
+                decompress(cached, local_path)
+                return local_path
+        downloaded = mlflow.artifacts.download_artifacts(
+            run_id=run_id,
+            artifact_path=compressed_path,
+            dst_path=dest_dir,
+        )
+        if cache is not None:
+            self._artifact_digest = FileCache.object_digest(cache.put(key, downloaded))
+        elif self.log_by_reference:
+            self._artifact_digest = content_digest(downloaded)
+        decompress(downloaded, local_path)
+        os.remove(downloaded)
+        return local_path
+
+    def _store_artifact(
+        self, current_run, uploader: ArtifactUploader | None = None
+    ) -> Artifact:
+        if not self.log_by_reference:
+            return super()._store_artifact(current_run, uploader)
+        self.digest = _log_reference(
+            self.run_id,
+            self.artifact_path,
+            self.local_path(),
+            self._artifact_digest or self._content_digest,
+        )
+        return _source_artifact(self.run_id, self.artifact_path)
 
     def local_path(self) -> Path:
         return Path(self._local_path)
@@ -199,6 +427,140 @@ class MLFlowArtifactInput(BaseInput):
     def tags_for_input_type(self) -> dict:
         return self._tags
 
+    def input_metrics(self) -> dict:
+        if self.cache_hit is None:
+            return {}
+        return {
+            "artifact_cache_hits": int(self.cache_hit),
+            "artifact_cache_misses": int(not self.cache_hit),
+        }
+
+
+class LocalArtifactInput(BaseInput):
+    """An artifact of an earlier run that is still on local disk.
+
+    Used to pass outputs between the steps of a pipeline without a round trip
+    through the artifact store. Logging it records a reference to the original
+    artifact instead of uploading it again.
+    """
+
+    input_type = "artifact"
+
+    def __init__(self, run_id: str, artifact_path: str, path: str | Path):
+        super().__init__()
+        self.run_id = run_id
+        self.artifact_path = artifact_path
+        self._local_path = Path(path)
+        self._tags = {"input_run_id": run_id, "input_artifact_path": artifact_path}
+
+    def _store_artifact(
+        self, current_run, uploader: ArtifactUploader | None = None
+    ) -> Artifact:
+        self.digest = _log_reference(self.run_id, self.artifact_path, self.local_path())
+        return _source_artifact(self.run_id, self.artifact_path)
+
+    def local_path(self) -> Path:
+        return self._local_path
+
+    @property
+    def tags_for_input_type(self) -> dict:
+        return self._tags
+
+
+def reference_input_artifacts() -> bool:
+    return os.getenv(REFERENCE_INPUT_ARTIFACTS_ENV, "false").lower() == "true"
+
+
+def _log_local_dataset(path: Path, digest: str | None = None) -> str:
+    """
+    Record the local file the active run read as a dataset, and return its
+    digest: `digest` if given, else that of the file.
+    """
+    source = LocalDatasetSource(
+        str(path.resolve()), digest_mode=DIGEST_MODE_CONTENT, content_digest=digest
+    )
+    digest = source.content_digest()
+    log_dataset_reference(source, name=path.name, digest=digest)
+    return digest
+
+
+def _log_reference(
+    run_id: str, artifact_path: str, local_path: Path, digest: str | None = None
+) -> str:
+    """
+    Record that the active run read `artifact_path` of `run_id`, and return its
+    digest: `digest` if given, else that of `local_path`, its local copy.
+    """
+    if digest is None:
+        digest = content_digest(local_path, index=digest_index())
+    log_dataset_reference(
+        RunArtifactDatasetSource(run_id, artifact_path),
+        name=Path(artifact_path).name,
+        digest=digest,
+    )
+    return digest
+
+
+def _source_artifact(run_id: str, artifact_path: str) -> Artifact:
+    source_run = mlflow.get_run(run_id)
+    return Artifact(
+        experiment_id=source_run.info.experiment_id,
+        run_id=run_id,
+        name=artifact_path,
+    )
+
+
+def artifact_cache() -> FileCache | None:
+    """The local cache of downloaded MLflow artifacts, or None if it's disabled."""
+    return _local_cache(
+        "artifacts", ARTIFACT_CACHE_MAX_BYTES_ENV, DEFAULT_ARTIFACT_CACHE_MAX_BYTES
+    )
+
+
+def dvc_cache() -> FileCache | None:
+    """The local cache of downloaded DVC files, or None if it's disabled."""
+    return _local_cache("dvc", DVC_CACHE_MAX_BYTES_ENV, DEFAULT_DVC_CACHE_MAX_BYTES)
+
+
+def _local_cache(name: str, max_bytes_env: str, default_max_bytes: int):
+    max_bytes = int(os.getenv(max_bytes_env, default_max_bytes))
+    if max_bytes <= 0:
+        return None
+    return FileCache(default_cache_root() / name, max_bytes)
+
+
+def _resolve_commit(repo: str, rev: str) -> str | None:
+    """The commit hash `rev` points to in `repo`, or None if it can't be resolved."""
+    if re.fullmatch(r"[0-9a-f]{40}", rev):
+        return rev
+    try:
+        output = subprocess.run(
+            ["git", "ls-remote", repo, rev, f"{rev}^{{}}"],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    commits = {}
+    for line in output.splitlines():
+        commit, ref = line.split("\t")
+        commits[ref] = commit
+    # An annotated tag resolves to the tag object; `^{}` is the commit it points to.
+    for ref in (f"refs/heads/{rev}", f"refs/tags/{rev}^{{}}", f"refs/tags/{rev}"):
+        if ref in commits:
+            return commits[ref]
+    return None
+
+
+def _artifact_size(run_id: str, artifact_path: str) -> int | None:
+    parent = os.path.dirname(artifact_path) or None
+    for info in MlflowClient().list_artifacts(run_id, parent):
+        if info.path == artifact_path:
+            return info.file_size
+    return None
+
 
 def build_and_log_input(
     input_object: Optional[BaseInput] = None,
@@ -208,6 +570,9 @@ def build_and_log_input(
     dvc_repo: Optional[str] = None,
     dest_dir: str = "",
     df: Optional[pd.DataFrame] = None,
+    uploader: Optional[ArtifactUploader] = None,
+    log_by_reference: Optional[bool] = None,
+    logger: Optional[BatchLogger] = None,
 ) -> BaseInput:
     if mlflow.active_run() is None:
         raise RuntimeError(_MLFLOW_REQUIRED_ERROR_MESSAGE)
@@ -219,8 +584,9 @@ def build_and_log_input(
         dvc_repo=dvc_repo,
         dest_dir=dest_dir,
         df=df,
+        log_by_reference=log_by_reference,
     )
-    inp.log_artifact()
+    inp.log_artifact(uploader, logger)
     return inp
 
 
@@ -232,6 +598,7 @@ def build_input(
     dvc_repo: Optional[str] = None,
     dest_dir: str = "",
     df: Optional[pd.DataFrame] = None,
+    log_by_reference: Optional[bool] = None,
 ) -> BaseInput:
     # Direct input
     if input_object is not None:
@@ -257,5 +624,5 @@ def build_input(
     elif run_id is not None:
         if artifact_path is None:
             raise ValueError("Artifact path must be provided when run_id is provided.")
-        return MLFlowArtifactInput(run_id, artifact_path, dest_dir)
+        return MLFlowArtifactInput(run_id, artifact_path, dest_dir, log_by_reference)
     raise ValueError("Either path or run_id must be provided to build an input.")
@@ -2,14 +2,19 @@ from modelgauge.annotator_registry import ANNOTATORS
 from modelgauge.ensemble_strategies import ENSEMBLE_STRATEGIES
 from modelgauge.sut_registry import SUTS
 
+from modelplane.runways.utils import load_plugins
+
 
 def list_annotators():
+    load_plugins()
     print(ANNOTATORS.compact_uid_list())
 
 
 def list_suts():
+    load_plugins()
     print(SUTS.compact_uid_list())
 
 
 def list_ensemble_strategies():
+    load_plugins()
     print(sorted(ENSEMBLE_STRATEGIES))
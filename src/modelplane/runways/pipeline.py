@@ -0,0 +1,370 @@
+"""Runway chaining the responder, annotator and scorer in one process."""
+
+import pathlib
+import tempfile
+from typing import Dict, List
+
+import mlflow
+import pandas as pd
+from modelgauge.data_schema import AnnotationSchema
+from modelgauge.pipeline_runner import build_runner
+from modelgauge.sut_factory import SUT_FACTORY
+
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.loghelpers import log_tags
+from modelplane.mlflow.progress import ProgressSink
+from modelplane.mlflow.uploader import ArtifactUploader
+from modelplane.runways.annotator import (
+    _get_annotator_settings,
+    annotate,
+    annotation_tags,
+    autoscale_annotators,
+    log_safety_summary,
+    summary_annotator_uids,
+)
+from modelplane.runways.data import (
+    Artifact,
+    BaseInput,
+    DVCInput,
+    LocalArtifactInput,
+    RunArtifacts,
+    build_and_log_input,
+)
+from modelplane.runways.responder import DEFAULT_SUT_OPTIONS, respond
+from modelplane.runways.scorer import score
+from modelplane.runways.utils import (
+    ANNOTATION_RESPONSE_ARTIFACT_NAME,
+    MODELGAUGE_RUN_TAG_NAME,
+    PROMPT_RESPONSE_ARTIFACT_NAME,
+    RUN_TYPE_ANNOTATOR,
+    RUN_TYPE_PIPELINE,
+    RUN_TYPE_RESPONDER,
+    RUN_TYPE_SCORER,
+    RUN_TYPE_TAG_NAME,
+    autoscale,
+    get_experiment_id,
+    is_debug_mode,
+    load_plugins,
+    log_throttle_waits,
+    pipeline_num_workers,
+    prepare_response_cache,
+    setup_sut_credentials,
+    shared_rate_limit,
+)
+from modelplane.utils.limits import AUTO_NUM_WORKERS
+from modelplane.utils.timing import PhaseTimer
+
+
+def run_pipeline(
+    sut_id: str,
+    prompts: str,
+    annotator_ids: List[str],
+    experiment: str,
+    ground_truth: str | None = None,
+    dvc_repo: str | None = None,
+    ensemble_strategy: str | None = None,
+    disable_cache: bool = False,
+    num_workers: int | str = 1,
+    prompt_uid_col: str | None = None,
+    prompt_text_col: str | None = None,
+    sample_uid_col: str | None = None,
+    stream: bool = False,
+    cache_dir: str | None = None,
+) -> RunArtifacts:
+    """
+    Get SUT responses, annotate them and, if `ground_truth` is given, score the annotations.
+
+    Each step is logged as a child run of a parent pipeline run, with the same
+    params and tags as when run on its own. Intermediate outputs are passed
+    to the next step on local disk; the downstream runs record a reference to
+    the upstream artifact rather than a copy of it. With `dvc_repo`, the
+    prompts and ground truth are fetched concurrently before the first step.
+
+    With `stream`, each SUT response is annotated as soon as it arrives instead
+    of after all responses are in, so the SUT and annotator work overlap. The
+    same runs, params and metrics are logged as without it, but the responder
+    run's `prompt-responses.csv` is taken from the annotations (see
+    `_respond_and_annotate`), so it lacks responses that failed to annotate.
+    """
+    experiment_id = get_experiment_id(experiment)
+    tags = {"sut_id": sut_id, RUN_TYPE_TAG_NAME: RUN_TYPE_PIPELINE}
+
+    with (
+        mlflow.start_run(experiment_id=experiment_id, tags=tags) as run,
+        tempfile.TemporaryDirectory() as tmp,
+    ):
+        prompts_input = ground_truth_input = None
+        if dvc_repo is not None and ground_truth is not None:
+            # Both come from the same DVC repo, so fetch them at once.
+            inputs = DVCInput.prefetch(
+                [prompts, ground_truth], dvc_repo, str(pathlib.Path(tmp) / "inputs")
+            )
+            prompts_input, ground_truth_input = inputs[prompts], inputs[ground_truth]
+        if stream:
+            response_run, annotation_run = _respond_and_annotate(
+                sut_id=sut_id,
+                prompts=prompts,
+                prompts_input=prompts_input,
+                annotator_ids=annotator_ids,
+                experiment_id=experiment_id,
+                dvc_repo=dvc_repo,
+                ensemble_strategy=ensemble_strategy,
+                disable_cache=disable_cache,
+                cache_dir=cache_dir,
+                num_workers=num_workers,
+                prompt_uid_col=prompt_uid_col,
+                prompt_text_col=prompt_text_col,
+                work_dir=tmp,
+            )
+        else:
+            response_run = respond(
+                sut_id=sut_id,
+                prompts=prompts,
+                input_object=prompts_input,
+                experiment=experiment,
+                dvc_repo=dvc_repo,
+                disable_cache=disable_cache,
+                cache_dir=cache_dir,
+                num_workers=num_workers,
+                prompt_uid_col=prompt_uid_col,
+                prompt_text_col=prompt_text_col,
+                output_dir=str(pathlib.Path(tmp) / "responses"),
+            )
+            annotation_run = annotate(
+                experiment=experiment,
+                annotator_ids=annotator_ids,
+                input_object=_local_artifact(
+                    response_run, PROMPT_RESPONSE_ARTIFACT_NAME
+                ),
+                response_run_id=response_run.run_id,
+                ensemble_strategy=ensemble_strategy,
+                disable_cache=disable_cache,
+                cache_dir=cache_dir,
+                num_workers=num_workers,
+                output_dir=str(pathlib.Path(tmp) / "annotations"),
+            )
+        child_runs = {
+            RUN_TYPE_RESPONDER: response_run,
+            RUN_TYPE_ANNOTATOR: annotation_run,
+        }
+        if ground_truth is not None:
+            child_runs[RUN_TYPE_SCORER] = score(
+                annotation_run_id=annotation_run.run_id,
+                experiment=experiment,
+                ground_truth=ground_truth,
+                ground_truth_input_object=ground_truth_input,
+                dvc_repo=dvc_repo,
+                sample_uid_col=sample_uid_col,
+                annotation_input_object=_local_artifact(
+                    annotation_run, ANNOTATION_RESPONSE_ARTIFACT_NAME
+                ),
+            )
+
+        mlflow.set_tags(
+            {
+                f"{run_type}_run_id": child_run.run_id
+                for run_type, child_run in child_runs.items()
+            }
+        )
+        artifacts = {}
+        for child_run in child_runs.values():
+            artifacts.update(child_run.artifacts)
+
+    return RunArtifacts(run_id=run.info.run_id, artifacts=artifacts)
+
+
+def _local_artifact(run_artifacts: RunArtifacts, name: str) -> LocalArtifactInput:
+    return LocalArtifactInput(
+        run_id=run_artifacts.run_id,
+        artifact_path=name,
+        path=run_artifacts.local_paths[name],
+    )
+
+
+def _respond_and_annotate(
+    sut_id: str,
+    prompts: str,
+    prompts_input: BaseInput | None,
+    annotator_ids: List[str],
+    experiment_id: str,
+    dvc_repo: str | None,
+    ensemble_strategy: str | None,
+    disable_cache: bool,
+    cache_dir: str | None,
+    num_workers: int | str,
+    prompt_uid_col: str | None,
+    prompt_text_col: str | None,
+    work_dir: str,
+) -> tuple[RunArtifacts, RunArtifacts]:
+    """Get and annotate the SUT responses in a single modelgauge pipeline.
+
+    The work is logged as a responder run and an annotator run, like `respond`
+    and `annotate` would. The combined modelgauge pipeline only writes the
+    annotations, so the responder run's `prompt-responses.csv` is extracted
+    from them (they include the SUT responses), in the prompts' order.
+    """
+    load_plugins()
+    sut = SUT_FACTORY.make_instance(uid=sut_id, secrets=setup_sut_credentials(sut_id))
+    annotators = _get_annotator_settings(annotator_ids, ensemble_strategy)["annotators"]
+    params = {"num_workers": num_workers}
+
+    with (
+        mlflow.start_run(
+            experiment_id=experiment_id,
+            tags={"sut_id": sut_id, RUN_TYPE_TAG_NAME: RUN_TYPE_RESPONDER},
+            nested=True,
+        ) as response_run,
+        BatchLogger(response_run.info.run_id) as logger,
+        ArtifactUploader(response_run.info.run_id) as uploader,
+    ):
+        logger.log_params(params)
+        if num_workers == AUTO_NUM_WORKERS:
+            autoscale(sut, "evaluate", sut_id, logger)
+            # The annotators' concurrency is logged with the responder run,
+            # since that's the one active while they run.
+            autoscale_annotators(annotators, logger)
+        # Likewise for the time they spend waiting for their rate limits.
+        rate_limiters = (
+            shared_rate_limit({sut_id: sut}, "evaluate"),
+            shared_rate_limit(annotators, "annotate"),
+        )
+        timer = PhaseTimer()
+        with timer.phase("download"):
+            input_data = build_and_log_input(
+                input_object=prompts_input,
+                path=prompts,
+                dvc_repo=dvc_repo,
+                dest_dir=work_dir,
+                uploader=uploader,
+                logger=logger,
+            )
+        pipeline_runner = build_runner(
+            num_workers=pipeline_num_workers(num_workers),
+            input_path=input_data.local_path(),
+            output_dir=pathlib.Path(work_dir),
+            cache_dir=prepare_response_cache(disable_cache, cache_dir),
+            suts={sut.uid: sut},
+            annotators=annotators,
+            prompt_uid_col=prompt_uid_col,
+            prompt_text_col=prompt_text_col,
+            sut_options=DEFAULT_SUT_OPTIONS,
+        )
+        with timer.phase("pipeline"), ProgressSink(logger) as progress:
+            pipeline_runner.run(progress_callback=progress, debug=is_debug_mode())
+        log_throttle_waits(logger, *rate_limiters)
+        logger.set_tag(MODELGAUGE_RUN_TAG_NAME, pipeline_runner.run_id)
+
+        # Logged under the name `annotate` uses, which is where `score` looks.
+        annotations_path = (
+            pipeline_runner.output_dir() / ANNOTATION_RESPONSE_ARTIFACT_NAME
+        )
+        output_path = pipeline_runner.output_dir() / pipeline_runner.output_file_name
+        if output_path != annotations_path:
+            output_path.replace(annotations_path)
+        responses_dir = pathlib.Path(work_dir) / "responses"
+        responses_dir.mkdir()
+        responses_path = responses_dir / PROMPT_RESPONSE_ARTIFACT_NAME
+        response_counts = _extract_prompt_responses(
+            annotations_path,
+            responses_path,
+            input_data.local_path(),
+            prompt_uid_col or AnnotationSchema.default().prompt_uid,
+        )
+        logger.log_metrics(
+            {f"{uid}_response_count": n for uid, n in response_counts.items()}
+        )
+        with timer.phase("upload"):
+            uploader.upload(responses_path)
+            uploader.wait()
+        logger.log_metrics(timer.metrics())
+        response_artifacts = RunArtifacts(
+            run_id=response_run.info.run_id,
+            artifacts={
+                input_data.local_path().name: input_data.artifact,
+                PROMPT_RESPONSE_ARTIFACT_NAME: Artifact(
+                    experiment_id=response_run.info.experiment_id,
+                    run_id=response_run.info.run_id,
+                    name=PROMPT_RESPONSE_ARTIFACT_NAME,
+                ),
+            },
+            local_paths={PROMPT_RESPONSE_ARTIFACT_NAME: responses_path},
+        )
+
+    with (
+        mlflow.start_run(
+            experiment_id=experiment_id,
+            tags=annotation_tags(annotators, ensemble_strategy),
+            nested=True,
+        ) as annotation_run,
+        BatchLogger(annotation_run.info.run_id) as logger,
+        ArtifactUploader(annotation_run.info.run_id) as uploader,
+    ):
+        logger.log_params(params)
+        log_tags(response_artifacts.run_id)
+        annotation_input = build_and_log_input(
+            input_object=_local_artifact(
+                response_artifacts, PROMPT_RESPONSE_ARTIFACT_NAME
+            ),
+            logger=logger,
+        )
+        logger.set_tag(MODELGAUGE_RUN_TAG_NAME, pipeline_runner.run_id)
+        timer = PhaseTimer()
+        # The annotations are uploaded while the summary is computed.
+        uploader.upload(annotations_path)
+        with timer.phase("summary"):
+            log_safety_summary(
+                annotator_uids=summary_annotator_uids(annotators, ensemble_strategy),
+                data_path=annotations_path,
+                dir=work_dir,
+                logger=logger,
+                uploader=uploader,
+            )
+        with timer.phase("upload_wait"):
+            uploader.wait()
+        logger.log_metrics(timer.metrics())
+        annotation_artifacts = RunArtifacts(
+            run_id=annotation_run.info.run_id,
+            artifacts={
+                PROMPT_RESPONSE_ARTIFACT_NAME: annotation_input.artifact,
+                ANNOTATION_RESPONSE_ARTIFACT_NAME: Artifact(
+                    experiment_id=annotation_run.info.experiment_id,
+                    run_id=annotation_run.info.run_id,
+                    name=ANNOTATION_RESPONSE_ARTIFACT_NAME,
+                ),
+            },
+            local_paths={ANNOTATION_RESPONSE_ARTIFACT_NAME: annotations_path},
+        )
+
+    return response_artifacts, annotation_artifacts
+
+
+def _extract_prompt_responses(
+    annotations_path: pathlib.Path,
+    dest: pathlib.Path,
+    prompts_path: pathlib.Path,
+    prompt_uid_col: str,
+) -> Dict[str, int]:
+    """
+    Write the SUT responses in the annotations to `dest`, as `respond` would
+    have, in the order of the prompts in `prompts_path`. Returns the number
+    of responses of each SUT.
+    """
+    schema = AnnotationSchema.default()
+    columns = [
+        schema.prompt_uid,
+        schema.prompt_text,
+        schema.sut_uid,
+        schema.sut_response,
+    ]
+    # There is one row per annotator for each response.
+    responses = pd.read_csv(
+        annotations_path, usecols=columns, dtype=str, keep_default_na=False
+    )[columns].drop_duplicates(subset=[schema.prompt_uid, schema.sut_uid])
+    prompt_uids = pd.read_csv(
+        prompts_path, usecols=[prompt_uid_col], dtype=str, keep_default_na=False
+    )[prompt_uid_col]
+    prompt_order = pd.Index(prompt_uids.drop_duplicates()).get_indexer(
+        responses[schema.prompt_uid]
+    )
+    responses.iloc[prompt_order.argsort(kind="stable")].to_csv(dest, index=False)
+    return responses[schema.sut_uid].value_counts(sort=False).to_dict()
@@ -1,14 +1,29 @@
 """Runway for getting responses from SUTs."""
 
+import csv
 import pathlib
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List
 
 import mlflow
+import pandas as pd
+from modelgauge.data_schema import AnnotationSchema
 from modelgauge.model_options import ModelOptions
 from modelgauge.pipeline_runner import build_runner
 from modelgauge.sut_factory import SUT_FACTORY
 from modelgauge.tests.safe_v1 import BaseSafeTestVersion1
 
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.progress import ProgressSink
+from modelplane.mlflow.uploader import ArtifactUploader
+from modelplane.runways.checkpoint import (
+    Checkpointer,
+    load_partial_outputs,
+    new_attempt_dir,
+    remove_work_dir,
+)
 from modelplane.runways.data import (
     Artifact,
     BaseInput,
@@ -16,76 +31,318 @@ from modelplane.runways.data import (
     build_and_log_input,
 )
 from modelplane.runways.utils import (
-    CACHE_DIR,
+    ARTIFACT_FORMAT_CSV,
     MODELGAUGE_RUN_TAG_NAME,
+    PROMPT_RESPONSE_ARTIFACT_NAME,
     RUN_TYPE_RESPONDER,
     RUN_TYPE_TAG_NAME,
+    autoscale,
     get_experiment_id,
     is_debug_mode,
+    load_plugins,
+    log_output_artifacts,
+    log_throttle_waits,
+    pipeline_num_workers,
+    prepare_response_cache,
     setup_sut_credentials,
+    shared_rate_limit,
+    validate_artifact_format,
+    validate_num_workers,
 )
+from modelplane.utils.limits import AUTO_NUM_WORKERS, RateLimiter, rate_limit_method
+from modelplane.utils.timing import PhaseTimer
 
 # TODO: Figure out a way to expose the options in the CLI.
 DEFAULT_SUT_OPTIONS = BaseSafeTestVersion1.sut_options()
+# The responses have the annotation schema's prompt and SUT columns.
+RESPONSE_SCHEMA = AnnotationSchema.default()
 
 
 def respond(
-    sut_id: str,
+    sut_id: str | List[str],
     experiment: str,
     prompts: str | None = None,
     input_object: BaseInput | None = None,
     dvc_repo: str | None = None,
     disable_cache: bool = False,
-    num_workers: int = 1,
+    num_workers: int | str = 1,
     prompt_uid_col=None,
     prompt_text_col=None,
     sut_options: ModelOptions = DEFAULT_SUT_OPTIONS,
+    output_dir: str | None = None,
+    sut_num_workers: Dict[str, int] | None = None,
+    sut_rate_limits: Dict[str, float] | None = None,
+    resume_run_id: str | None = None,
+    cache_dir: str | None = None,
+    artifact_format: str = ARTIFACT_FORMAT_CSV,
+    compress_artifacts: bool = False,
 ) -> RunArtifacts:
-    secrets = setup_sut_credentials(sut_id)
-    sut = SUT_FACTORY.make_instance(uid=sut_id, secrets=secrets)
+    """
+    Get responses from one or more SUTs and log them to MLflow.
+
+    Each SUT gets its own pipeline with `num_workers` workers (or its entry
+    in `sut_num_workers`), optionally limited to its `sut_rate_limits` requests
+    per second, so a slow or throttled SUT doesn't hold up the others. With
+    `num_workers="auto"`, each SUT's concurrency adapts to how it copes. The
+    prompts are only downloaded and logged once, though each SUT's pipeline
+    reads the local file itself. The responses of all SUTs are logged as a
+    single `prompt-responses.csv`.
+    If `output_dir` is set, the responses are also kept there on local disk.
+    Unless `disable_cache` is set, the SUT responses are cached in `cache_dir`
+    (see `response_cache_dir`).
+    The responses are logged as `prompt-responses.csv`, `prompt-responses.parquet`
+    or both, depending on `artifact_format`. The prompts and responses are
+    uploaded in the background, gzipped if `compress_artifacts` is set.
+
+    The responses are written to a durable working directory as they come
+    in, and periodically uploaded to the run as a checkpoint. If the run
+    crashes, `resume_run_id` picks it up again: only the prompts without
+    responses yet are sent to the SUTs, and the responses are added to the
+    ones from before.
+    """
+    sut_ids = [sut_id] if isinstance(sut_id, str) else list(sut_id)
+    assert len(set(sut_ids)) == len(sut_ids), f"Duplicate SUT ids in {sut_ids}."
+    sut_num_workers = sut_num_workers or {}
+    sut_rate_limits = sut_rate_limits or {}
+    for uid in list(sut_num_workers) + list(sut_rate_limits):
+        assert uid in sut_ids, f"Limits given for {uid}, which is not a requested SUT."
+
+    validate_artifact_format(artifact_format)
+    workers = {uid: sut_num_workers.get(uid, num_workers) for uid in sut_ids}
+    for n in workers.values():
+        validate_num_workers(n)
+
+    load_plugins()
+    suts = {}
+    for uid in sut_ids:
+        secrets = setup_sut_credentials(uid)
+        suts[uid] = SUT_FACTORY.make_instance(uid=uid, secrets=secrets)
     params = {"num_workers": num_workers}
-    tags = {"sut_id": sut_id, RUN_TYPE_TAG_NAME: RUN_TYPE_RESPONDER}
+    params.update({f"{uid}_num_workers": n for uid, n in sut_num_workers.items()})
+    params.update(
+        {f"{uid}_max_requests_per_second": r for uid, r in sut_rate_limits.items()}
+    )
+    tags = {"sut_id": ",".join(sut_ids), RUN_TYPE_TAG_NAME: RUN_TYPE_RESPONDER}
+    if len(sut_ids) > 1:
+        # tag for each SUT id to help make them searchable
+        tags.update({f"sut_{uid}": "true" for uid in sut_ids})
 
     experiment_id = get_experiment_id(experiment)
 
-    with mlflow.start_run(experiment_id=experiment_id, tags=tags) as run:
-        mlflow.log_params(params)
-        # Use temporary file as mlflow will log this into the artifact store
-        with tempfile.TemporaryDirectory() as tmp:
-            input_data = build_and_log_input(
-                input_object=input_object,
-                path=prompts,
-                dvc_repo=dvc_repo,
-                dest_dir=tmp,
+    # Runs are nested under the active run, if any, e.g. by `pipeline`.
+    with (
+        mlflow.start_run(
+            run_id=resume_run_id, experiment_id=experiment_id, tags=tags, nested=True
+        ) as run,
+        BatchLogger(run.info.run_id) as logger,
+    ):
+        if resume_run_id is None:
+            logger.log_params(params)
+        rate_limiters = {uid: RateLimiter(r) for uid, r in sut_rate_limits.items()}
+        for uid, sut in suts.items():
+            if workers[uid] == AUTO_NUM_WORKERS:
+                autoscale(sut, "evaluate", uid, logger)
+            # Rate limit outside the concurrency limit, so waiting for the
+            # rate limiter doesn't count as SUT latency.
+            if uid in rate_limiters:
+                rate_limit_method(sut, "evaluate", rate_limiters[uid])
+        shared_rate_limiters = shared_rate_limit(suts, "evaluate")
+        response_cache = prepare_response_cache(disable_cache, cache_dir)
+        previous = None
+        if resume_run_id is not None:
+            previous = load_partial_outputs(
+                resume_run_id,
+                PROMPT_RESPONSE_ARTIFACT_NAME,
+                [RESPONSE_SCHEMA.prompt_uid, RESPONSE_SCHEMA.sut_uid],
+                output_dir,
             )
-            pipeline_runner = build_runner(
-                num_workers=num_workers,
-                input_path=input_data.local_path(),
-                output_dir=pathlib.Path(tmp),
-                cache_dir=None if disable_cache else CACHE_DIR,
-                suts={sut.uid: sut},
-                prompt_uid_col=prompt_uid_col,
-                prompt_text_col=prompt_text_col,
-                sut_options=sut_options,
+        attempt_dir = new_attempt_dir(run.info.run_id)
+        timer = PhaseTimer()
+        # Use temporary file as mlflow will log this into the artifact store
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            ArtifactUploader(run.info.run_id, compress=compress_artifacts) as uploader,
+        ):
+            with timer.phase("download"):
+                # The prompts are uploaded while the SUTs respond.
+                input_data = build_and_log_input(
+                    input_object=input_object,
+                    path=prompts,
+                    dvc_repo=dvc_repo,
+                    dest_dir=tmp,
+                    uploader=uploader,
+                    logger=logger,
+                )
+            output_root = pathlib.Path(output_dir) if output_dir else attempt_dir
+            # The responses of each SUT, and the prompts each SUT still has to answer.
+            output_paths = {uid: [] for uid in suts}
+            input_paths = {uid: input_data.local_path() for uid in suts}
+            if previous is not None:
+                _split_previous_responses(
+                    previous,
+                    input_data.local_path(),
+                    prompt_uid_col or RESPONSE_SCHEMA.prompt_uid,
+                    attempt_dir,
+                    output_paths,
+                    input_paths,
+                )
+                logger.log_metric("resumed_response_count", len(previous))
+            pipeline_runners = {
+                uid: build_runner(
+                    num_workers=pipeline_num_workers(workers[uid]),
+                    input_path=input_paths[uid],
+                    # Separate directories keep the SUTs' outputs apart.
+                    output_dir=(
+                        output_root if len(suts) == 1 else output_root / f"sut-{i}"
+                    ),
+                    cache_dir=response_cache,
+                    suts={uid: sut},
+                    prompt_uid_col=prompt_uid_col,
+                    prompt_text_col=prompt_text_col,
+                    sut_options=sut_options,
+                )
+                for i, (uid, sut) in enumerate(suts.items())
+                if uid in input_paths
+            }
+            for uid, runner in pipeline_runners.items():
+                output_paths[uid].append(runner.output_dir() / runner.output_file_name)
+
+            with (
+                Checkpointer(
+                    run.info.run_id, output_root, attempt_dir.name
+                ) as checkpointer,
+                timer.phase("pipeline"),
+                ProgressSink(logger) as progress,
+            ):
+                for runner in pipeline_runners.values():
+                    checkpointer.watch(runner.output_dir() / runner.output_file_name)
+                # The earlier attempts' responses go along, so this attempt's
+                # checkpoint has all the responses so far.
+                for path in attempt_dir.glob(
+                    f"previous/*/{PROMPT_RESPONSE_ARTIFACT_NAME}"
+                ):
+                    checkpointer.watch(path, path.relative_to(attempt_dir).as_posix())
+                _run_pipelines(pipeline_runners, progress)
+            log_throttle_waits(logger, rate_limiters, shared_rate_limiters)
+            logger.set_tag(
+                MODELGAUGE_RUN_TAG_NAME,
+                ",".join(runner.run_id for runner in pipeline_runners.values()),
             )
 
-            pipeline_runner.run(
-                progress_callback=mlflow.log_metrics, debug=is_debug_mode()
+            if len(output_paths) == 1 and len(next(iter(output_paths.values()))) == 1:
+                ((output_path,),) = output_paths.values()
+            else:
+                output_path = output_root / PROMPT_RESPONSE_ARTIFACT_NAME
+            response_counts = _merge_responses(output_paths, output_path)
+            logger.log_metrics(
+                {f"{uid}_response_count": n for uid, n in response_counts.items()}
             )
-            mlflow.set_tag(MODELGAUGE_RUN_TAG_NAME, pipeline_runner.run_id)
 
             # log the output to mlflow's artifact store
-            mlflow.log_artifact(
-                local_path=pipeline_runner.output_dir()
-                / pipeline_runner.output_file_name,
-            )
-            artifacts = {
-                input_data.local_path().name: input_data.artifact,
-                pipeline_runner.output_file_name: Artifact(
+            with timer.phase("upload"):
+                artifact_names = log_output_artifacts(
+                    uploader, output_path, artifact_format
+                )
+                uploader.wait()
+            logger.log_metrics(timer.metrics())
+            artifacts = {input_data.local_path().name: input_data.artifact}
+            for name in artifact_names:
+                artifacts[name] = Artifact(
                     experiment_id=run.info.experiment_id,
                     run_id=run.info.run_id,
-                    name=pipeline_runner.output_file_name,
-                ),
-            }
+                    name=name,
+                )
+            local_paths = {}
+            if output_dir is not None:
+                local_paths[output_path.name] = output_path
+        remove_work_dir(run.info.run_id)
+
+        return RunArtifacts(
+            run_id=run.info.run_id, artifacts=artifacts, local_paths=local_paths
+        )
+
+
+def _split_previous_responses(
+    previous: pd.DataFrame,
+    prompts_path: pathlib.Path,
+    prompt_uid_col: str,
+    attempt_dir: pathlib.Path,
+    output_paths: Dict[str, List[pathlib.Path]],
+    input_paths: Dict[str, pathlib.Path],
+) -> None:
+    """
+    Add the responses of an earlier attempt to each SUT's outputs, and
+    narrow each SUT's input to the prompts it hasn't answered yet.
+    """
+    prompts = pd.read_csv(prompts_path, dtype=str, keep_default_na=False)
+    for i, uid in enumerate(output_paths):
+        done = previous[previous[RESPONSE_SCHEMA.sut_uid] == uid]
+        # Named like an output, so that it's found if this attempt is resumed.
+        previous_path = (
+            attempt_dir / "previous" / f"sut-{i}" / PROMPT_RESPONSE_ARTIFACT_NAME
+        )
+        previous_path.parent.mkdir(parents=True)
+        done.to_csv(previous_path, index=False)
+        output_paths[uid].append(previous_path)
+        remaining = prompts[
+            ~prompts[prompt_uid_col].isin(done[RESPONSE_SCHEMA.prompt_uid])
+        ]
+        if remaining.empty:
+            del input_paths[uid]
+        else:
+            input_paths[uid] = attempt_dir / f"prompts-{i}.csv"
+            remaining.to_csv(input_paths[uid], index=False)
+
+
+def _run_pipelines(pipeline_runners: dict, progress) -> None:
+    """Run the per-SUT pipelines side by side, reporting progress per SUT."""
+    if len(pipeline_runners) == 1:
+        (runner,) = pipeline_runners.values()
+        runner.run(progress_callback=progress, debug=is_debug_mode())
+        return
+
+    def run(uid, runner):
+        runner.run(
+            progress_callback=lambda metrics: progress(
+                {f"{uid}_{key}": value for key, value in metrics.items()}
+            ),
+            debug=is_debug_mode(),
+        )
+
+    with ThreadPoolExecutor(max_workers=len(pipeline_runners)) as executor:
+        futures = [
+            executor.submit(run, uid, runner)
+            for uid, runner in pipeline_runners.items()
+        ]
+        for future in futures:
+            future.result()
+
 
-        return RunArtifacts(run_id=run.info.run_id, artifacts=artifacts)
+def _merge_responses(
+    output_paths: Dict[str, List[pathlib.Path]], dest: pathlib.Path
+) -> Dict[str, int]:
+    """Concatenate the per-SUT response files into `dest` and count the responses of each SUT."""
+    counts = {}
+    with ExitStack() as stack:
+        writer = None
+        if [dest] not in output_paths.values():
+            writer = csv.writer(stack.enter_context(open(dest, "w", newline="")))
+        header = None
+        for uid, paths in output_paths.items():
+            counts[uid] = 0
+            for path in paths:
+                with open(path, newline="") as f:
+                    reader = csv.reader(f)
+                    file_header = next(reader, None)
+                    if writer is not None and file_header is not None:
+                        if header is None:
+                            header = file_header
+                            writer.writerow(header)
+                        assert (
+                            file_header == header
+                        ), f"Responses for {uid} have different columns: {file_header}"
+                    for row in reader:
+                        counts[uid] += 1
+                        if writer is not None:
+                            writer.writerow(row)
+    return counts
@@ -1,5 +1,11 @@
+import collections
+import fnmatch
+import hashlib
 import os
-from typing import List
+import re
+import tomllib
+from pathlib import Path
+from typing import Dict, List
 
 import mlflow
 from modelgauge.annotator_registry import ANNOTATORS
@@ -8,20 +14,49 @@ from modelgauge.config import (
     load_secrets_from_config,
     raise_if_missing_from_config,
 )
+from modelgauge.load_namespaces import load_namespaces
 from modelgauge.secret_values import RawSecrets
 from modelgauge.sut_factory import SUT_FACTORY
 
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.uploader import GZIP_SUFFIX, ArtifactUploader
+from modelplane.utils.columnar import csv_to_parquet
+from modelplane.utils.filecache import default_cache_root
+from modelplane.utils.responsecache import ResponseCache, response_cache_dir
+from modelplane.utils.limits import (
+    AUTO_NUM_WORKERS,
+    AdaptiveConcurrencyLimiter,
+    FileTokenBucket,
+    concurrency_limit_method,
+    rate_limit_method,
+)
+
 # Path to the secrets toml file
 SECRETS_PATH_ENV = "MODEL_SECRETS_PATH"
+# Path to the toml file with the rate limits of SUT and annotator providers
+RATE_LIMITS_PATH_ENV = "MODELPLANE_RATE_LIMITS_PATH"
+DEFAULT_RATE_LIMITS_PATH = "config/rate_limits.toml"
 DEBUG_MODE_ENV = "MODELPLANE_DEBUG_MODE"
 PROMPT_RESPONSE_ARTIFACT_NAME = "prompt-responses.csv"
 ANNOTATION_RESPONSE_ARTIFACT_NAME = "annotations.csv"
+PROMPT_RESPONSE_PARQUET_NAME = "prompt-responses.parquet"
+ANNOTATION_RESPONSE_PARQUET_NAME = "annotations.parquet"
+# Formats the responses and annotations can be logged in.
+ARTIFACT_FORMAT_CSV = "csv"
+ARTIFACT_FORMAT_PARQUET = "parquet"
+ARTIFACT_FORMAT_BOTH = "both"
+ARTIFACT_FORMATS = (ARTIFACT_FORMAT_CSV, ARTIFACT_FORMAT_PARQUET, ARTIFACT_FORMAT_BOTH)
 RUN_TYPE_TAG_NAME = "type"
 RUN_TYPE_RESPONDER = "get-sut-responses"
 RUN_TYPE_ANNOTATOR = "annotate"
 RUN_TYPE_SCORER = "score"
+RUN_TYPE_PIPELINE = "pipeline"
+RUN_TYPE_CACHE_EXPORT = "cache-export"
 MODELGAUGE_RUN_TAG_NAME = "modelgauge_run_id"
-CACHE_DIR = ".cache"
+# Upper bound on concurrency with `num_workers="auto"`.
+AUTO_MAX_WORKERS = 32
+
+_plugins_loaded = False
 
 
 def is_debug_mode() -> bool:
@@ -31,6 +66,189 @@ def is_debug_mode() -> bool:
     return os.getenv(DEBUG_MODE_ENV, "false").lower() == "true"
 
 
+def load_plugins() -> None:
+    """
+    Load the modelgauge plugin namespaces and private annotator registrations.
+
+    This is deferred until a SUT, annotator or ensemble strategy is actually
+    needed, since importing every plugin dominates CLI startup time.
+    """
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    load_namespaces(disable_progress_bar=True)
+    import modelgauge.annotators.cheval.registration  # noqa: F401
+
+    _plugins_loaded = True
+
+
+def prepare_response_cache(disable_cache: bool, cache_dir: str | None) -> str | None:
+    """
+    The directory for modelgauge to cache SUT and annotator responses in, ready
+    to be shared by concurrent runs, or None if caching is disabled.
+    """
+    if disable_cache:
+        return None
+    cache = ResponseCache(response_cache_dir(cache_dir))
+    cache.prepare()
+    return str(cache.root)
+
+
+def validate_artifact_format(artifact_format: str) -> None:
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(
+            f"Unknown artifact format: {artifact_format}. "
+            f"Available formats: {list(ARTIFACT_FORMATS)}"
+        )
+
+
+def log_output_artifacts(
+    uploader: ArtifactUploader,
+    csv_path: Path,
+    artifact_format: str,
+    annotation_col: str | None = None,
+) -> List[str]:
+    """
+    Upload a runway's CSV output as CSV, Parquet or both, and return the names
+    of the artifacts. See `csv_to_parquet` for `annotation_col`.
+
+    The CSV is uploaded while the Parquet file is written. Parquet files are
+    compressed already, so they're never gzipped.
+    """
+    names = []
+    if artifact_format in (ARTIFACT_FORMAT_CSV, ARTIFACT_FORMAT_BOTH):
+        names.append(uploader.upload(csv_path))
+    if artifact_format in (ARTIFACT_FORMAT_PARQUET, ARTIFACT_FORMAT_BOTH):
+        parquet_path = csv_path.with_suffix(".parquet")
+        csv_to_parquet(csv_path, parquet_path, annotation_col=annotation_col)
+        names.append(uploader.upload(parquet_path, compress=False))
+    return names
+
+
+def find_artifact(run_id: str, names: List[str]) -> str:
+    """
+    The first of `names` the run has an artifact called (possibly gzipped), or
+    the last one if it has none.
+    """
+    logged = {
+        artifact.path.removesuffix(GZIP_SUFFIX)
+        for artifact in mlflow.artifacts.list_artifacts(run_id=run_id)
+    }
+    for name in names:
+        if name in logged:
+            return name
+    return names[-1]
+
+
+def validate_num_workers(num_workers: int | str) -> None:
+    if num_workers == AUTO_NUM_WORKERS:
+        return
+    if not isinstance(num_workers, int) or num_workers < 1:
+        raise ValueError(
+            f"num_workers must be a positive integer or '{AUTO_NUM_WORKERS}', "
+            f"got {num_workers!r}."
+        )
+
+
+def pipeline_num_workers(num_workers: int | str) -> int:
+    """
+    Number of workers for a modelgauge pipeline.
+    With "auto", the pipeline gets the most workers we would ever use, and
+    `autoscale` limits how many of them are busy at once.
+    """
+    validate_num_workers(num_workers)
+    return AUTO_MAX_WORKERS if num_workers == AUTO_NUM_WORKERS else num_workers
+
+
+def autoscale(obj, method_name: str, uid: str, logger: BatchLogger) -> None:
+    """
+    Adapt the number of concurrent `obj.<method_name>` calls to how the
+    service behind it copes, logging the limit over time as `<uid>_concurrency`.
+    """
+    metric = f"{uid}_concurrency"
+    limiter = AdaptiveConcurrencyLimiter(
+        max_limit=AUTO_MAX_WORKERS,
+        on_change=lambda limit, step: logger.log_metric(metric, limit, step=step),
+    )
+    logger.log_metric(metric, limiter.limit, step=0)
+    concurrency_limit_method(obj, method_name, limiter)
+
+
+def shared_rate_limit(
+    objs: Dict[str, object], method_name: str
+) -> Dict[str, FileTokenBucket]:
+    """
+    Apply the configured provider rate limits to `obj.<method_name>` for each
+    SUT or annotator in `objs` (keyed by uid), and return the limiters used.
+
+    The rate limits file has a table per provider, e.g.:
+
+        [openai]
+        uids = ["gpt-4o*", "openai-*"]
+        requests_per_second = 5
+        burst = 10
+        secret = "openai.api_key"
+
+    A SUT or annotator is limited by the first table whose `uids` patterns
+    match its uid. The limit is shared by all processes on this machine.
+    With `secret` (as `scope.key` in the secrets file), each API key gets its
+    own limit.
+    """
+    config = _load_rate_limits()
+    if not config:
+        return {}
+    secrets = safe_load_secrets_from_config()
+    limiters = {}
+    for uid, obj in objs.items():
+        for provider, limits in config.items():
+            if any(fnmatch.fnmatchcase(uid, p) for p in limits.get("uids", [])):
+                limiters[uid] = FileTokenBucket(
+                    _rate_limit_state_path(provider, limits, secrets),
+                    rate=limits["requests_per_second"],
+                    burst=limits.get("burst", 1),
+                )
+                rate_limit_method(obj, method_name, limiters[uid])
+                break
+    return limiters
+
+
+def log_throttle_waits(logger: BatchLogger, *limiters: Dict[str, object]) -> None:
+    """Log how long each rate limited SUT or annotator waited, over all its limiters."""
+    waits = collections.defaultdict(float)
+    for uid_limiters in limiters:
+        for uid, limiter in uid_limiters.items():
+            waits[uid] += limiter.total_wait
+    logger.log_metrics(
+        {f"{uid}_throttle_wait_seconds": wait for uid, wait in waits.items()}
+    )
+
+
+def _load_rate_limits() -> dict:
+    path = os.getenv(RATE_LIMITS_PATH_ENV, DEFAULT_RATE_LIMITS_PATH)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    for provider, limits in config.items():
+        if not isinstance(limits, dict) or "requests_per_second" not in limits:
+            raise ValueError(
+                f"Rate limits for '{provider}' in {path} must be a table with "
+                "`requests_per_second`."
+            )
+    return config
+
+
+def _rate_limit_state_path(provider: str, limits: dict, secrets: RawSecrets):
+    name = re.sub(r"[^\w.-]", "_", provider)
+    if "secret" in limits:
+        scope, _, key = limits["secret"].partition(".")
+        value = secrets.get(scope, {}).get(key)
+        if value is not None:
+            # Don't leak the key into file names.
+            name += "-" + hashlib.sha256(value.encode()).hexdigest()[:16]
+    return default_cache_root() / "ratelimits" / f"{name}.json"
+
+
 def setup_sut_credentials(uid: str) -> RawSecrets:
     missing_secrets = []
     secrets = safe_load_secrets_from_config()
@@ -0,0 +1,82 @@
+"""Parsing of the JSON annotations written by modelgauge annotators."""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+# Matches the whole of a flat JSON object whose first key is `is_safe` and
+# whose other keys aren't, which is how modelgauge serializes safety
+# annotations. Other values are scalars or arrays of scalars. Every match is
+# valid JSON that `json.loads` reads the same way; anything else, including
+# truncated or nested objects, falls back to `json.loads`.
+_WS = r"[ \t\n\r]*"
+_STRING = r'"(?:[^"\\\x00-\x1f]|\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4}))*"'
+_SCALAR = (
+    rf"(?:{_STRING}|true|false|null|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?"
+    r"(?:[eE][+-]?[0-9]+)?)"
+)
+_VALUE = rf"(?:{_SCALAR}|\[{_WS}(?:{_SCALAR}(?:{_WS},{_WS}{_SCALAR})*)?{_WS}\])"
+_OTHER_KEY = r'(?!"is_safe")"[^"\\\x00-\x1f]*"'
+_IS_SAFE_PATTERN = (
+    rf'\A{_WS}\{{{_WS}"is_safe"{_WS}:{_WS}(true|false)'
+    rf"(?:{_WS},{_WS}{_OTHER_KEY}{_WS}:{_WS}{_VALUE})*{_WS}\}}{_WS}\Z"
+)
+
+
+def parse_is_safe(annotations: pd.Series) -> pd.Series:
+    """Extract the `is_safe` field from a column of JSON annotations.
+
+    Annotations in the layout modelgauge writes are handled in a single
+    vectorized pass; only the remaining rows are parsed one by one, so that
+    every row reads as `json.loads` would read it. The result is a nullable
+    boolean series, with <NA> for rows that aren't valid JSON or have no
+    boolean `is_safe`.
+    """
+    extracted = annotations.astype("string").str.extract(_IS_SAFE_PATTERN, expand=False)
+    is_safe = extracted.map({"true": True, "false": False}).astype("boolean")
+    fallback = is_safe.isna().to_numpy()
+    if fallback.any():
+        is_safe[fallback] = pd.array(
+            [_parse_is_safe_row(x) for x in annotations.to_numpy()[fallback]],
+            dtype="boolean",
+        )
+    return is_safe
+
+
+def parse_logprobs(annotations: pd.Series) -> pd.Series:
+    """Extract the `logprobs` field from a column of JSON annotations.
+
+    The result is a float series, with NaN for rows that aren't valid JSON or
+    have no numeric `logprobs`. Only the rows that mention `logprobs` are
+    parsed.
+    """
+    logprobs = pd.Series(np.nan, index=annotations.index)
+    mentioned = annotations.astype("string").str.contains('"logprobs"', regex=False)
+    mentioned = mentioned.fillna(False).to_numpy(dtype=bool)
+    if mentioned.any():
+        logprobs[mentioned] = [
+            _parse_logprobs_row(x) for x in annotations.to_numpy()[mentioned]
+        ]
+    return logprobs
+
+
+def _parse_is_safe_row(annotation) -> bool | None:
+    is_safe = _field(annotation, "is_safe")
+    # E.g. `"is_safe": null` is missing, not unsafe.
+    return is_safe if isinstance(is_safe, bool) else None
+
+
+def _parse_logprobs_row(annotation) -> float:
+    try:
+        return float(_field(annotation, "logprobs"))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _field(annotation, key: str):
+    """The `key` field of a JSON annotation, or None if it hasn't one."""
+    try:
+        return json.loads(annotation)[key]
+    except (TypeError, ValueError, KeyError):
+        return None
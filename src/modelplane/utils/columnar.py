@@ -0,0 +1,87 @@
+"""Conversion of runway outputs between CSV and Parquet."""
+
+import csv
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from modelplane.utils.annotations import parse_is_safe, parse_logprobs
+
+# Typed columns the annotations' JSON is unpacked into.
+IS_SAFE_COL = "is_safe"
+LOGPROBS_COL = "logprobs"
+_ANNOTATION_FIELDS = pa.schema(
+    [pa.field(IS_SAFE_COL, pa.bool_()), pa.field(LOGPROBS_COL, pa.float64())]
+)
+_BLOCK_SIZE = 16 << 20
+
+
+def csv_to_parquet(
+    csv_path: str | Path, parquet_path: str | Path, annotation_col: str | None = None
+) -> None:
+    """
+    Convert a CSV file written by a runway to Parquet, a block at a time.
+
+    All columns are kept as strings, like the runways read them. With
+    `annotation_col`, the `is_safe` and `logprobs` fields of the JSON
+    annotations are also stored as typed columns, null where an annotation
+    doesn't have them, so readers don't have to parse the JSON.
+    """
+    with open(csv_path, newline="") as f:
+        header = next(csv.reader(f), [])
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=_BLOCK_SIZE),
+        # Responses can span lines.
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.string() for col in header},
+            strings_can_be_null=False,
+        ),
+    )
+    writer = None
+    try:
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            if annotation_col is not None:
+                annotations = table.column(annotation_col).to_pandas()
+                table = table.append_column(
+                    _ANNOTATION_FIELDS.field(IS_SAFE_COL),
+                    pa.Array.from_pandas(parse_is_safe(annotations), type=pa.bool_()),
+                ).append_column(
+                    _ANNOTATION_FIELDS.field(LOGPROBS_COL),
+                    pa.Array.from_pandas(
+                        parse_logprobs(annotations), type=pa.float64()
+                    ),
+                )
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            # No rows; keep the columns.
+            schema = pa.schema([pa.field(col, pa.string()) for col in header])
+            if annotation_col is not None:
+                schema = pa.unify_schemas([schema, _ANNOTATION_FIELDS])
+            writer = pq.ParquetWriter(parquet_path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def parquet_to_csv(parquet_path: str | Path, csv_path: str | Path) -> None:
+    """
+    Convert a Parquet file written by `csv_to_parquet` back to the CSV it was
+    made from, e.g. for modelgauge pipelines, which read CSV.
+    """
+    parquet = pq.ParquetFile(parquet_path)
+    columns = [
+        name
+        for name in parquet.schema_arrow.names
+        if name not in _ANNOTATION_FIELDS.names
+    ]
+    pd.DataFrame(columns=columns).to_csv(csv_path, index=False)
+    for batch in parquet.iter_batches(columns=columns):
+        batch.to_pandas().to_csv(csv_path, mode="a", header=False, index=False)
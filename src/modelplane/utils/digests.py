@@ -0,0 +1,91 @@
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from modelplane.utils.filecache import default_cache_root, file_sha256
+
+# Set to "false" to always hash files again, e.g. on filesystems with coarse mtimes.
+DIGEST_INDEX_ENV = "MODELPLANE_DIGEST_INDEX"
+_BUSY_TIMEOUT_SECONDS = 30
+
+
+class DigestIndex:
+    """SQLite index of the content digests of local files.
+
+    Entries are keyed by the file's resolved path, size and modification time,
+    so a file is only hashed again once it changed (or moved). This pays off
+    for files at stable paths, like local inputs; files from a `FileCache` are
+    named by their digest already. Entries of files that no longer exist are
+    dropped whenever one is added. Shared by the runs on a machine, like the
+    other caches under the cache root.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS digests ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+            )
+
+    def get(self, path: Path, stat: os.stat_result) -> str | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT digest FROM digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, path: Path, stat: os.stat_result, digest: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, digest),
+            )
+        self.prune()
+
+    def prune(self) -> None:
+        """Drop the entries of files that no longer exist, e.g. in removed temp dirs."""
+        with closing(self._connect()) as conn:
+            paths = [row[0] for row in conn.execute("SELECT path FROM digests")]
+        gone = [(path,) for path in paths if not os.path.exists(path)]
+        if gone:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany("DELETE FROM digests WHERE path = ?", gone)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT_SECONDS)
+
+
+def digest_index() -> DigestIndex | None:
+    """The machine's index of file digests, or None if it's disabled."""
+    if os.getenv(DIGEST_INDEX_ENV, "true").lower() == "false":
+        return None
+    return DigestIndex(default_cache_root() / "digests.sqlite")
+
+
+def content_digest(path: str | Path, index: DigestIndex | None = None) -> str:
+    """
+    SHA-256 of the file's content, or taken from `index` if the file didn't
+    change since it was last hashed.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    if index is not None:
+        try:
+            digest = index.get(path, stat)
+        except sqlite3.Error:
+            digest = None
+        if digest is not None:
+            return digest
+    digest = file_sha256(path)
+    if index is not None:
+        try:
+            index.put(path, stat, digest)
+        except sqlite3.Error as e:
+            # The digest is still right, it just isn't remembered.
+            print(f"Could not record the digest of {path}: {e}")
+    return digest
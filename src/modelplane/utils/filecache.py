@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+import uuid
+from pathlib import Path
+
+CACHE_ROOT_ENV = "MODELPLANE_CACHE_ROOT"
+_CHUNK_SIZE = 1 << 20
+
+
+def default_cache_root() -> Path:
+    """Root directory for modelplane's persistent local caches."""
+    return Path(
+        os.getenv(CACHE_ROOT_ENV, Path.home() / ".cache" / "modelplane")
+    ).expanduser()
+
+
+class FileCache:
+    """Persistent, content-addressed on-disk cache of files.
+
+    Files are stored once per content hash under `objects/`, named by their
+    SHA-256 (see `object_digest`), and looked up through small index entries
+    under `keys/`, so the same content cached under several keys only takes
+    space once. The total size of stored objects is kept under `max_bytes` by
+    evicting the least recently used ones.
+
+    Each index entry records the size of the stored file. A file whose size no
+    longer matches (e.g. it was truncated), or that doesn't match the size the
+    caller expects, is treated as a miss.
+
+    Files are copied into the cache, so the caller's file is left alone. Cached
+    files are read-only and may be hard linked into the caller's destination,
+    so consumers must not modify them in place. Recency is tracked in
+    `access/`, not on the cached files, whose mtimes never change.
+    """
+
+    def __init__(self, root: str | Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._objects = self.root / "objects"
+        self._keys = self.root / "keys"
+        self._access = self.root / "access"
+        self._tmp = self.root / "tmp"
+        for directory in (self._objects, self._keys, self._access, self._tmp):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str, expected_size: int | None = None) -> Path | None:
+        """Path of the cached file for `key`, or None if it isn't (intact) in the cache."""
+        index_path = self._index_path(key)
+        try:
+            entry = json.loads(index_path.read_text())
+            object_path = self._objects / entry["digest"]
+            size = object_path.stat().st_size
+        except (OSError, ValueError, KeyError):
+            return None
+        if size != entry["size"] or (
+            expected_size is not None and size != expected_size
+        ):
+            index_path.unlink(missing_ok=True)
+            object_path.unlink(missing_ok=True)
+            return None
+        self._touch(entry["digest"])
+        return object_path
+
+    def put(self, key: str, path: str | Path) -> Path:
+        """Add the file at `path` to the cache under `key` and return its cached path."""
+        tmp_path = self._tmp / uuid.uuid4().hex
+        try:
+            shutil.copyfile(path, tmp_path)
+            digest = file_sha256(tmp_path)
+            size = tmp_path.stat().st_size
+            object_path = self._objects / digest
+            if object_path.exists():
+                tmp_path.unlink()
+            else:
+                tmp_path.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp_path, object_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self._touch(digest)
+
+        tmp_index = self._tmp / f"{uuid.uuid4().hex}.json"
+        tmp_index.write_text(json.dumps({"key": key, "digest": digest, "size": size}))
+        os.replace(tmp_index, self._index_path(key))
+        self.evict()
+        return object_path
+
+    @staticmethod
+    def object_digest(object_path: str | Path) -> str:
+        """SHA-256 of a file returned by `get` or `put`, without reading it."""
+        return Path(object_path).name
+
+    def evict(self) -> None:
+        """Remove least recently used objects until the cache fits in `max_bytes`."""
+        objects = []
+        for object_path in self._objects.iterdir():
+            try:
+                info = object_path.stat()
+            except FileNotFoundError:
+                continue
+            try:
+                last_used = (self._access / object_path.name).stat().st_mtime_ns
+            except FileNotFoundError:
+                last_used = info.st_mtime_ns
+            objects.append((last_used, info.st_size, object_path))
+        total = sum(size for _, size, _ in objects)
+        for _, size, object_path in sorted(objects):
+            if total <= self.max_bytes:
+                break
+            object_path.unlink(missing_ok=True)
+            (self._access / object_path.name).unlink(missing_ok=True)
+            total -= size
+        # Index entries of evicted objects are dropped lazily by `get`.
+
+    def _touch(self, digest: str) -> None:
+        """Record a use of the object for LRU eviction."""
+        access_path = self._access / digest
+        access_path.touch()
+        # Explicit nanoseconds: the filesystem's own timestamps may be coarser.
+        now = time.time_ns()
+        os.utime(access_path, ns=(now, now))
+
+    def _index_path(self, key: str) -> Path:
+        return self._keys / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str | Path, dest: str | Path) -> None:
+    """Hard link `src` to `dest`, falling back to a copy across filesystems."""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
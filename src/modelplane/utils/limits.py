@@ -0,0 +1,218 @@
+import fcntl
+import functools
+import json
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+# Value of `num_workers` that makes the runways adapt their concurrency.
+AUTO_NUM_WORKERS = "auto"
+
+
+class RateLimiter:
+    """Spaces out calls to at most `max_per_second`, across all threads."""
+
+    def __init__(self, max_per_second: float):
+        assert max_per_second > 0, "max_per_second must be positive."
+        self.interval = 1.0 / max_per_second
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self) -> float:
+        """Wait for the next free slot and return how long that took, in seconds."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+            wait = slot - now
+            self.total_wait += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class FileTokenBucket:
+    """Token bucket shared by all processes on this machine through a locked file.
+
+    Holds up to `burst` tokens and refills at `rate` tokens per second. Each
+    call takes a token right away, letting the count go negative, and then
+    sleeps until its token would have been available. That way each call
+    needs a single short critical section, and waiting callers are served in
+    the order they arrived.
+    """
+
+    def __init__(self, path: str | Path, rate: float, burst: float = 1.0):
+        assert rate > 0, "rate must be positive."
+        assert burst >= 1, "burst must be at least 1."
+        self.path = Path(path)
+        self.rate = rate
+        self.burst = burst
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed, and return the wait in seconds."""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                now = time.time()
+                try:
+                    state = json.loads(f.read())
+                    tokens, updated = state["tokens"], state["updated"]
+                except (ValueError, KeyError, TypeError):
+                    tokens, updated = self.burst, now
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+                tokens -= 1
+                f.truncate(0)
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        wait = max(0.0, -tokens / self.rate)
+        with self._lock:
+            self.total_wait += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def rate_limit_method(obj, name: str, limiter: RateLimiter | FileTokenBucket) -> None:
+    """Make every call to `obj.<name>` wait for `limiter` first."""
+    method = getattr(obj, name)
+
+    @functools.wraps(method)
+    def limited(*args, **kwargs):
+        limiter.acquire()
+        return method(*args, **kwargs)
+
+    setattr(obj, name, limited)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits how many calls run at once, adapting the limit AIMD-style.
+
+    After each window of `limit` successful calls, the limit grows: it doubles
+    until the first sign of trouble ("slow start"), then grows by one. A
+    window with a call slower than `latency_tolerance` times the fastest call
+    seen doesn't grow the limit, and neither does a window with any other
+    failed call. An overload error (HTTP 429, a 5xx or a timeout) halves the
+    limit, once per window, since the calls already in flight were started at
+    the old limit.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: int = 1,
+        latency_tolerance: float = 2.0,
+        on_change: Callable[[int, int], None] | None = None,
+    ):
+        assert 1 <= min_limit <= initial_limit <= max_limit, "Invalid limits."
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = initial_limit
+        self.latency_tolerance = latency_tolerance
+        # Called with the new limit and the number of changes so far.
+        self._on_change = on_change
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._generation = 0
+        self._changes = 0
+        self._slow_start = True
+        self._min_latency = math.inf
+        self._window_successes = 0
+        self._window_slow = False
+
+    def call(self, fn: Callable, *args, **kwargs):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+            generation = self._generation
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._release(generation, overloaded=is_overload_error(e), failed=True)
+            raise
+        self._release(generation, latency=time.monotonic() - start)
+        return result
+
+    def _release(
+        self,
+        generation: int,
+        latency: float | None = None,
+        overloaded: bool = False,
+        failed: bool = False,
+    ) -> None:
+        change = None
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded and generation == self._generation:
+                self._slow_start = False
+                change = self._set_limit(self.limit // 2)
+            elif failed:
+                # Not (or no longer) a reason to back off, but not to grow either.
+                self._window_slow = True
+                self._slow_start = False
+            elif latency is not None:
+                self._min_latency = min(self._min_latency, latency)
+                if latency > self.latency_tolerance * self._min_latency:
+                    self._window_slow = True
+                    self._slow_start = False
+                self._window_successes += 1
+                if self._window_successes >= self.limit:
+                    if not self._window_slow:
+                        change = self._set_limit(
+                            self.limit * 2 if self._slow_start else self.limit + 1
+                        )
+                    self._window_successes = 0
+                    self._window_slow = False
+            self._cond.notify_all()
+        # Report outside the lock so a slow callback doesn't block the callers.
+        if change is not None and self._on_change is not None:
+            self._on_change(*change)
+
+    def _set_limit(self, limit: int) -> tuple[int, int] | None:
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        if limit == self.limit:
+            return None
+        self.limit = limit
+        self._generation += 1
+        self._changes += 1
+        self._window_successes = 0
+        self._window_slow = False
+        return limit, self._changes
+
+
+def is_overload_error(e: Exception) -> bool:
+    """Whether `e` means the service is overloaded: an HTTP 429 or 5xx, or a timeout."""
+    if isinstance(e, TimeoutError):
+        return True
+    for source in (e, getattr(e, "response", None)):
+        status = getattr(source, "status_code", None) or getattr(source, "status", None)
+        if status == 429 or (isinstance(status, int) and 500 <= status < 600):
+            return True
+    # Client libraries have their own exception types, e.g. openai.RateLimitError
+    # or httpx.ReadTimeout, which don't share a base class we could check.
+    name = type(e).__name__
+    return "RateLimit" in name or "Timeout" in name or "TooManyRequests" in name
+
+
+def concurrency_limit_method(
+    obj, name: str, limiter: AdaptiveConcurrencyLimiter
+) -> None:
+    """Make every call to `obj.<name>` go through `limiter`."""
+    method = getattr(obj, name)
+
+    @functools.wraps(method)
+    def limited(*args, **kwargs):
+        return limiter.call(method, *args, **kwargs)
+
+    setattr(obj, name, limited)
@@ -0,0 +1,225 @@
+import fnmatch
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Iterable, List
+
+RESPONSE_CACHE_DIR_ENV = "MODELPLANE_RESPONSE_CACHE_DIR"
+DEFAULT_RESPONSE_CACHE_DIR = ".cache"
+# How long a process waits for another one's write lock on a cache file.
+_BUSY_TIMEOUT_SECONDS = 30
+# SQLite keeps these next to a database in WAL mode.
+_SIDECAR_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def response_cache_dir(cache_dir: str | Path | None = None) -> Path:
+    """
+    The directory SUT and annotator responses are cached in: `cache_dir` if
+    given, else the one in the environment, else `.cache` in the working
+    directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.getenv(RESPONSE_CACHE_DIR_ENV, DEFAULT_RESPONSE_CACHE_DIR)
+    return Path(cache_dir).expanduser()
+
+
+@dataclass
+class CacheFileStats:
+    path: Path
+    size_bytes: int
+    entries: int
+    # When a response was last written to the file, in seconds since the epoch.
+    last_write: float
+
+
+class ResponseCache:
+    """The SQLite files modelgauge caches SUT and annotator responses in.
+
+    modelgauge owns the format of the entries, so the cache is managed a file
+    (i.e. a SUT or annotator) at a time. The files are switched to write-ahead
+    logging, so many worker processes, e.g. several runs on a shared host,
+    can read and write them at once.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def files(self, uids: Iterable[str] | None = None) -> List[Path]:
+        """The cache files, or only those of the SUTs/annotators matching the `uids` patterns."""
+        if not self.root.is_dir():
+            return []
+        files = sorted(self.root.rglob("*.sqlite"))
+        if uids is None:
+            return files
+        uids = list(uids)
+        return [
+            path
+            for path in files
+            if any(fnmatch.fnmatchcase(cache_file_uid(path), uid) for uid in uids)
+        ]
+
+    def prepare(self) -> None:
+        """Create the cache directory, and switch its files to write-ahead logging."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        for path in self.files():
+            try:
+                with closing(_connect(path)) as conn:
+                    conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error as e:
+                # The file still works, just with less concurrency.
+                print(f"Could not enable write-ahead logging for {path}: {e}")
+
+    def stats(self) -> List[CacheFileStats]:
+        stats = []
+        for path in self.files():
+            size = sum(p.stat().st_size for p in _with_sidecars(path) if p.exists())
+            last_write = max(
+                p.stat().st_mtime for p in _with_sidecars(path) if p.exists()
+            )
+            stats.append(CacheFileStats(path, size, _count_entries(path), last_write))
+        return stats
+
+    def prune(
+        self, max_age_seconds: float | None = None, max_bytes: int | None = None
+    ) -> List[CacheFileStats]:
+        """
+        Remove the files that weren't written to in `max_age_seconds`, then the
+        least recently written ones until the cache fits in `max_bytes`.
+        Returns the removed files.
+
+        A run using a removed file keeps working, but its new responses are lost.
+        """
+        stats = sorted(self.stats(), key=lambda s: s.last_write)
+        removed = []
+        if max_age_seconds is not None:
+            cutoff = time.time() - max_age_seconds
+            removed = [s for s in stats if s.last_write < cutoff]
+            stats = [s for s in stats if s.last_write >= cutoff]
+        if max_bytes is not None:
+            total = sum(s.size_bytes for s in stats)
+            while stats and total > max_bytes:
+                oldest = stats.pop(0)
+                total -= oldest.size_bytes
+                removed.append(oldest)
+        for s in removed:
+            for path in _with_sidecars(s.path):
+                path.unlink(missing_ok=True)
+        return removed
+
+    def export(
+        self, bundle: str | Path, uids: Iterable[str] | None = None
+    ) -> List[Path]:
+        """
+        Write the cache files of the SUTs/annotators matching the `uids` patterns
+        (all if None) to a compressed `bundle`, and return the files exported.
+
+        Each file is copied with SQLite's backup API, so the bundle is
+        consistent even while runs are writing to the cache.
+        """
+        files = self.files(uids)
+        with tempfile.TemporaryDirectory() as tmp, tarfile.open(bundle, "w:gz") as tar:
+            for path in files:
+                relative = path.relative_to(self.root)
+                snapshot = Path(tmp) / relative
+                snapshot.parent.mkdir(parents=True, exist_ok=True)
+                with (
+                    closing(_connect(path, read_only=True)) as src,
+                    closing(_connect(snapshot)) as dest,
+                ):
+                    src.backup(dest)
+                tar.add(snapshot, arcname=relative.as_posix())
+        return files
+
+    def import_bundle(self, bundle: str | Path) -> List[Path]:
+        """
+        Add the cache files in `bundle` to this cache, and return the files
+        added to. Entries the cache already has are kept as they are.
+        """
+        self.prepare()
+        imported = []
+        with tempfile.TemporaryDirectory() as tmp, tarfile.open(bundle, "r:gz") as tar:
+            for member in tar:
+                name = PurePosixPath(member.name)
+                if (
+                    not member.isfile()
+                    or name.suffix != ".sqlite"
+                    or name.is_absolute()
+                    or ".." in name.parts
+                ):
+                    continue
+                extracted = Path(tmp) / name.name
+                with tar.extractfile(member) as src, open(extracted, "wb") as dest:
+                    shutil.copyfileobj(src, dest)
+                path = self.root / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _merge_into(extracted, path)
+                imported.append(path)
+        return imported
+
+
+def cache_file_uid(path: Path) -> str:
+    """The uid of the SUT or annotator whose responses are cached in `path`."""
+    return path.stem.removesuffix("_cache")
+
+
+def _merge_into(src: Path, dest: Path) -> None:
+    """Add the entries of the SQLite file `src` that `dest` doesn't have to it."""
+    with closing(_connect(dest)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("ATTACH DATABASE ? AS src", (str(src),))
+        tables = conn.execute(
+            "SELECT name, sql FROM src.sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        with conn:
+            for name, sql in tables:
+                conn.execute(
+                    sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO main.{0} SELECT * FROM src.{0}".format(
+                        _quote(name)
+                    )
+                )
+        conn.execute("DETACH DATABASE src")
+
+
+def _quote(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _connect(path: Path, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        return sqlite3.connect(
+            f"{path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            timeout=_BUSY_TIMEOUT_SECONDS,
+        )
+    return sqlite3.connect(path, timeout=_BUSY_TIMEOUT_SECONDS)
+
+
+def _with_sidecars(path: Path) -> List[Path]:
+    return [path] + [path.with_name(path.name + s) for s in _SIDECAR_SUFFIXES]
+
+
+def _count_entries(path: Path) -> int:
+    try:
+        # Read only, so counting doesn't get in the way of running workers.
+        with closing(_connect(path, read_only=True)) as conn:
+            tables = [
+                name
+                for (name,) in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            ]
+            return sum(
+                conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+                for table in tables
+            )
+    except sqlite3.Error:
+        return 0
@@ -0,0 +1,136 @@
+import math
+from typing import Iterator
+
+import numpy as np
+
+_BATCH_SIZE = 4096
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max of a stream of values.
+
+    Uses constant memory: values are buffered in small batches, and each batch
+    is folded into the running totals with the parallel form of Welford's
+    algorithm. NaNs are ignored, matching numpy's nan* functions.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+        self._buffer: list[float] = []
+
+    def add(self, value) -> None:
+        self._buffer.append(float(value))
+        if len(self._buffer) >= _BATCH_SIZE:
+            self._flush()
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation, like np.nanstd."""
+        self._flush()
+        return math.sqrt(self._m2 / self.count) if self.count else math.nan
+
+    def finalize(self) -> "RunningStats":
+        self._flush()
+        return self
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        values = np.asarray(self._buffer, dtype=float)
+        self._buffer.clear()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        batch_count = len(values)
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self._m2 += batch_m2 + delta**2 * self.count * batch_count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+
+class Histogram:
+    """Fixed-bin histogram that is filled incrementally.
+
+    Bin edges are the ones np.histogram (and so matplotlib's `hist`) would use
+    for the given range, so plotting the counts gives the same figure as
+    plotting the raw values.
+    """
+
+    def __init__(self, bins: int, value_range: tuple[float, float]):
+        self.edges = np.histogram_bin_edges([], bins=bins, range=value_range)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self._buffer: list[float] = []
+
+    @classmethod
+    def spanning(cls, stats: RunningStats, bins: int) -> "Histogram":
+        """A histogram covering the range seen by `stats`, or [0, 1] if it saw nothing."""
+        stats.finalize()
+        if stats.count == 0:
+            return cls(bins, (0.0, 1.0))
+        return cls(bins, (stats.min, stats.max))
+
+    def add(self, value) -> None:
+        self._buffer.append(float(value))
+        if len(self._buffer) >= _BATCH_SIZE:
+            self._flush()
+
+    def finalize(self) -> "Histogram":
+        self._flush()
+        return self
+
+    def add_many(self, values: np.ndarray) -> None:
+        counts, _ = np.histogram(values[~np.isnan(values)], bins=self.edges)
+        self.counts += counts
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        values = np.asarray(self._buffer, dtype=float)
+        self._buffer.clear()
+        self.add_many(values)
+
+
+class ValueSpool:
+    """Stream of values spooled to a file, to be read back in chunks.
+
+    Lets a single pass over the data both find the range of the values (with
+    `RunningStats`) and, afterwards, bin them into a `Histogram` spanning that
+    range, without holding the values in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._buffer: list[float] = []
+
+    def add(self, value) -> None:
+        self._buffer.append(float(value))
+        if len(self._buffer) >= _BATCH_SIZE:
+            self._flush()
+
+    def chunks(self, size: int = 64 * _BATCH_SIZE) -> Iterator[np.ndarray]:
+        """The spooled values, `size` at a time. Ends the spool."""
+        self.close()
+        with open(self.path, "rb") as f:
+            while len(chunk := np.fromfile(f, dtype=float, count=size)):
+                yield chunk
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._flush()
+            self._file.close()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        np.asarray(self._buffer, dtype=float).tofile(self._file)
+        self._buffer.clear()
@@ -0,0 +1,24 @@
+import collections
+import time
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """Accumulates the wall time spent in named phases of a run."""
+
+    def __init__(self):
+        self.durations: dict[str, float] = collections.defaultdict(float)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+
+    def metrics(self) -> dict[str, float]:
+        """The durations as run metrics, e.g. `phase_download_seconds`."""
+        return {
+            f"phase_{name}_seconds": seconds for name, seconds in self.durations.items()
+        }
@@ -4,8 +4,10 @@ from typing import List
 
 import mlflow
 import mlflow.artifacts
+import pytest
 
 from modelplane.runways.annotator import annotate
+from modelplane.runways.pipeline import run_pipeline
 from modelplane.runways.responder import respond
 from modelplane.runways.scorer import score
 from modelplane.runways.utils import PROMPT_RESPONSE_ARTIFACT_NAME
@@ -44,6 +46,114 @@ def test_e2e():
     )
 
 
+@pytest.mark.parametrize("stream", [False, True])
+def test_pipeline(stream):
+    experiment = "test_pipeline_" + time.strftime("%Y%m%d%H%M%S", time.localtime())
+    run_artifacts = run_pipeline(
+        sut_id="demo_yes_no",
+        prompts="tests/data/prompts.csv",
+        annotator_ids=[TEST_ANNOTATOR_ID],
+        experiment=experiment,
+        ground_truth="tests/data/ground_truth.csv",
+        disable_cache=True,
+        stream=stream,
+    )
+
+    parent = mlflow.get_run(run_artifacts.run_id)
+    assert parent.data.tags["type"] == "pipeline"
+    child_ids = {
+        run_type: parent.data.tags[f"{run_type}_run_id"]
+        for run_type in ("get-sut-responses", "annotate", "score")
+    }
+    for run_type, child_id in child_ids.items():
+        child = mlflow.get_run(child_id)
+        assert child.data.tags["mlflow.parentRunId"] == run_artifacts.run_id
+        assert child.data.tags["type"] == run_type
+
+    # Downstream steps reference the upstream outputs instead of re-uploading them.
+    annotation_artifacts = [
+        a.path for a in mlflow.artifacts.list_artifacts(run_id=child_ids["annotate"])
+    ]
+    assert "annotations.csv" in annotation_artifacts
+    assert PROMPT_RESPONSE_ARTIFACT_NAME not in annotation_artifacts
+    annotation_run = mlflow.get_run(child_ids["annotate"])
+    assert annotation_run.data.tags["input_run_id"] == child_ids["get-sut-responses"]
+    assert annotation_run.data.metrics[f"{TEST_ANNOTATOR_ID}_total_count"] == 10
+    response_artifacts = [
+        a.path
+        for a in mlflow.artifacts.list_artifacts(run_id=child_ids["get-sut-responses"])
+    ]
+    assert PROMPT_RESPONSE_ARTIFACT_NAME in response_artifacts
+    response_run = mlflow.get_run(child_ids["get-sut-responses"])
+    assert response_run.data.metrics["demo_yes_no_response_count"] == 10
+
+    score_run = mlflow.get_run(child_ids["score"])
+    assert score_run.data.tags["input_run_id"] == child_ids["annotate"]
+    assert score_run.data.metrics[f"{TEST_ANNOTATOR_ID}_num_samples_scored"] == 10
+
+
+def test_respond_multiple_suts():
+    experiment = "test_multi_sut_" + time.strftime("%Y%m%d%H%M%S", time.localtime())
+    sut_ids = ["demo_yes_no", "demo_always_sorry"]
+    run_artifacts = respond(
+        sut_id=sut_ids,
+        prompts="tests/data/prompts.csv",
+        experiment=experiment,
+        disable_cache=True,
+        num_workers="auto",
+        sut_num_workers={"demo_always_sorry": 2},
+        sut_rate_limits={"demo_yes_no": 100},
+    )
+
+    run = mlflow.get_run(run_artifacts.run_id)
+    for sut_id in sut_ids:
+        assert run.data.metrics[f"{sut_id}_response_count"] == 10
+        assert run.data.tags[f"sut_{sut_id}"] == "true"
+    assert run.data.params["demo_always_sorry_num_workers"] == "2"
+    # Only the SUT without a fixed number of workers is autoscaled.
+    assert "demo_yes_no_concurrency" in run.data.metrics
+    assert "demo_always_sorry_concurrency" not in run.data.metrics
+
+    responses_path = mlflow.artifacts.download_artifacts(
+        run_id=run_artifacts.run_id, artifact_path=PROMPT_RESPONSE_ARTIFACT_NAME
+    )
+    with open(responses_path) as f:
+        responses = list(csv.DictReader(f))
+    assert len(responses) == 20
+    assert {response["sut_uid"] for response in responses} == set(sut_ids)
+
+
+def test_annotate_incremental():
+    experiment = "test_incremental_" + time.strftime("%Y%m%d%H%M%S", time.localtime())
+    response_run = respond(
+        sut_id="demo_yes_no",
+        prompts="tests/data/prompts.csv",
+        experiment=experiment,
+        disable_cache=True,
+    )
+    annotation_run = annotate(
+        response_run_id=response_run.run_id,
+        annotator_ids=[TEST_ANNOTATOR_ID],
+        experiment=experiment,
+        disable_cache=True,
+    )
+    run_artifacts = annotate(
+        response_run_id=response_run.run_id,
+        annotator_ids=[TEST_ANNOTATOR_ID],
+        experiment=experiment,
+        disable_cache=True,
+        previous_annotation_run_id=annotation_run.run_id,
+    )
+
+    run = mlflow.get_run(run_artifacts.run_id)
+    assert run.data.tags["previous_annotation_run_id"] == annotation_run.run_id
+    # Every annotation is already in the previous run.
+    assert run.data.metrics["reused_annotation_count"] == 10
+    assert run.data.metrics["computed_annotation_count"] == 0
+    assert run.data.metrics[f"{TEST_ANNOTATOR_ID}_total_count"] == 10
+    assert run.data.metrics[f"{TEST_ANNOTATOR_ID}_total_safe"] == 5
+
+
 def check_responder(
     sut_id: str,
     prompts: str,
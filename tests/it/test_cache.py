@@ -0,0 +1,78 @@
+import errno
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+import mlflow
+import pytest
+
+from modelplane.runways.cache import export_cache, import_cache
+from modelplane.runways.utils import RUN_TYPE_CACHE_EXPORT, RUN_TYPE_TAG_NAME
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mlflow_tracking():
+    mlflow.set_tracking_uri(f"file://{tempfile.mkdtemp()}")
+
+
+def make_cache_file(path, entries):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute('CREATE TABLE "v1" (key TEXT PRIMARY KEY, value BLOB)')
+        conn.executemany(
+            'INSERT INTO "v1" VALUES (?, ?)', [(str(i), b"x") for i in range(entries)]
+        )
+        conn.commit()
+
+
+def test_export_import_through_mlflow(tmp_path):
+    make_cache_file(tmp_path / "source" / "demo_yes_no.sqlite", 4)
+    make_cache_file(tmp_path / "source" / "other.sqlite", 1)
+
+    run_id = export_cache(
+        uids=["demo_yes_no"],
+        cache_dir=str(tmp_path / "source"),
+        experiment="test-cache-export",
+    )
+
+    run = mlflow.get_run(run_id)
+    assert run.data.tags[RUN_TYPE_TAG_NAME] == RUN_TYPE_CACHE_EXPORT
+    assert run.data.tags["uids"] == "demo_yes_no"
+
+    import_cache(run_id=run_id, cache_dir=str(tmp_path / "dest"))
+
+    assert [p.name for p in (tmp_path / "dest").iterdir()] == ["demo_yes_no.sqlite"]
+    with closing(sqlite3.connect(tmp_path / "dest" / "demo_yes_no.sqlite")) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM "v1"').fetchone()[0] == 4
+
+
+def test_export_to_file(tmp_path):
+    make_cache_file(tmp_path / "source" / "demo_yes_no.sqlite", 2)
+    output = tmp_path / "bundle.tar.gz"
+
+    assert export_cache(output=str(output), cache_dir=str(tmp_path / "source")) is None
+
+    import_cache(bundle=str(output), cache_dir=str(tmp_path / "dest"))
+    assert (tmp_path / "dest" / "demo_yes_no.sqlite").exists()
+
+
+def test_export_to_other_filesystem(tmp_path, monkeypatch):
+    make_cache_file(tmp_path / "source" / "demo_yes_no.sqlite", 2)
+    output = tmp_path / "bundle.tar.gz"
+
+    def cross_device(src, dest):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, "rename", cross_device)
+    monkeypatch.setattr(os, "replace", cross_device)
+    export_cache(output=str(output), cache_dir=str(tmp_path / "source"))
+
+    import_cache(bundle=str(output), cache_dir=str(tmp_path / "dest"))
+    assert (tmp_path / "dest" / "demo_yes_no.sqlite").exists()
+
+
+def test_export_nothing(tmp_path):
+    output = tmp_path / "bundle.tar.gz"
+    export_cache(output=str(output), cache_dir=str(tmp_path / "empty"))
+    assert not output.exists()
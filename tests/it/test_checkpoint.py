@@ -0,0 +1,193 @@
+import tempfile
+
+import mlflow
+import pytest
+
+from modelplane.runways.checkpoint import (
+    Checkpointer,
+    load_partial_outputs,
+    new_attempt_dir,
+    read_complete_rows,
+    remove_work_dir,
+    run_work_dir,
+)
+from modelplane.utils.filecache import CACHE_ROOT_ENV
+
+HEADER = "prompt_uid,sut_uid,sut_response\n"
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+
+
+@pytest.fixture(scope="module")
+def mlflow_experiment_id():
+    mlflow.set_tracking_uri(f"file://{tempfile.mkdtemp()}")
+    return mlflow.create_experiment(name="test-checkpoint")
+
+
+def test_read_complete_rows_drops_cut_off_row(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    path.write_text(HEADER + "p1,demo,yes\np2,demo,n")
+    rows = read_complete_rows(path)
+    assert rows.to_dict("records") == [
+        {"prompt_uid": "p1", "sut_uid": "demo", "sut_response": "yes"}
+    ]
+
+
+def test_read_complete_rows_drops_cut_off_quoted_field(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    path.write_text(HEADER + 'p1,demo,"multi\nline"\np2,demo,"cut\noff\n')
+    rows = read_complete_rows(path)
+    assert rows["prompt_uid"].tolist() == ["p1"]
+    assert rows["sut_response"].tolist() == ["multi\nline"]
+
+
+def test_read_complete_rows_keeps_other_line_breaks(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    response = "page\x0cbreak\x1cand\x85unicode\u2028line\u2029breaks"
+    # csv.writer doesn't quote fields for these.
+    path.write_text(HEADER + f"p1,demo,{response}\np2,demo,no\n", newline="")
+    rows = read_complete_rows(path)
+    assert rows["prompt_uid"].tolist() == ["p1", "p2"]
+    assert rows["sut_response"].tolist() == [response, "no"]
+
+
+def test_read_complete_rows_keeps_strings(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    path.write_text(HEADER + "001,demo,1.0\r\n")
+    rows = read_complete_rows(path)
+    assert rows.to_dict("records") == [
+        {"prompt_uid": "001", "sut_uid": "demo", "sut_response": "1.0"}
+    ]
+
+
+def test_read_complete_rows_empty(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    path.write_text("")
+    assert read_complete_rows(path) is None
+
+
+def test_attempt_dirs(mlflow_experiment_id):
+    assert new_attempt_dir("run").name == "attempt-0"
+    assert new_attempt_dir("run").name == "attempt-1"
+    remove_work_dir("run")
+    assert not run_work_dir("run").exists()
+
+
+def test_attempt_dirs_follow_checkpointed_attempts(mlflow_experiment_id, tmp_path):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        pass
+    run_id = run.info.run_id
+    for attempt in ("attempt-0", "attempt-1"):
+        (tmp_path / attempt).mkdir()
+        (tmp_path / attempt / "prompt-responses.csv").write_text(HEADER)
+        mlflow.tracking.MlflowClient().log_artifact(
+            run_id, str(tmp_path / attempt), "checkpoint"
+        )
+
+    # On another machine, before the checkpoints are downloaded.
+    assert new_attempt_dir(run_id).name == "attempt-2"
+    remove_work_dir(run_id)
+    # After they're downloaded into the work dir.
+    load_partial_outputs(run_id, "prompt-responses.csv", ["prompt_uid"])
+    assert (run_work_dir(run_id) / "checkpoint" / "attempt-1").exists()
+    assert new_attempt_dir(run_id).name == "attempt-2"
+
+
+def test_load_partial_outputs_from_work_dir(mlflow_experiment_id):
+    for response in ("first", "second"):
+        attempt_dir = new_attempt_dir("run")
+        (attempt_dir / "sut-0").mkdir()
+        (attempt_dir / "sut-0" / "prompt-responses.csv").write_text(
+            HEADER + f"p1,demo,{response}\np2,demo,{response}"
+        )
+    rows = load_partial_outputs(
+        "run", "prompt-responses.csv", ["prompt_uid", "sut_uid"]
+    )
+    # The cut off p2 rows are dropped, and p1 is only kept once.
+    assert rows.to_dict("records") == [
+        {"prompt_uid": "p1", "sut_uid": "demo", "sut_response": "first"}
+    ]
+
+
+def test_load_partial_outputs_from_output_dir(mlflow_experiment_id, tmp_path):
+    new_attempt_dir("run")
+    (tmp_path / "sut-0").mkdir()
+    (tmp_path / "sut-0" / "prompt-responses.csv").write_text(HEADER + "p1,demo,yes\n")
+    rows = load_partial_outputs(
+        "run", "prompt-responses.csv", ["prompt_uid", "sut_uid"], str(tmp_path)
+    )
+    assert rows["sut_response"].tolist() == ["yes"]
+
+
+def test_load_partial_outputs_none(mlflow_experiment_id):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        pass
+    assert (
+        load_partial_outputs(run.info.run_id, "prompt-responses.csv", ["prompt_uid"])
+        is None
+    )
+
+
+def test_checkpoint_on_failure(mlflow_experiment_id):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        attempt_dir = new_attempt_dir(run.info.run_id)
+        output = attempt_dir / "sut-0" / "prompt-responses.csv"
+        output.parent.mkdir()
+        with pytest.raises(RuntimeError):
+            with Checkpointer(
+                run.info.run_id, attempt_dir, attempt_dir.name, interval=0
+            ) as checkpointer:
+                checkpointer.watch(output)
+                output.write_text(HEADER + "p1,demo,yes\n")
+                raise RuntimeError("crash")
+
+    artifacts = mlflow.artifacts.list_artifacts(
+        run_id=run.info.run_id, artifact_path="checkpoint/attempt-0/sut-0"
+    )
+    assert [a.path for a in artifacts] == [
+        "checkpoint/attempt-0/sut-0/prompt-responses.csv"
+    ]
+
+    # On another machine, the checkpoint is downloaded.
+    remove_work_dir(run.info.run_id)
+    rows = load_partial_outputs(
+        run.info.run_id, "prompt-responses.csv", ["prompt_uid", "sut_uid"]
+    )
+    assert rows["sut_response"].tolist() == ["yes"]
+
+
+def test_checkpoint_outside_local_root(mlflow_experiment_id, tmp_path):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        attempt_dir = new_attempt_dir(run.info.run_id)
+        previous = attempt_dir / "previous" / "prompt-responses.csv"
+        previous.parent.mkdir()
+        previous.write_text(HEADER + "p1,demo,yes\n")
+        with pytest.raises(RuntimeError):
+            with Checkpointer(
+                run.info.run_id, tmp_path, attempt_dir.name, interval=0
+            ) as checkpointer:
+                checkpointer.watch(previous, "previous/prompt-responses.csv")
+                raise RuntimeError("crash")
+
+    artifacts = mlflow.artifacts.list_artifacts(
+        run_id=run.info.run_id, artifact_path="checkpoint/attempt-0/previous"
+    )
+    assert [a.path for a in artifacts] == [
+        "checkpoint/attempt-0/previous/prompt-responses.csv"
+    ]
+
+
+def test_no_checkpoint_on_success(mlflow_experiment_id):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        attempt_dir = new_attempt_dir(run.info.run_id)
+        output = attempt_dir / "prompt-responses.csv"
+        with Checkpointer(
+            run.info.run_id, attempt_dir, attempt_dir.name, interval=0
+        ) as checkpointer:
+            checkpointer.watch(output)
+            output.write_text(HEADER + "p1,demo,yes\n")
+
+    assert mlflow.artifacts.list_artifacts(run_id=run.info.run_id) == []
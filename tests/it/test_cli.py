@@ -1,7 +1,13 @@
+import tempfile
+from pathlib import Path
+
+import click
+import mlflow
 import pytest
 from click.testing import CliRunner
 
-from modelplane.cli import cli
+from modelplane.cli import ARTIFACT_FORMATS, NUM_WORKERS, _parse_per_sut, cli
+from modelplane.runways import utils
 
 
 def test_main_help():
@@ -23,9 +29,15 @@ def test_main_help():
         "get-sut-responses",
         "annotate",
         "score",
+        "pipeline",
         "list-suts",
         "list-annotators",
         "list-ensemble-strategies",
+        "cache",
+        "cache stats",
+        "cache prune",
+        "cache export",
+        "cache import",
     ],
 )
 def test_command_help(command):
@@ -33,8 +45,94 @@ def test_command_help(command):
     result = runner.invoke(
         cli,
         [
-            command,
+            *command.split(),
             "--help",
         ],
     )
     assert result.exit_code == 0
+
+
+def test_score_default_columns():
+    # No column flags: the annotation schema's defaults are used.
+    mlflow.set_tracking_uri(f"file://{tempfile.mkdtemp()}")
+    data = Path(__file__).parent.parent / "data"
+    with mlflow.start_run(
+        experiment_id=mlflow.create_experiment("test-cli-score")
+    ) as run:
+        mlflow.log_artifact(str(data / "annotations.csv"))
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "score",
+            "--experiment",
+            "test-cli-score",
+            "--annotation_run_id",
+            run.info.run_id,
+            "--ground_truth",
+            str(data / "ground_truth.csv"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    score_runs = mlflow.search_runs(
+        experiment_names=["test-cli-score"], filter_string="tags.type = 'score'"
+    )
+    assert len(score_runs) == 1
+
+
+def test_cache_commands(tmp_path):
+    runner = CliRunner()
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "demo_yes_no.sqlite").write_bytes(b"responses")
+
+    result = runner.invoke(cli, ["cache", "stats", "--cache_dir", str(cache_dir)])
+    assert result.exit_code == 0
+    assert "demo_yes_no.sqlite" in result.output
+
+    result = runner.invoke(cli, ["cache", "prune", "--cache_dir", str(cache_dir)])
+    assert result.exit_code != 0
+    assert "--max_age_days" in result.output
+
+    result = runner.invoke(
+        cli, ["cache", "prune", "--cache_dir", str(cache_dir), "--max_bytes", "0"]
+    )
+    assert result.exit_code == 0
+    assert not (cache_dir / "demo_yes_no.sqlite").exists()
+
+
+def test_cache_export_import_usage():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["cache", "export"])
+    assert result.exit_code != 0
+    assert "--output" in result.output
+    result = runner.invoke(cli, ["cache", "import"])
+    assert result.exit_code != 0
+    assert "--run_id" in result.output
+
+
+def test_artifact_formats():
+    assert tuple(ARTIFACT_FORMATS) == utils.ARTIFACT_FORMATS
+
+
+def test_parse_per_sut():
+    assert _parse_per_sut("--opt", ("a=2", "b/c=3"), int) == {"a": 2, "b/c": 3}
+    assert _parse_per_sut("--opt", ("a=0.5",), float) == {"a": 0.5}
+    assert _parse_per_sut("--opt", (), int) == {}
+
+
+@pytest.mark.parametrize("value", ["a", "=2", "a=two"])
+def test_parse_per_sut_invalid(value):
+    with pytest.raises(click.BadParameter):
+        _parse_per_sut("--opt", (value,), int)
+
+
+@pytest.mark.parametrize("value,expected", [("auto", "auto"), ("4", 4), (2, 2)])
+def test_num_workers_type(value, expected):
+    assert NUM_WORKERS.convert(value, None, None) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "many"])
+def test_num_workers_type_invalid(value):
+    with pytest.raises(click.BadParameter):
+        NUM_WORKERS.convert(value, None, None)
@@ -3,17 +3,26 @@ import tempfile
 from pathlib import Path
 from unittest.mock import patch
 
+import pandas as pd
 import pytest
 import mlflow
 import mlflow.tracking
 
+from modelplane.mlflow.batchlogger import BatchLogger
+from modelplane.mlflow.datasets import RunArtifactDatasetSource
+from modelplane.mlflow.uploader import ArtifactUploader
 from modelplane.runways.data import (
     _MLFLOW_REQUIRED_ERROR_MESSAGE,
+    ARTIFACT_CACHE_MAX_BYTES_ENV,
+    DataframeInput,
     LocalInput,
     DVCInput,
+    LocalArtifactInput,
     MLFlowArtifactInput,
+    REFERENCE_INPUT_ARTIFACTS_ENV,
     build_and_log_input,
 )
+from modelplane.utils.filecache import CACHE_ROOT_ENV, file_sha256
 
 LOCAL_FILE_PATH = "tests/data/prompts.csv"
 LOCAL_FILE_NAME = "prompts.csv"
@@ -63,6 +72,35 @@ class TestLocalInput:
         artifact = artifacts[0]
 
         assert artifact.path == Path(LOCAL_FILE_PATH).name
+        tags = mlflow.get_run(run_id).data.tags
+        assert tags["input_digest"] == file_sha256(LOCAL_FILE_PATH)
+
+
+class TestDataframeInput:
+    @pytest.fixture
+    def df(self):
+        return pd.read_csv(LOCAL_FILE_PATH)
+
+    def test_writes_lazily(self, df, tmp_path):
+        df_input = DataframeInput(df, str(tmp_path))
+        assert not (tmp_path / "input.csv").exists()
+
+        path = df_input.local_path()
+
+        assert path == tmp_path / "input.csv"
+        pd.testing.assert_frame_equal(pd.read_csv(path), df)
+
+    def test_skips_unchanged_writes(self, df, tmp_path):
+        df_input = DataframeInput(df, str(tmp_path))
+        with patch.object(pd.DataFrame, "to_csv", autospec=True) as to_csv:
+            df_input.local_path().touch()
+            df_input.df = df.copy()
+            df_input.local_path()
+            assert to_csv.call_count == 1
+
+            df_input.df = df.iloc[::-1]
+            df_input.local_path()
+            assert to_csv.call_count == 2
 
 
 class TestDVCInput:
@@ -99,6 +137,39 @@ class TestDVCInput:
 
         assert artifact.path == Path(LOCAL_FILE_PATH).name
 
+    @patch("modelplane.runways.data.dvc.api")
+    def test_pinned_revision_served_from_cache(self, mock_dvc, tmp_path, monkeypatch):
+        monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+        mock_dvc.open.side_effect = lambda **kwargs: open(kwargs["path"], "rb")
+        repo = "https://github.com/fake-org/fake-repo.git#" + "a" * 40
+
+        first = DVCInput(LOCAL_FILE_PATH, repo, str(tmp_path / "first"))
+        second = DVCInput(LOCAL_FILE_PATH, repo, str(tmp_path / "second"))
+
+        assert mock_dvc.open.call_count == 1
+        assert first.input_metrics() == {"dvc_cache_hits": 0, "dvc_cache_misses": 1}
+        assert second.input_metrics() == {"dvc_cache_hits": 1, "dvc_cache_misses": 0}
+        assert second.input_tags()["input_commit"] == "a" * 40
+        assert second.local_path().read_text() == Path(LOCAL_FILE_PATH).read_text()
+
+    @patch("modelplane.runways.data.dvc.api")
+    def test_prefetch(self, mock_dvc, tmp_path, monkeypatch):
+        monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+        mock_dvc.open.side_effect = lambda **kwargs: open(kwargs["path"], "rb")
+        repo = "https://github.com/fake-org/fake-repo.git#" + "a" * 40
+
+        inputs = DVCInput.prefetch(
+            [LOCAL_FILE_PATH, ARTIFACT_PATH], repo, str(tmp_path / "dest")
+        )
+
+        assert list(inputs) == [LOCAL_FILE_PATH, ARTIFACT_PATH]
+        for path, dvc_input in inputs.items():
+            assert dvc_input.local_path().read_text() == Path(path).read_text()
+
+    def test_prefetch_nothing(self, tmp_path):
+        repo = "https://github.com/fake-org/fake-repo.git"
+        assert DVCInput.prefetch([], repo, str(tmp_path)) == {}
+
 
 class TestMLFlowArtifactInput:
     def test_local_path(self, run_id_local_input, tmpdir):
@@ -134,6 +205,183 @@ class TestMLFlowArtifactInput:
 
         assert original_content == downloaded_content
 
+    @pytest.mark.parametrize("cache_max_bytes", ["0", str(2**20)])
+    def test_download_compressed_artifact(
+        self, mlflow_experiment_id, tmp_path, monkeypatch, cache_max_bytes
+    ):
+        monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+        monkeypatch.setenv(ARTIFACT_CACHE_MAX_BYTES_ENV, cache_max_bytes)
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+            with ArtifactUploader(run.info.run_id, compress=True) as uploader:
+                assert uploader.upload(ARTIFACT_PATH) == ARTIFACT_NAME + ".gz"
+
+        for dest in ("first", "second"):
+            mlflow_input = MLFlowArtifactInput(
+                run.info.run_id, ARTIFACT_NAME, str(tmp_path / dest)
+            )
+            assert mlflow_input.local_path() == tmp_path / dest / ARTIFACT_NAME
+            assert (
+                mlflow_input.local_path().read_text() == Path(ARTIFACT_PATH).read_text()
+            )
+        if cache_max_bytes != "0":
+            assert mlflow_input.cache_hit
+
+    def test_input_metrics_go_through_logger(
+        self, mlflow_experiment_id, tmp_path, monkeypatch
+    ):
+        monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+        source = tmp_path / "metrics.csv"
+        source.write_text("prompt_uid,prompt_text\n1,hello\n")
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as source_run:
+            mlflow.log_artifact(str(source))
+        with (
+            mlflow.start_run(experiment_id=mlflow_experiment_id) as run,
+            BatchLogger(run.info.run_id) as logger,
+        ):
+            with patch("mlflow.log_metrics") as log_metrics:
+                mlflow_input = build_and_log_input(
+                    run_id=source_run.info.run_id,
+                    artifact_path=source.name,
+                    dest_dir=str(tmp_path / "dest"),
+                    logger=logger,
+                )
+            log_metrics.assert_not_called()
+
+        logged = mlflow.get_run(run.info.run_id).data
+        assert mlflow_input.input_metrics()
+        for name, value in mlflow_input.input_metrics().items():
+            assert logged.metrics[name] == value
+        assert logged.tags["input_type"] == mlflow_input.input_type
+
+    def test_logs_reference_without_upload(self, mlflow_experiment_id, tmp_path):
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as source_run:
+            mlflow.log_artifact(ARTIFACT_PATH)
+        source_run_id = source_run.info.run_id
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+            mlflow_input = build_and_log_input(
+                run_id=source_run_id,
+                artifact_path=ARTIFACT_NAME,
+                dest_dir=str(tmp_path),
+                log_by_reference=True,
+            )
+
+        assert f"run_id={source_run_id}" in mlflow_input.artifact.download_link
+        client = mlflow.tracking.MlflowClient()
+        assert client.list_artifacts(run.info.run_id) == []
+        logged = mlflow.get_run(run.info.run_id)
+        digest = file_sha256(ARTIFACT_PATH)
+        assert logged.data.tags["input_digest"] == digest
+        (dataset_input,) = logged.inputs.dataset_inputs
+        assert dataset_input.dataset.name == ARTIFACT_NAME
+        assert digest.startswith(dataset_input.dataset.digest)
+        source = RunArtifactDatasetSource.from_json(dataset_input.dataset.source)
+        assert source.run_id == source_run_id
+        assert source.artifact_path == ARTIFACT_NAME
+
+    def test_copies_by_default(
+        self, run_id_local_input, mlflow_experiment_id, tmp_path
+    ):
+        source_run_id, _ = run_id_local_input
+        with mlflow.start_run(experiment_id=mlflow_experiment_id, nested=True) as run:
+            mlflow_input = build_and_log_input(
+                run_id=source_run_id,
+                artifact_path=LOCAL_FILE_NAME,
+                dest_dir=str(tmp_path),
+            )
+
+        assert f"run_id={run.info.run_id}" in mlflow_input.artifact.download_link
+        client = mlflow.tracking.MlflowClient()
+        assert [a.path for a in client.list_artifacts(run.info.run_id)] == [
+            LOCAL_FILE_NAME
+        ]
+
+    def test_reference_input_artifacts_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(REFERENCE_INPUT_ARTIFACTS_ENV, "true")
+        with patch.object(MLFlowArtifactInput, "_download_artifacts"):
+            default = MLFlowArtifactInput("run", ARTIFACT_NAME, str(tmp_path))
+            assert default.log_by_reference
+            assert not MLFlowArtifactInput(
+                "run", ARTIFACT_NAME, str(tmp_path), log_by_reference=False
+            ).log_by_reference
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_cached_artifact_is_not_hashed(
+        self, mlflow_experiment_id, tmp_path, monkeypatch, compress
+    ):
+        monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+        source = tmp_path / "hashed.csv"
+        source.write_text(f"prompt_uid,prompt_text\n1,{compress}\n")
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as source_run:
+            with ArtifactUploader(source_run.info.run_id, compress=compress) as uploader:
+                uploader.upload(source)
+        # The FileCache hashes the files it stores, so the digest is known.
+        monkeypatch.setattr(
+            "modelplane.utils.digests.file_sha256",
+            lambda *args: pytest.fail("hashed"),
+        )
+        for dest in ("first", "second"):
+            with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+                build_and_log_input(
+                    run_id=source_run.info.run_id,
+                    artifact_path=source.name,
+                    dest_dir=str(tmp_path / dest),
+                    log_by_reference=True,
+                )
+            tags = mlflow.get_run(run.info.run_id).data.tags
+            artifact = mlflow.artifacts.download_artifacts(
+                run_id=source_run.info.run_id,
+                artifact_path=tags["input_artifact_path"],
+                dst_path=str(tmp_path / "check"),
+            )
+            assert tags["input_digest"] == file_sha256(artifact)
+
+    def test_reference_to_compressed_artifact(self, mlflow_experiment_id, tmp_path):
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as source_run:
+            with ArtifactUploader(source_run.info.run_id, compress=True) as uploader:
+                uploader.upload(ARTIFACT_PATH)
+        source_run_id = source_run.info.run_id
+        with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+            build_and_log_input(
+                run_id=source_run_id,
+                artifact_path=ARTIFACT_NAME,
+                dest_dir=str(tmp_path / "input"),
+                log_by_reference=True,
+            )
+
+        compressed = mlflow.artifacts.download_artifacts(
+            run_id=source_run_id,
+            artifact_path=ARTIFACT_NAME + ".gz",
+            dst_path=str(tmp_path / "check"),
+        )
+        tags = mlflow.get_run(run.info.run_id).data.tags
+        assert tags["input_artifact_path"] == ARTIFACT_NAME + ".gz"
+        assert tags["input_digest"] == file_sha256(compressed)
+
+
+class TestLocalArtifactInput:
+    def test_logs_reference_without_upload(
+        self, run_id_local_input, mlflow_experiment_id
+    ):
+        source_run_id, _ = run_id_local_input
+        with mlflow.start_run(experiment_id=mlflow_experiment_id, nested=True) as run:
+            local_input = build_and_log_input(
+                input_object=LocalArtifactInput(
+                    source_run_id, LOCAL_FILE_NAME, LOCAL_FILE_PATH
+                )
+            )
+
+        assert local_input.local_path() == Path(LOCAL_FILE_PATH)
+        assert local_input.input_run_id == run.info.run_id
+        assert local_input.artifact.name == LOCAL_FILE_NAME
+        assert f"run_id={source_run_id}" in local_input.artifact.download_link
+        client = mlflow.tracking.MlflowClient()
+        assert client.list_artifacts(run.info.run_id) == []
+        tags = mlflow.get_run(run.info.run_id).data.tags
+        assert tags["input_type"] == "artifact"
+        assert tags["input_run_id"] == source_run_id
+        assert tags["input_artifact_path"] == LOCAL_FILE_NAME
+        assert tags["input_digest"] == file_sha256(LOCAL_FILE_PATH)
+
 
 class TestBuildAndLogInput:
     def test_build_local_input(self, run_id_local_input):
@@ -161,10 +409,10 @@ class TestBuildAndLogInput:
         with pytest.raises(ValueError, match="Path must be provided"):
             build_and_log_input(dvc_repo="some-repo", dest_dir="fake_dir")
 
-    def test_build_mlf_input(self, run_id_local_input):
+    def test_build_mlf_input(self, run_id_local_input, tmp_path):
         run_id, _ = run_id_local_input
         inp = build_and_log_input(
-            run_id=run_id, artifact_path=LOCAL_FILE_NAME, dest_dir="fake_dir"
+            run_id=run_id, artifact_path=LOCAL_FILE_NAME, dest_dir=str(tmp_path)
         )
         assert isinstance(inp, MLFlowArtifactInput)
 
@@ -0,0 +1,72 @@
+import gzip
+import tempfile
+
+import mlflow
+import mlflow.artifacts
+import pytest
+
+from modelplane.mlflow.uploader import ArtifactUploader
+from modelplane.runways.utils import find_artifact
+
+
+@pytest.fixture(scope="module")
+def mlflow_experiment_id():
+    mlflow.set_tracking_uri(f"file://{tempfile.mkdtemp()}")
+    return mlflow.create_experiment(name="test-uploader")
+
+
+def _artifacts(run_id):
+    return sorted(a.path for a in mlflow.artifacts.list_artifacts(run_id=run_id))
+
+
+def test_uploads_in_background(mlflow_experiment_id, tmp_path):
+    paths = []
+    for i in range(5):
+        paths.append(tmp_path / f"out-{i}.csv")
+        paths[-1].write_text(f"a,b\n{i},{i}\n")
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        with ArtifactUploader(run.info.run_id, max_workers=2) as uploader:
+            names = [uploader.upload(path) for path in paths[:-1]]
+            names.append(uploader.upload(paths[-1], artifact_path="sub"))
+    assert names == [path.name for path in paths]
+    assert _artifacts(run.info.run_id) == [path.name for path in paths[:-1]] + ["sub"]
+
+
+def test_compress(mlflow_experiment_id, tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    path = src_dir / "annotations.csv"
+    path.write_text("a,b\n1,2\n")
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        with ArtifactUploader(run.info.run_id, compress=True) as uploader:
+            assert uploader.upload(path) == "annotations.csv.gz"
+            assert uploader.upload(path, compress=False) == "annotations.csv"
+    assert _artifacts(run.info.run_id) == ["annotations.csv", "annotations.csv.gz"]
+    # The compressed copy isn't left next to the original.
+    assert list(src_dir.iterdir()) == [path]
+    downloaded = mlflow.artifacts.download_artifacts(
+        run_id=run.info.run_id,
+        artifact_path="annotations.csv.gz",
+        dst_path=str(tmp_path / "dest"),
+    )
+    with gzip.open(downloaded, "rt") as f:
+        assert f.read() == "a,b\n1,2\n"
+
+
+def test_find_compressed_artifact(mlflow_experiment_id, tmp_path):
+    path = tmp_path / "annotations.csv"
+    path.write_text("a,b\n1,2\n")
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        with ArtifactUploader(run.info.run_id, compress=True) as uploader:
+            uploader.upload(path)
+    names = ["annotations.parquet", "prompt-responses.csv", "annotations.csv"]
+    assert find_artifact(run.info.run_id, names[:2]) == "prompt-responses.csv"
+    assert find_artifact(run.info.run_id, names[1:]) == "annotations.csv"
+
+
+def test_failed_upload_raises(mlflow_experiment_id, tmp_path):
+    with mlflow.start_run(experiment_id=mlflow_experiment_id) as run:
+        uploader = ArtifactUploader(run.info.run_id)
+        uploader.upload(tmp_path / "missing.csv")
+        with pytest.raises(Exception):
+            uploader.close()
@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelplane.utils.annotations import parse_is_safe, parse_logprobs
+
+
+def test_parse_is_safe():
+    annotations = pd.Series(
+        [
+            '{"is_safe": true, "logprobs": -0.1}',
+            '{"is_safe":false}',
+            '{"reasoning": "looks fine", "is_safe": true}',
+            '{"is_safe": false, "reasoning": "{\\"is_safe\\": true}"}',
+            "not json",
+            '{"reasoning": "no verdict"}',
+            None,
+            '{"is_safe": null}',
+            '{"reasoning": "unsure", "is_safe": "maybe"}',
+        ]
+    )
+    is_safe = parse_is_safe(annotations)
+    assert is_safe.tolist() == [
+        True, False, True, False, pd.NA, pd.NA, pd.NA, pd.NA, pd.NA
+    ]
+
+
+@pytest.mark.parametrize(
+    "annotation",
+    [
+        '{"is_safe": true, garbage',
+        '{"is_safe": true, "reasoning": "cut off',
+        '{"is_safe": true}trailing',
+        '{"is_safe": true, "is_safe": false}',
+        '{"is_safe": false, "categories": ["a", "b"], "is_safe": true}',
+        '{"is_safe": true, "is_\\u0073afe": false}',
+        '{"is_safe": true, "nested": {"is_safe": false}}',
+        '{"is_safe": false, "categories": ["S1", "S2"], "logprobs": -1.5e-3}',
+    ],
+)
+def test_parse_is_safe_matches_json_loads(annotation):
+    expected = None
+    try:
+        expected = json.loads(annotation)["is_safe"]
+    except ValueError:
+        pass
+    is_safe = parse_is_safe(pd.Series([annotation]))
+    assert is_safe.tolist() == [pd.NA if expected is None else expected]
+
+
+def test_parse_logprobs():
+    annotations = pd.Series(
+        [
+            '{"is_safe": true, "logprobs": -0.5}',
+            '{"is_safe": false}',
+            '{"is_safe": true, "logprobs": [-0.1, -0.2]}',
+            '{"is_safe": true, "logprobs": "-1.5"}',
+            "not json",
+            None,
+        ]
+    )
+    logprobs = parse_logprobs(annotations)
+    np.testing.assert_array_equal(
+        logprobs.to_numpy(), [-0.5, np.nan, np.nan, -1.5, np.nan, np.nan]
+    )
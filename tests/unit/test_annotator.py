@@ -0,0 +1,136 @@
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from modelplane.runways.annotator import (
+    _merge_annotations,
+    _missing_annotations,
+    log_safety_summary,
+)
+
+
+@pytest.fixture
+def responses_path(tmp_path):
+    path = tmp_path / "prompt-responses.csv"
+    pd.DataFrame(
+        {
+            "prompt_uid": ["1", "2", "3"],
+            "sut_uid": ["sut"] * 3,
+            "sut_response": ["a", "b", "c"],
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def previous():
+    return pd.DataFrame(
+        {
+            "prompt_uid": ["1", "1", "2", "9", "1"],
+            "sut_uid": ["sut"] * 5,
+            "annotator_uid": ["a1", "a2", "a1", "a1", "old"],
+            "annotation_json": ["{}"] * 5,
+        }
+    )
+
+
+def annotations(rows):
+    return pd.DataFrame(
+        [
+            {
+                "prompt_uid": prompt_uid,
+                "sut_uid": "sut",
+                "annotator_uid": annotator_uid,
+                "annotation_json": "{}",
+            }
+            for prompt_uid, annotator_uid in rows
+        ]
+    )
+
+
+def test_missing_annotations(tmp_path, responses_path, previous):
+    groups, kept = _missing_annotations(
+        previous, responses_path, "prompt_uid", "sut_uid", ["a1", "a2"], tmp_path
+    )
+    assert {
+        uids: pd.read_csv(path, dtype=str)["prompt_uid"].tolist()
+        for uids, path in groups.items()
+    } == {("a2",): ["2"], ("a1", "a2"): ["3"]}
+    # Annotations by other annotators are dropped; those of other responses kept.
+    assert sorted(zip(kept["prompt_uid"], kept["annotator_uid"])) == [
+        ("1", "a1"),
+        ("1", "a2"),
+        ("2", "a1"),
+        ("9", "a1"),
+    ]
+
+
+def test_missing_annotations_none_missing(tmp_path, responses_path, previous):
+    previous = pd.concat(
+        [previous, annotations([("2", "a2"), ("3", "a1"), ("3", "a2")])]
+    )
+    groups, kept = _missing_annotations(
+        previous, responses_path, "prompt_uid", "sut_uid", ["a1", "a2"], tmp_path
+    )
+    assert groups == {}
+    assert len(kept) == 7
+
+
+def test_merge_annotations(tmp_path):
+    output = tmp_path / "group-0.csv"
+    # a1 only ran alongside the ensemble.
+    annotations([("2", "a1"), ("2", "ensemble")]).to_csv(output, index=False)
+    kept = annotations([("1", "a1"), ("1", "ensemble")])[
+        ["annotator_uid", "prompt_uid", "sut_uid", "annotation_json"]
+    ]
+    dest = tmp_path / "annotations.csv"
+
+    assert _merge_annotations({("ensemble",): output}, kept, dest) == 1
+
+    merged = pd.read_csv(dest, dtype=str)
+    assert list(merged.columns) == [
+        "prompt_uid",
+        "sut_uid",
+        "annotator_uid",
+        "annotation_json",
+    ]
+    assert list(zip(merged["prompt_uid"], merged["annotator_uid"])) == [
+        ("2", "ensemble"),
+        ("1", "a1"),
+        ("1", "ensemble"),
+    ]
+
+
+def test_merge_annotations_only_kept(tmp_path):
+    dest = tmp_path / "annotations.csv"
+    assert _merge_annotations({}, annotations([("1", "a1")]), dest) == 0
+    assert pd.read_csv(dest, dtype=str)["prompt_uid"].tolist() == ["1"]
+
+
+def test_log_safety_summary_uploads_histograms(tmp_path):
+    path = tmp_path / "annotations.csv"
+    pd.DataFrame(
+        {
+            "prompt_uid": ["1", "2", "3"],
+            "prompt_text": ["p"] * 3,
+            "sut_uid": ["sut"] * 3,
+            "sut_response": ["r"] * 3,
+            "annotator_uid": ["a1"] * 3,
+            "annotation_json": [
+                '{"is_safe": true, "logprobs": -0.1}',
+                '{"is_safe": false, "logprobs": -2.0}',
+                '{"is_safe": true, "logprobs": -0.5}',
+            ],
+        }
+    ).to_csv(path, index=False)
+    logger = MagicMock()
+    uploader = MagicMock()
+    with patch("mlflow.log_artifact") as log_artifact:
+        log_safety_summary(["a1"], str(path), str(tmp_path), logger, uploader)
+
+    log_artifact.assert_not_called()
+    uploader.upload.assert_called_once_with(
+        str(tmp_path / "a1_logprobs_hist.png"), compress=False
+    )
+    logger.log_metrics.assert_any_call({"a1_total_safe": 2, "a1_total_count": 3})
@@ -0,0 +1,134 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from modelplane.mlflow.batchlogger import (
+    MAX_ENTITIES_PER_BATCH,
+    MAX_PARAMS_PER_BATCH,
+    ROUND_TRIPS_SAVED_METRIC,
+    BatchLogger,
+)
+
+
+@pytest.fixture
+def client():
+    return MagicMock()
+
+
+def sent(client, kind):
+    return [
+        entity
+        for call in client.log_batch.call_args_list
+        for entity in call.kwargs[kind]
+    ]
+
+
+def test_buffers_until_close(client):
+    with BatchLogger("run", client=client) as logger:
+        logger.log_metric("a", 1)
+        logger.log_metrics({"b": 2, "c": 3.5})
+        logger.log_params({"num_workers": 4})
+        logger.set_tag("sut_id", "demo")
+        client.log_batch.assert_not_called()
+
+    client.log_batch.assert_called_once()
+    assert {m.key: m.value for m in sent(client, "metrics")} == {
+        "a": 1.0,
+        "b": 2.0,
+        "c": 3.5,
+    }
+    assert [(p.key, p.value) for p in sent(client, "params")] == [("num_workers", "4")]
+    assert [(t.key, t.value) for t in sent(client, "tags")] == [("sut_id", "demo")]
+    # 4 logging calls went out as a single request.
+    client.log_metric.assert_called_once_with("run", ROUND_TRIPS_SAVED_METRIC, 3)
+
+
+def wait_for_batches(client, count):
+    deadline = time.monotonic() + 5
+    while client.log_batch.call_count < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return client.log_batch.call_count
+
+
+def test_flushes_at_batch_size(client):
+    logger = BatchLogger("run", max_batch_size=3, client=client)
+    logger.log_metrics({"a": 1, "b": 2})
+    time.sleep(0.05)
+    client.log_batch.assert_not_called()
+    logger.log_metric("c", 3)
+    assert wait_for_batches(client, 1) == 1
+    logger.close()
+
+
+def test_flushes_after_interval(client):
+    logger = BatchLogger("run", flush_interval=0.05, client=client)
+    logger.log_metric("a", 1)
+    assert wait_for_batches(client, 1) == 1
+    logger.close()
+
+
+def test_logging_does_not_wait_on_send(client):
+    release = threading.Event()
+    client.log_batch.side_effect = lambda *args, **kwargs: release.wait(5)
+    logger = BatchLogger("run", max_batch_size=1, client=client)
+    logger.log_metric("a", 1)
+    wait_for_batches(client, 1)
+
+    # The first batch is still being sent.
+    start = time.monotonic()
+    for i in range(100):
+        logger.log_metric("b", i, step=i)
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    logger.close()
+    assert len(sent(client, "metrics")) == 101
+
+
+def test_failed_send_is_kept(client):
+    client.log_batch.side_effect = [RuntimeError("tracking server down"), None]
+    logger = BatchLogger("run", client=client)
+    logger.log_metric("a", 1)
+    logger.log_param("num_workers", 4)
+    with pytest.raises(RuntimeError):
+        logger.flush()
+    logger.log_param("num_workers", 8)
+    logger.close()
+
+    assert client.log_batch.call_count == 2
+    retried = client.log_batch.call_args.kwargs
+    assert [m.key for m in retried["metrics"]] == ["a"]
+    assert [(p.key, p.value) for p in retried["params"]] == [("num_workers", "8")]
+
+
+def test_failed_close_keeps_the_run_exception(client, capsys):
+    client.log_batch.side_effect = RuntimeError("tracking server down")
+    with pytest.raises(ValueError, match="run failed"):
+        with BatchLogger("run", client=client) as logger:
+            logger.log_metric("a", 1)
+            raise ValueError("run failed")
+    assert "tracking server down" in capsys.readouterr().out
+
+
+def test_failed_close_raises(client):
+    client.log_batch.side_effect = RuntimeError("tracking server down")
+    with pytest.raises(RuntimeError):
+        with BatchLogger("run", client=client) as logger:
+            logger.log_metric("a", 1)
+
+
+def test_splits_batches_at_api_limits(client):
+    logger = BatchLogger("run", max_batch_size=10**6, client=client)
+    logger.log_params({f"p{i}": i for i in range(MAX_PARAMS_PER_BATCH + 1)})
+    logger.log_metrics({f"m{i}": i for i in range(MAX_ENTITIES_PER_BATCH)})
+    logger.flush()
+
+    for call in client.log_batch.call_args_list:
+        assert len(call.kwargs["params"]) <= MAX_PARAMS_PER_BATCH
+        total = sum(len(call.kwargs[kind]) for kind in ("metrics", "params", "tags"))
+        assert total <= MAX_ENTITIES_PER_BATCH
+    assert len(sent(client, "params")) == MAX_PARAMS_PER_BATCH + 1
+    assert len(sent(client, "metrics")) == MAX_ENTITIES_PER_BATCH
+    assert logger.round_trips_saved == 0
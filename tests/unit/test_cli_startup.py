@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import time
+
+# Wall-clock budget for a cold `modelplane --help`. Override on slow machines.
+STARTUP_BUDGET_SECONDS = float(os.getenv("MODELPLANE_STARTUP_BUDGET_SECONDS", "3.0"))
+
+# Modules that must only be imported once a subcommand needs them.
+LAZY_MODULES = [
+    "matplotlib",
+    "mlflow",
+    "modelgauge.annotators.cheval.registration",
+    "modelgauge.load_namespaces",
+    "pandas",
+    "sklearn",
+]
+
+
+def _run_help() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "modelplane.cli", "--help"],
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def test_cli_import_is_lazy():
+    code = (
+        "import sys\n"
+        "import modelplane.cli\n"
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == "", "Eagerly imported: " + result.stdout.strip()
+
+
+def test_help_startup_budget():
+    # First run warms the bytecode cache.
+    _run_help()
+    elapsed = min(_run_help() for _ in range(3))
+    assert (
+        elapsed < STARTUP_BUDGET_SECONDS
+    ), f"`modelplane --help` took {elapsed:.2f}s, budget is {STARTUP_BUDGET_SECONDS:.2f}s."
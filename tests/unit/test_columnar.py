@@ -0,0 +1,63 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from modelplane.utils.columnar import csv_to_parquet, parquet_to_csv
+
+ANNOTATIONS = (
+    "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+    '001,s1,a1,"{""is_safe"": true, ""logprobs"": -0.5}"\n'
+    '002,s1,a1,"{""is_safe"": false}"\n'
+    "003,s1,a1,not json\n"
+    '004,s1,a1,"{""is_safe"": null}"\n'
+)
+
+
+def test_csv_to_parquet_keeps_strings(tmp_path):
+    csv_path = tmp_path / "prompt-responses.csv"
+    csv_path.write_text(
+        'prompt_uid,sut_uid,sut_response\n001,s1,"multi\nline"\n002,s1,1.0\n'
+    )
+    parquet_path = tmp_path / "prompt-responses.parquet"
+    csv_to_parquet(csv_path, parquet_path)
+    df = pd.read_parquet(parquet_path)
+    assert df.to_dict("records") == [
+        {"prompt_uid": "001", "sut_uid": "s1", "sut_response": "multi\nline"},
+        {"prompt_uid": "002", "sut_uid": "s1", "sut_response": "1.0"},
+    ]
+
+
+def test_csv_to_parquet_annotation_fields(tmp_path):
+    csv_path = tmp_path / "annotations.csv"
+    csv_path.write_text(ANNOTATIONS)
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(csv_path, parquet_path, annotation_col="annotation_json")
+    table = pq.read_table(parquet_path)
+    assert str(table.schema.field("is_safe").type) == "bool"
+    assert str(table.schema.field("logprobs").type) == "double"
+    assert table.column("is_safe").to_pylist() == [True, False, None, None]
+    assert table.column("logprobs").to_pylist() == [-0.5, None, None, None]
+
+
+def test_csv_to_parquet_no_rows(tmp_path):
+    csv_path = tmp_path / "annotations.csv"
+    csv_path.write_text(ANNOTATIONS.splitlines(keepends=True)[0])
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(csv_path, parquet_path, annotation_col="annotation_json")
+    assert pq.read_schema(parquet_path).names == [
+        "prompt_uid",
+        "sut_uid",
+        "annotator_uid",
+        "annotation_json",
+        "is_safe",
+        "logprobs",
+    ]
+
+
+def test_parquet_to_csv_round_trip(tmp_path):
+    csv_path = tmp_path / "annotations.csv"
+    csv_path.write_text(ANNOTATIONS)
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(csv_path, parquet_path, annotation_col="annotation_json")
+    round_trip = tmp_path / "round-trip.csv"
+    parquet_to_csv(parquet_path, round_trip)
+    assert round_trip.read_text() == ANNOTATIONS
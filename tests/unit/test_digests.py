@@ -0,0 +1,90 @@
+import hashlib
+import os
+
+import pytest
+
+from modelplane.mlflow.datasets import DIGEST_MODE_CONTENT, LocalDatasetSource
+from modelplane.utils import digests
+from modelplane.utils.digests import DigestIndex, content_digest
+from modelplane.utils.filecache import CACHE_ROOT_ENV
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "prompts.csv"
+    path.write_bytes(b"prompt_uid,prompt_text\n" * 1000)
+    return path
+
+
+@pytest.fixture
+def index(tmp_path):
+    return DigestIndex(tmp_path / "digests.sqlite")
+
+
+def test_content_digest(data_file):
+    expected = hashlib.sha256(data_file.read_bytes()).hexdigest()
+    assert content_digest(data_file) == expected
+
+
+def test_content_digest_empty_file(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(b"")
+    assert content_digest(path) == hashlib.sha256().hexdigest()
+
+
+def test_index_skips_unchanged_files(data_file, index, monkeypatch):
+    digest = content_digest(data_file, index=index)
+    monkeypatch.setattr(digests, "file_sha256", lambda *args: pytest.fail("rehashed"))
+    assert content_digest(data_file, index=index) == digest
+
+
+def test_index_rehashes_changed_files(data_file, index):
+    content_digest(data_file, index=index)
+    data_file.write_bytes(b"changed")
+    assert content_digest(data_file, index=index) == (
+        hashlib.sha256(b"changed").hexdigest()
+    )
+    # Touching the file only costs a rehash; the digest stays the same.
+    stat = data_file.stat()
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert content_digest(data_file, index=index) == (
+        hashlib.sha256(b"changed").hexdigest()
+    )
+
+
+def test_index_drops_missing_files(data_file, index, tmp_path):
+    gone = tmp_path / "gone.csv"
+    gone.write_bytes(b"temporary")
+    content_digest(gone, index=index)
+    gone_stat = gone.stat()
+    gone.unlink()
+    content_digest(data_file, index=index)
+    assert index.get(gone.resolve(), gone_stat) is None
+    assert index.get(data_file.resolve(), data_file.stat()) is not None
+
+
+def test_local_dataset_source_known_digest(data_file, monkeypatch):
+    monkeypatch.setattr(digests, "file_sha256", lambda *args: pytest.fail("hashed"))
+    source = LocalDatasetSource(
+        str(data_file), digest_mode=DIGEST_MODE_CONTENT, content_digest="abc"
+    )
+    assert source.to_dict()["content_digest"] == "abc"
+    assert LocalDatasetSource.from_dict(source.to_dict()).content_digest() == "abc"
+
+
+def test_local_dataset_source_content_digest(data_file, tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+    copy = tmp_path / "copy.csv"
+    copy.write_bytes(data_file.read_bytes())
+    source = LocalDatasetSource(str(data_file), digest_mode=DIGEST_MODE_CONTENT)
+    copy_source = LocalDatasetSource(str(copy), digest_mode=DIGEST_MODE_CONTENT)
+    assert source.to_dict()["content_digest"] == copy_source.to_dict()["content_digest"]
+    assert LocalDatasetSource.from_dict(source.to_dict()).digest_mode == (
+        DIGEST_MODE_CONTENT
+    )
+    assert "timestamp" in LocalDatasetSource(str(data_file)).to_dict()
+
+
+def test_local_dataset_source_unknown_digest_mode(data_file):
+    with pytest.raises(ValueError, match="Unknown digest mode"):
+        LocalDatasetSource(str(data_file), digest_mode="size")
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from modelplane.utils.filecache import FileCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileCache(tmp_path / "cache", max_bytes=100)
+
+
+def make_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return path
+
+
+def test_miss_then_hit(cache, tmp_path):
+    assert cache.get("run/a.csv") is None
+    cache.put("run/a.csv", make_file(tmp_path, "a.csv", b"abc"))
+
+    cached = cache.get("run/a.csv")
+    assert cached is not None
+    assert cached.read_bytes() == b"abc"
+
+
+def test_expected_size_mismatch_is_a_miss(cache, tmp_path):
+    cache.put("run/a.csv", make_file(tmp_path, "a.csv", b"abc"))
+    assert cache.get("run/a.csv", expected_size=4) is None
+    # The stale entry is dropped.
+    assert cache.get("run/a.csv") is None
+
+
+def test_truncated_file_is_a_miss(cache, tmp_path):
+    cached = cache.put("run/a.csv", make_file(tmp_path, "a.csv", b"abc"))
+    os.chmod(cached, 0o644)
+    with open(cached, "r+b") as f:
+        f.truncate(1)
+    assert cache.get("run/a.csv") is None
+
+
+def test_same_content_is_stored_once(cache, tmp_path):
+    first = cache.put("run1/a.csv", make_file(tmp_path, "a.csv", b"abc"))
+    second = cache.put("run2/a.csv", make_file(tmp_path, "b.csv", b"abc"))
+    assert first == second
+
+
+def test_evicts_least_recently_used(cache, tmp_path):
+    cache.put("old", make_file(tmp_path, "old", b"o" * 40))
+    cache.put("used", make_file(tmp_path, "used", b"u" * 40))
+    assert cache.get("old") is not None
+    assert cache.get("used") is not None
+
+    cache.put("new", make_file(tmp_path, "new", b"n" * 40))
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+
+
+def test_leaves_callers_file_alone(cache, tmp_path):
+    path = make_file(tmp_path, "a.csv", b"abc")
+    mode = path.stat().st_mode
+    cached = cache.put("run/a.csv", path)
+    assert path.stat().st_mode == mode
+    assert not os.path.samefile(path, cached)
+
+
+def test_get_keeps_mtime(cache, tmp_path):
+    cached = cache.put("run/a.csv", make_file(tmp_path, "a.csv", b"abc"))
+    os.utime(cached, ns=(0, 0))
+    assert cache.get("run/a.csv").stat().st_mtime_ns == 0
@@ -0,0 +1,269 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from modelplane.runways import utils as runway_utils
+from modelplane.runways.utils import RATE_LIMITS_PATH_ENV
+from modelplane.utils.filecache import CACHE_ROOT_ENV
+from modelplane.utils.limits import (
+    AdaptiveConcurrencyLimiter,
+    FileTokenBucket,
+    RateLimiter,
+    concurrency_limit_method,
+    is_overload_error,
+    rate_limit_method,
+)
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(max_per_second=50)
+    start = time.monotonic()
+    waits = [limiter.acquire() for _ in range(6)]
+    elapsed = time.monotonic() - start
+    assert waits[0] == 0
+    # 5 intervals of 20ms after the first call.
+    assert elapsed >= 0.1 - 0.005
+
+
+def test_rate_limiter_is_shared_across_threads():
+    limiter = RateLimiter(max_per_second=100)
+    calls = []
+
+    def worker():
+        for _ in range(5):
+            limiter.acquire()
+            calls.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    calls.sort()
+    assert calls[-1] - calls[0] >= 19 * 0.01 - 0.005
+
+
+def test_rate_limit_method():
+    class Client:
+        def evaluate(self, request):
+            return request * 2
+
+    client = Client()
+    limiter = RateLimiter(max_per_second=1000)
+    rate_limit_method(client, "evaluate", limiter)
+    assert client.evaluate(21) == 42
+    assert client.evaluate.__name__ == "evaluate"
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+def ok():
+    return "ok"
+
+
+def test_adaptive_limiter_slow_start_then_additive():
+    changes = []
+    limiter = AdaptiveConcurrencyLimiter(
+        max_limit=6, latency_tolerance=1e9, on_change=lambda *c: changes.append(c)
+    )
+    for _ in range(1 + 2 + 4):
+        limiter.call(ok)
+    # 1 -> 2 -> 4 -> 6 (capped)
+    assert [limit for limit, _ in changes] == [2, 4, 6]
+    assert [step for _, step in changes] == [1, 2, 3]
+    assert limiter.limit == 6
+
+
+def test_adaptive_limiter_backs_off_on_overload():
+    limiter = AdaptiveConcurrencyLimiter(
+        max_limit=32, initial_limit=8, latency_tolerance=1e9
+    )
+
+    def throttled():
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        limiter.call(throttled)
+    assert limiter.limit == 4
+    # Out of slow start, the limit grows by one per healthy window.
+    for _ in range(4):
+        limiter.call(ok)
+    assert limiter.limit == 5
+
+
+def test_adaptive_limiter_halves_once_per_window():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=32, initial_limit=8)
+    generation = limiter._generation
+    limiter._in_flight = 2
+    limiter._release(generation, overloaded=True)
+    # The second call was started at the old limit, so it doesn't count.
+    limiter._release(generation, overloaded=True)
+    assert limiter.limit == 4
+
+
+def test_adaptive_limiter_holds_on_slow_calls():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=32, initial_limit=2)
+    generation = limiter._generation
+    for latency in (0.01, 1.0):
+        limiter._in_flight += 1
+        limiter._release(generation, latency=latency)
+    assert limiter.limit == 2
+
+
+def test_adaptive_limiter_holds_on_other_errors():
+    limiter = AdaptiveConcurrencyLimiter(
+        max_limit=32, initial_limit=2, latency_tolerance=1e9
+    )
+
+    def invalid():
+        raise ValueError()
+
+    limiter.call(ok)
+    with pytest.raises(ValueError):
+        limiter.call(invalid)
+    limiter.call(ok)
+    # Two successes make a window, but it had a failure.
+    assert limiter.limit == 2
+    # Growth resumes with the next window, out of slow start.
+    limiter.call(ok)
+    limiter.call(ok)
+    assert limiter.limit == 3
+
+
+def test_adaptive_limiter_caps_concurrency():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=2, initial_limit=2)
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    threads = [threading.Thread(target=limiter.call, args=(work,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 2
+
+
+def test_concurrency_limit_method():
+    class Annotator:
+        def annotate(self, request):
+            return request + 1
+
+    annotator = Annotator()
+    limiter = AdaptiveConcurrencyLimiter(max_limit=4)
+    concurrency_limit_method(annotator, "annotate", limiter)
+    assert annotator.annotate(1) == 2
+    assert limiter._in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "error,expected",
+    [
+        (RateLimitError(), True),
+        (TimeoutError(), True),
+        (HTTPError(429), True),
+        (HTTPError(500), True),
+        (HTTPError(503), True),
+        (HTTPError(400), False),
+        (ValueError(), False),
+    ],
+)
+def test_is_overload_error(error, expected):
+    assert is_overload_error(error) == expected
+
+
+def test_file_token_bucket_allows_burst_then_throttles(tmp_path):
+    bucket = FileTokenBucket(tmp_path / "bucket.json", rate=20, burst=3)
+    waits = [bucket.acquire() for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] > 0
+    assert bucket.total_wait == pytest.approx(sum(waits))
+
+
+def _take_tokens(path, count):
+    bucket = FileTokenBucket(path, rate=50, burst=1)
+    for _ in range(count):
+        bucket.acquire()
+
+
+def test_file_token_bucket_is_shared_across_processes(tmp_path):
+    path = tmp_path / "bucket.json"
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_take_tokens, args=(path, 5)) for _ in range(2)]
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    # 10 tokens at 50/s with a burst of 1 take at least 9 intervals of 20ms,
+    # which separate buckets per process would not.
+    assert time.monotonic() - start >= 0.18
+
+
+def test_shared_rate_limit(tmp_path, monkeypatch):
+    config = tmp_path / "rate_limits.toml"
+    config.write_text(
+        "[openai]\n"
+        'uids = ["gpt-*"]\n'
+        "requests_per_second = 10\n"
+        "burst = 2\n"
+        'secret = "openai.api_key"\n'
+        "[other]\n"
+        'uids = ["*"]\n'
+        "requests_per_second = 1\n"
+    )
+    monkeypatch.setenv(RATE_LIMITS_PATH_ENV, str(config))
+    monkeypatch.setenv(CACHE_ROOT_ENV, str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        runway_utils,
+        "safe_load_secrets_from_config",
+        lambda: {"openai": {"api_key": "sk-secret"}},
+    )
+
+    class Client:
+        def evaluate(self, request):
+            return request
+
+    clients = {"gpt-4o": Client(), "llama": Client()}
+    limiters = runway_utils.shared_rate_limit(clients, "evaluate")
+
+    assert limiters["gpt-4o"].rate == 10
+    assert limiters["gpt-4o"].burst == 2
+    assert limiters["gpt-4o"].path.name.startswith("openai-")
+    assert "sk-secret" not in str(limiters["gpt-4o"].path)
+    assert limiters["llama"].rate == 1
+    assert limiters["llama"].path.name == "other.json"
+    assert clients["gpt-4o"].evaluate(1) == 1
+    assert limiters["gpt-4o"].path.exists()
+
+
+def test_shared_rate_limit_without_config(tmp_path, monkeypatch):
+    monkeypatch.setenv(RATE_LIMITS_PATH_ENV, str(tmp_path / "missing.toml"))
+    assert runway_utils.shared_rate_limit({"sut": object()}, "evaluate") == {}
+
+
+def test_shared_rate_limit_invalid_config(tmp_path, monkeypatch):
+    config = tmp_path / "rate_limits.toml"
+    config.write_text('[openai]\nuids = ["*"]\n')
+    monkeypatch.setenv(RATE_LIMITS_PATH_ENV, str(config))
+    with pytest.raises(ValueError, match="requests_per_second"):
+        runway_utils.shared_rate_limit({"sut": object()}, "evaluate")
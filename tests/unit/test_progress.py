@@ -0,0 +1,44 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+from modelplane.mlflow.progress import ProgressSink
+
+
+def test_callback_does_not_wait_on_logger():
+    logger = MagicMock()
+    release = threading.Event()
+    logger.flush.side_effect = lambda: release.wait(5)
+
+    sink = ProgressSink(logger, max_per_second=100)
+    start = time.monotonic()
+    for i in range(1000):
+        sink({"completed": i})
+    assert time.monotonic() - start < 1.0
+
+    release.set()
+    sink.close()
+
+
+def test_coalesces_and_sends_latest_on_close():
+    logger = MagicMock()
+    with ProgressSink(logger, max_per_second=0.001) as sink:
+        for i in range(100):
+            sink({"completed": i, "total": 100})
+
+    # At most one send while running (then throttled), and the final one on close.
+    assert logger.log_metrics.call_count <= 2
+    assert logger.log_metrics.call_args.args[0] == {"completed": 99, "total": 100}
+
+
+def test_failed_send_is_retried_on_close():
+    logger = MagicMock()
+    logger.flush.side_effect = [RuntimeError("tracking server down"), None]
+    sink = ProgressSink(logger, max_per_second=1000)
+    sink({"completed": 1})
+    while logger.flush.call_count == 0:
+        time.sleep(0.01)
+    sink.close()
+
+    assert logger.log_metrics.call_args.args[0] == {"completed": 1}
+    assert logger.flush.call_count == 2
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import tarfile
+import time
+from contextlib import closing
+
+import pytest
+
+from modelplane.utils.responsecache import (
+    DEFAULT_RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DIR_ENV,
+    ResponseCache,
+    response_cache_dir,
+)
+
+
+def make_cache_file(path, entries, age_seconds=0):
+    """A cache file like modelgauge's: a key/value table of responses."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute('CREATE TABLE "v1" (key TEXT PRIMARY KEY, value BLOB)')
+        conn.executemany(
+            'INSERT INTO "v1" VALUES (?, ?)',
+            [(str(i), b"x" * 1000) for i in range(entries)],
+        )
+        conn.commit()
+    written = time.time() - age_seconds
+    os.utime(path, (written, written))
+    return path
+
+
+def journal_mode(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_response_cache_dir(monkeypatch):
+    monkeypatch.delenv(RESPONSE_CACHE_DIR_ENV, raising=False)
+    assert str(response_cache_dir()) == DEFAULT_RESPONSE_CACHE_DIR
+    monkeypatch.setenv(RESPONSE_CACHE_DIR_ENV, "/shared/cache")
+    assert str(response_cache_dir()) == "/shared/cache"
+    assert str(response_cache_dir("/mine")) == "/mine"
+
+
+def test_prepare_enables_wal(tmp_path):
+    path = make_cache_file(tmp_path / "cache" / "demo_yes_no.sqlite", 1)
+    assert journal_mode(path) == "delete"
+
+    ResponseCache(tmp_path / "cache").prepare()
+
+    assert journal_mode(path) == "wal"
+
+
+def test_prepare_creates_dir(tmp_path):
+    ResponseCache(tmp_path / "cache").prepare()
+    assert (tmp_path / "cache").is_dir()
+
+
+def test_stats(tmp_path):
+    make_cache_file(tmp_path / "a.sqlite", 3)
+    make_cache_file(tmp_path / "sub" / "b.sqlite", 5)
+    stats = ResponseCache(tmp_path).stats()
+    assert [(s.path.name, s.entries) for s in stats] == [
+        ("a.sqlite", 3),
+        ("b.sqlite", 5),
+    ]
+    assert all(s.size_bytes > 0 for s in stats)
+
+
+def test_stats_missing_dir(tmp_path):
+    assert ResponseCache(tmp_path / "missing").stats() == []
+
+
+def test_prune_by_age(tmp_path):
+    old = make_cache_file(tmp_path / "old.sqlite", 1, age_seconds=3600)
+    new = make_cache_file(tmp_path / "new.sqlite", 1)
+    (tmp_path / "old.sqlite-wal").write_bytes(b"")
+    os.utime(tmp_path / "old.sqlite-wal", (old.stat().st_mtime,) * 2)
+
+    removed = ResponseCache(tmp_path).prune(max_age_seconds=60)
+
+    assert [s.path for s in removed] == [old]
+    assert not old.exists()
+    assert not (tmp_path / "old.sqlite-wal").exists()
+    assert new.exists()
+
+
+@pytest.mark.parametrize("keep", [0, 1, 2])
+def test_prune_by_size(tmp_path, keep):
+    paths = [
+        make_cache_file(tmp_path / f"{i}.sqlite", 10, age_seconds=100 - i)
+        for i in range(3)
+    ]
+    cache = ResponseCache(tmp_path)
+    sizes = [s.size_bytes for s in cache.stats()]
+
+    removed = cache.prune(max_bytes=sum(sizes[3 - keep :]))
+
+    # The least recently written files go first.
+    assert [s.path for s in removed] == paths[: 3 - keep]
+    assert [p.exists() for p in paths] == [False] * (3 - keep) + [True] * keep
+
+
+def entries(path):
+    with closing(sqlite3.connect(path)) as conn:
+        return dict(conn.execute('SELECT key, value FROM "v1"').fetchall())
+
+
+def test_export_import(tmp_path):
+    source = ResponseCache(tmp_path / "source")
+    make_cache_file(source.root / "demo_yes_no.sqlite", 3)
+    make_cache_file(source.root / "annotators" / "llama_guard_cache.sqlite", 2)
+    make_cache_file(source.root / "other.sqlite", 1)
+    bundle = tmp_path / "bundle.tar.gz"
+
+    exported = source.export(bundle, ["demo_*", "llama_guard"])
+
+    assert [path.name for path in exported] == [
+        "llama_guard_cache.sqlite",
+        "demo_yes_no.sqlite",
+    ]
+    dest = ResponseCache(tmp_path / "dest")
+    imported = dest.import_bundle(bundle)
+    assert sorted(path.relative_to(dest.root).as_posix() for path in imported) == [
+        "annotators/llama_guard_cache.sqlite",
+        "demo_yes_no.sqlite",
+    ]
+    assert len(entries(dest.root / "demo_yes_no.sqlite")) == 3
+    assert len(entries(dest.root / "annotators" / "llama_guard_cache.sqlite")) == 2
+    assert not (dest.root / "other.sqlite").exists()
+
+
+def test_import_keeps_existing_entries(tmp_path):
+    source = ResponseCache(tmp_path / "source")
+    make_cache_file(source.root / "demo_yes_no.sqlite", 3)
+    bundle = tmp_path / "bundle.tar.gz"
+    source.export(bundle)
+
+    dest = ResponseCache(tmp_path / "dest")
+    existing = make_cache_file(dest.root / "demo_yes_no.sqlite", 0)
+    with closing(sqlite3.connect(existing)) as conn:
+        conn.executemany(
+            'INSERT INTO "v1" VALUES (?, ?)', [("0", b"mine"), ("new", b"mine")]
+        )
+        conn.commit()
+
+    dest.import_bundle(bundle)
+
+    merged = entries(existing)
+    assert sorted(merged) == ["0", "1", "2", "new"]
+    assert merged["0"] == b"mine"
+
+
+def test_import_skips_unsafe_paths(tmp_path):
+    bundle = tmp_path / "bundle.tar.gz"
+    evil = make_cache_file(tmp_path / "evil.sqlite", 1)
+    with tarfile.open(bundle, "w:gz") as tar:
+        tar.add(evil, arcname="../evil.sqlite")
+        tar.add(evil, arcname="notes.txt")
+
+    assert ResponseCache(tmp_path / "dest").import_bundle(bundle) == []
+    assert list((tmp_path / "dest").iterdir()) == []
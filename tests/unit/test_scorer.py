@@ -1,6 +1,12 @@
+import pandas as pd
 import pytest
 
-from modelplane.runways.scorer import AnnotationData, score_annotator
+from modelplane.runways.scorer import (
+    AnnotationData,
+    score_annotator,
+    score_annotators,
+)
+from modelplane.utils.columnar import csv_to_parquet
 
 @pytest.fixture
 def annotations_csv(tmp_path):
@@ -127,3 +133,327 @@ def test_score_annotator_no_overlap(tmp_path):
     # Test that score_annotator raises assertion error when no overlapping samples
     with pytest.raises(AssertionError):
         score_annotator("a1", annotation_data, ground_truth_data)
+
+
+def test_annotation_data_skips_invalid_json(tmp_path, capsys):
+    file_path = tmp_path / "annotations.csv"
+    content = (
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "p1,s1,a1,{\"is_safe\": true}\n"
+        "p1,s2,a1,oops\n"
+        "p1,s1,a2,{\"is_safe\": false}\n"
+    )
+    file_path.write_text(content)
+    data = AnnotationData(file_path, is_json_annotation=True)
+    assert data.df["sample_uid"].tolist() == ["p1_s1", "p1_s1"]
+    assert data.df["is_unsafe"].tolist() == [False, True]
+    assert data.invalid_rows.tolist() == [1]
+    assert "Skipping 1 rows" in capsys.readouterr().out
+
+
+def test_score_annotators_matches_score_annotator(annotation_data, ground_truth_data):
+    scores = score_annotators(annotation_data, ground_truth_data)
+    assert list(scores) == ["a1", "a2"]
+    for annotator, score in scores.items():
+        expected = score_annotator(annotator, annotation_data, ground_truth_data)
+        assert score == pytest.approx(expected, nan_ok=True)
+
+
+def test_score_annotators_no_overlap(tmp_path, ground_truth_data):
+    annotations_path = tmp_path / "other_annotations.csv"
+    annotations_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "p1,s1,a1,{\"is_safe\": true}\n"
+        "p5,s5,a2,{\"is_safe\": true}\n"
+    )
+    annotation_data = AnnotationData(annotations_path, is_json_annotation=True)
+    with pytest.raises(AssertionError, match="No sample overlap found between a2"):
+        score_annotators(annotation_data, ground_truth_data)
+
+
+def test_score_annotators_duplicate_samples(tmp_path, ground_truth_data):
+    annotations_path = tmp_path / "duplicate_annotations.csv"
+    annotations_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "p1,s1,a1,{\"is_safe\": true}\n"
+        "p1,s1,a1,{\"is_safe\": false}\n"
+    )
+    annotation_data = AnnotationData(annotations_path, is_json_annotation=True)
+    with pytest.raises(AssertionError, match="sample UID for annotator a1 is not unique"):
+        score_annotators(annotation_data, ground_truth_data)
+
+
+def test_ground_truth_data_from_parquet(tmp_path):
+    file_path = tmp_path / "groundtruth.parquet"
+    pd.DataFrame(
+        {"prompt_uid": ["p1", "p1"], "sut_uid": ["s1", "s2"], "is_safe": ["safe", "unsafe"]}
+    ).to_parquet(file_path)
+    data = AnnotationData(file_path, is_json_annotation=False, annotator_uid_col=None, annotation_col="is_safe")
+    assert data.df["sample_uid"].tolist() == ["p1_s1", "p1_s2"]
+    assert data.df["is_unsafe"].tolist() == [False, True]
+
+
+def test_annotation_data_from_typed_parquet(tmp_path, annotations_csv):
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(annotations_csv, parquet_path, annotation_col="annotation_json")
+    data = AnnotationData(parquet_path, is_json_annotation=True)
+    assert data.df["sample_uid"].tolist() == ["p1_s1", "p1_s2", "p1_s1", "p1_s2"]
+    assert data.df["is_unsafe"].tolist() == [False, False, False, True]
+
+
+def test_annotation_data_from_typed_parquet_skips_invalid(tmp_path):
+    annotations_path = tmp_path / "annotations.csv"
+    annotations_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "p1,s1,a1,{\"is_safe\": true}\n"
+        "p1,s2,a1,oops\n"
+    )
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(annotations_path, parquet_path, annotation_col="annotation_json")
+    data = AnnotationData(parquet_path, is_json_annotation=True)
+    assert data.df["sample_uid"].tolist() == ["p1_s1"]
+    assert data.invalid_rows.tolist() == [1]
+
+
+@pytest.fixture
+def wide_annotations_csv(tmp_path):
+    file_path = tmp_path / "annotations.csv"
+    content = (
+        "prompt_uid,prompt_text,sut_uid,sut_response,annotator_uid,annotation_json\n"
+        "p1,hi,s1,hello,a1,{\"is_safe\": true}\n"
+        "p1,hi,s2,yo,a1,oops\n"
+        "p1,hi,s1,hello,a2,{\"is_safe\": true}\n"
+        "p1,hi,s2,yo,a2,{\"is_safe\": false}\n"
+        "p2,bye,s1,ciao,a3,{\"is_safe\": false}\n"
+    )
+    file_path.write_text(content)
+    return file_path
+
+
+def test_annotation_data_is_compact(wide_annotations_csv):
+    data = AnnotationData(wide_annotations_csv, is_json_annotation=True)
+    assert list(data.df.columns) == ["sample_uid", "annotator_uid", "is_unsafe"]
+    assert isinstance(data.df["sample_uid"].dtype, pd.CategoricalDtype)
+    assert data.df["sample_uid"].cat.categories.tolist() == ["p1_s1", "p1_s2", "p2_s1"]
+    assert isinstance(data.df["annotator_uid"].dtype, pd.CategoricalDtype)
+    assert data.df["is_unsafe"].dtype == bool
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_annotation_data_chunked(wide_annotations_csv, file_format, capsys):
+    path = wide_annotations_csv
+    if file_format == "parquet":
+        path = wide_annotations_csv.with_suffix(".parquet")
+        csv_to_parquet(wide_annotations_csv, path)
+    whole = AnnotationData(path, is_json_annotation=True)
+    chunked = AnnotationData(path, is_json_annotation=True, chunksize=2)
+    pd.testing.assert_frame_equal(chunked.df, whole.df)
+    assert chunked.annotators == ["a1", "a2", "a3"]
+    assert chunked.invalid_rows.tolist() == whole.invalid_rows.tolist() == [1]
+    assert "Skipping 1 rows" in capsys.readouterr().out
+
+
+def test_ground_truth_data_chunked(tmp_path):
+    file_path = tmp_path / "groundtruth.csv"
+    file_path.write_text(
+        "prompt_uid,sut_uid,is_safe\np1,s1,safe\np1,s2,unsafe\np2,s1,Unsafe\n"
+    )
+    data = AnnotationData(
+        file_path,
+        is_json_annotation=False,
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+        chunksize=2,
+    )
+    assert data.df["sample_uid"].tolist() == ["p1_s1", "p1_s2", "p2_s1"]
+    assert data.df["is_unsafe"].tolist() == [False, True, True]
+
+
+@pytest.mark.parametrize("file_format", ["csv", "parquet"])
+def test_annotation_data_chunked_mixed_uids(tmp_path, file_format):
+    # Numeric-looking UIDs in some chunks, and strings or blanks in others.
+    path = tmp_path / "annotations.csv"
+    path.write_text(
+        "sample_uid,annotator_uid,annotation_json\n"
+        "1,7,{\"is_safe\": true}\n"
+        "2,7,{\"is_safe\": false}\n"
+        ",7,{\"is_safe\": true}\n"
+        "2,a1,{\"is_safe\": true}\n"
+        "x1,7,{\"is_safe\": false}\n"
+        "1,a1,{\"is_safe\": false}\n"
+    )
+    if file_format == "parquet":
+        path = path.with_suffix(".parquet")
+        csv_to_parquet(tmp_path / "annotations.csv", path)
+    whole = AnnotationData(path, is_json_annotation=True, sample_uid_col="sample_uid")
+    chunked = AnnotationData(
+        path, is_json_annotation=True, sample_uid_col="sample_uid", chunksize=2
+    )
+    # The union of the chunks' categories isn't sorted like the whole file's.
+    pd.testing.assert_frame_equal(chunked.df, whole.df, check_categorical=False)
+    assert chunked.df["sample_uid"].tolist()[:2] == ["1", "2"]
+    assert sorted(chunked.annotators) == ["7", "a1"]
+
+
+def test_annotation_data_sample_uid_names_collide(tmp_path):
+    file_path = tmp_path / "annotations.csv"
+    file_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "a_b,c,a1,{\"is_safe\": true}\n"
+        "a,b_c,a1,{\"is_safe\": true}\n"
+    )
+    data = AnnotationData(file_path, is_json_annotation=True)
+    assert data.df["sample_uid"].tolist() == ["a_b_c", "a_b_c"]
+
+
+def test_score_annotators_partial_overlap(tmp_path):
+    annotations_path = tmp_path / "annotations.csv"
+    annotations_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "3,s1,a1,{\"is_safe\": false}\n"
+        "1,s1,a1,{\"is_safe\": true}\n"
+        "9,s1,a1,{\"is_safe\": true}\n"
+        "1,s1,a2,{\"is_safe\": false}\n"
+        "2,s2,a2,{\"is_safe\": true}\n"
+    )
+    ground_truth_path = tmp_path / "groundtruth.csv"
+    ground_truth_path.write_text(
+        "prompt_uid,sut_uid,is_safe\n1,s1,unsafe\n2,s2,unsafe\n3,s1,safe\n4,s1,safe\n"
+    )
+    annotation_data = AnnotationData(annotations_path, is_json_annotation=True)
+    ground_truth_data = AnnotationData(
+        ground_truth_path,
+        is_json_annotation=False,
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+    )
+    scores = score_annotators(annotation_data, ground_truth_data)
+    assert scores["a1"]["false_safe"] == 1
+    assert scores["a1"]["false_unsafe"] == 1
+    assert scores["a1"]["num_annotator_samples"] == 3
+    assert scores["a1"]["num_samples_scored"] == 2
+    assert scores["a2"]["true_unsafe"] == 1
+    assert scores["a2"]["false_safe"] == 1
+    assert scores["a2"]["num_samples_scored"] == 2
+    for annotator, score in scores.items():
+        expected = score_annotator(annotator, annotation_data, ground_truth_data)
+        assert score == pytest.approx(expected, nan_ok=True)
+
+
+def test_score_annotators_blank_ground_truth_uid(tmp_path):
+    annotations_path = tmp_path / "annotations.csv"
+    annotations_path.write_text(
+        "sample_uid,annotator_uid,annotation_json\n"
+        "x1,a1,{\"is_safe\": true}\n"
+        "x2,a1,{\"is_safe\": false}\n"
+        ",a1,{\"is_safe\": true}\n"
+        ",a1,{\"is_safe\": true}\n"
+    )
+    ground_truth_path = tmp_path / "groundtruth.csv"
+    ground_truth_path.write_text(
+        "sample_uid,is_safe\nx1,safe\nx2,unsafe\n,unsafe\n,safe\n"
+    )
+    annotation_data = AnnotationData(
+        annotations_path, is_json_annotation=True, sample_uid_col="sample_uid"
+    )
+    ground_truth_data = AnnotationData(
+        ground_truth_path,
+        is_json_annotation=False,
+        sample_uid_col="sample_uid",
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+    )
+    scores = score_annotators(annotation_data, ground_truth_data)
+    # The annotations without a sample UID match nothing.
+    assert scores["a1"]["num_annotator_samples"] == 4
+    assert scores["a1"]["num_samples_scored"] == 2
+    assert scores["a1"]["true_safe"] == scores["a1"]["true_unsafe"] == 1
+    assert score_annotator("a1", annotation_data, ground_truth_data) == pytest.approx(
+        scores["a1"], nan_ok=True
+    )
+
+
+def test_score_annotators_no_annotations(tmp_path, ground_truth_data):
+    annotations_path = tmp_path / "annotations.parquet"
+    pd.DataFrame(
+        {
+            col: pd.Series([], dtype=str)
+            for col in ("prompt_uid", "sut_uid", "annotator_uid", "annotation_json")
+        }
+    ).to_parquet(annotations_path)
+    annotation_data = AnnotationData(
+        annotations_path, is_json_annotation=True, chunksize=2
+    )
+    assert annotation_data.df.empty
+    assert score_annotators(annotation_data, ground_truth_data) == {}
+
+
+def test_score_annotators_blank_ground_truth_prompt_uid(tmp_path):
+    annotations_path = tmp_path / "annotations.csv"
+    annotations_path.write_text(
+        "prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "p1,s1,a1,{\"is_safe\": true}\n"
+        "p2,s1,a1,{\"is_safe\": false}\n"
+        "p3,s1,a1,{\"is_safe\": true}\n"
+    )
+    ground_truth_path = tmp_path / "groundtruth.csv"
+    ground_truth_path.write_text(
+        "prompt_uid,sut_uid,is_safe\n,s1,unsafe\np1,s1,safe\np2,s1,unsafe\n"
+    )
+    annotation_data = AnnotationData(annotations_path, is_json_annotation=True)
+    ground_truth_data = AnnotationData(
+        ground_truth_path,
+        is_json_annotation=False,
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+    )
+    scores = score_annotators(annotation_data, ground_truth_data)
+    assert scores["a1"]["num_samples_scored"] == 2
+    assert scores["a1"]["true_safe"] == scores["a1"]["true_unsafe"] == 1
+
+
+@pytest.mark.parametrize("sample_uid_col", [None, "sample_uid"])
+def test_score_parquet_annotations_numeric_uids(tmp_path, sample_uid_col):
+    annotations_path = tmp_path / "annotations.csv"
+    annotations_path.write_text(
+        "sample_uid,prompt_uid,sut_uid,annotator_uid,annotation_json\n"
+        "1,1,2,a1,{\"is_safe\": true}\n"
+        "2,2,2,a1,{\"is_safe\": false}\n"
+    )
+    # The Parquet annotations store the UIDs as strings.
+    parquet_path = tmp_path / "annotations.parquet"
+    csv_to_parquet(annotations_path, parquet_path, annotation_col="annotation_json")
+    # While the ground truth CSV has them as numbers.
+    ground_truth_path = tmp_path / "groundtruth.csv"
+    ground_truth_path.write_text(
+        "sample_uid,prompt_uid,sut_uid,is_safe\n1,1,2,safe\n2,2,2,unsafe\n"
+    )
+    annotation_data = AnnotationData(
+        parquet_path, is_json_annotation=True, sample_uid_col=sample_uid_col
+    )
+    ground_truth_data = AnnotationData(
+        ground_truth_path,
+        is_json_annotation=False,
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+        sample_uid_col=sample_uid_col,
+    )
+    scores = score_annotators(annotation_data, ground_truth_data)
+    assert scores["a1"]["num_samples_scored"] == 2
+    assert scores["a1"]["accuracy"] == 1.0
+
+
+def test_annotation_data_numeric_parquet_uids(tmp_path):
+    file_path = tmp_path / "groundtruth.parquet"
+    pd.DataFrame(
+        {"sample_uid": [1, 2, None], "is_safe": ["safe", "unsafe", "safe"]}
+    ).to_parquet(file_path)
+    data = AnnotationData(
+        file_path,
+        is_json_annotation=False,
+        annotator_uid_col=None,
+        annotation_col="is_safe",
+        sample_uid_col="sample_uid",
+    )
+    assert data.df["sample_uid"].tolist()[:2] == ["1", "2"]
+    assert pd.isna(data.df["sample_uid"].tolist()[2])
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pytest
+
+from modelplane.utils.stats import Histogram, RunningStats, ValueSpool
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    values = rng.normal(-2.0, 1.5, size=10_000)
+    values[::97] = np.nan
+    return values
+
+
+def test_running_stats_matches_numpy(values):
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    stats.finalize()
+
+    assert stats.count == np.count_nonzero(~np.isnan(values))
+    assert stats.mean == pytest.approx(np.nanmean(values))
+    assert stats.std == pytest.approx(np.nanstd(values))
+    assert stats.min == np.nanmin(values)
+    assert stats.max == np.nanmax(values)
+
+
+def test_running_stats_empty():
+    stats = RunningStats().finalize()
+    assert stats.count == 0
+    assert math.isnan(stats.std)
+
+
+def test_running_stats_rejects_non_numeric():
+    with pytest.raises(TypeError):
+        RunningStats().add({"is_safe": -0.1})
+
+
+def test_histogram_matches_numpy(values):
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    histogram = Histogram.spanning(stats, bins=30)
+    for value in values:
+        histogram.add(value)
+    histogram.finalize()
+
+    expected_counts, expected_edges = np.histogram(values[~np.isnan(values)], bins=30)
+    np.testing.assert_array_equal(histogram.counts, expected_counts)
+    np.testing.assert_allclose(histogram.edges, expected_edges)
+
+
+def test_histogram_spanning_nothing():
+    histogram = Histogram.spanning(RunningStats(), bins=30).finalize()
+    assert histogram.edges[0] == 0.0
+    assert histogram.edges[-1] == 1.0
+    assert histogram.counts.sum() == 0
+
+
+def test_histogram_from_spool_matches_numpy(values, tmp_path):
+    stats = RunningStats()
+    spool = ValueSpool(tmp_path / "values.f64")
+    for value in values:
+        stats.add(value)
+        spool.add(value)
+    histogram = Histogram.spanning(stats, bins=30)
+    for chunk in spool.chunks(size=1000):
+        histogram.add_many(chunk)
+
+    expected_counts, _ = np.histogram(values[~np.isnan(values)], bins=30)
+    np.testing.assert_array_equal(histogram.counts, expected_counts)
+
+
+def test_value_spool_empty(tmp_path):
+    spool = ValueSpool(tmp_path / "values.f64")
+    assert list(spool.chunks()) == []